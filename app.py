@@ -1,23 +1,60 @@
-import os
-import base64
-from pathlib import Path
-import io
-
+import hmac
+import importlib.util
 import json
+import os
+import random
 import re
+import secrets
+import sqlite3
+import threading
+import time
+
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import streamlit as st
-import google.generativeai as genai
 
-# PDF (ReportLab) — exportar A4 com banner, rodapé e numeração
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import cm
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.utils import ImageReader
-    _PDF_OK = True
-except Exception:
-    _PDF_OK = False
+import painel_admin
+import painel_historico
+import recursos
+from nucleo import (
+    MODO_ENSINO,
+    MODOS,
+    MSG_FALHA_ESBOCO,
+    ClienteGemini,
+    Conversa,
+    anexar_imagens,
+    build_prompt,
+    configurar_sdk,
+    criar_modelo,
+    decidir_esboco,
+    filtrar_marcador,
+    separar_esboco,
+)
+from resiliencia import (
+    CircuitoAberto,
+    Disjuntor,
+    GuardaGemini,
+    LimiteExcedido,
+    Limitador,
+    Singleflight,
+    Transmissao,
+    estimar_tokens,
+    hedge,
+    modelo_reserva,
+)
+from base_conhecimento import DIR_DOCUMENTOS, BaseConhecimento
+from cache_respostas import DIR_DADOS, CacheRespostas, chave_cache
+from cache_semantico import CacheSemantico, EmbedderGemini, EmbedderHashing
+from catalogo_modelos import CatalogoModelos, impressao_chave
+from classificador_esboco import MODELO, NAO, PreClassificador, RegistroDecisoes, decisao_local
+from fotos import EXTENSOES, MAX_FOTOS, FotoInvalida, ProcessadorFotos
+from historico_perguntas import HistoricoPerguntas
+from telemetria import Telemetria, uso_tokens
+
+# PDF (ReportLab) — exportar A4 com banner, rodapé e numeração. O ReportLab só
+# é importado quando alguém gera um PDF (ou pelo aquecimento, em segundo plano)
+_PDF_OK = importlib.util.find_spec("reportlab") is not None
 
 
 # =========================
@@ -25,6 +62,96 @@ except Exception:
 # =========================
 st.set_page_config(page_title="Ensina Feridas (Gemini)", layout="centered")
 
+
+# =========================
+# Telemetria, limites do Gemini e painel admin
+# =========================
+# Limites do projeto no Gemini (ajuste conforme a cota da chave)
+LIMITE_RPM = float(os.getenv("ENSINA_FERIDAS_RPM", "60"))
+LIMITE_TPM = float(os.getenv("ENSINA_FERIDAS_TPM", "1000000"))
+
+
+@st.cache_resource(show_spinner=False)
+def get_guarda() -> GuardaGemini:
+    """Limitador + retry + disjuntor do Gemini, um por processo (vale para todas as sessões)."""
+    return GuardaGemini(
+        Limitador(rpm=LIMITE_RPM, tpm=LIMITE_TPM),
+        Disjuntor(falhas_para_degradar=2, falhas_para_abrir=5, abertura_s=30),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_singleflight() -> Singleflight:
+    """Chamadas ao Gemini em andamento por chave, compartilhadas entre as sessões do processo."""
+    return Singleflight()
+
+
+@st.cache_resource(show_spinner=False)
+def get_telemetria() -> Telemetria:
+    """Latência/tokens por etapa, um coletor por processo (compartilhado entre sessões)."""
+    return Telemetria(DIR_DADOS / "telemetria")
+
+
+@st.cache_resource(show_spinner=False)
+def get_registro_decisoes() -> RegistroDecisoes:
+    """Decisões de esboço do Gemini + a do pré-classificador (treino e concordância)."""
+    return RegistroDecisoes(DIR_DADOS / "decisoes_esboco.jsonl")
+
+
+# Embeddings do cache semântico e da base de conhecimento:
+# "gemini" (padrão) ou "hash" (local, funciona offline)
+EMBEDDER_SEMANTICO = os.getenv("ENSINA_FERIDAS_EMBEDDER", "gemini")
+
+
+@st.cache_resource(show_spinner=False)
+def get_embedder():
+    """Embedder do cache semântico e da base de conhecimento (o mesmo: o vetor da pergunta serve aos dois)."""
+    return EmbedderHashing() if EMBEDDER_SEMANTICO == "hash" else EmbedderGemini(guarda=get_guarda())
+
+
+@st.cache_resource(show_spinner=False)
+def get_base_conhecimento() -> BaseConhecimento:
+    """Índice dos documentos locais (protocolos, material do curso), um por processo."""
+    return BaseConhecimento(DIR_DOCUMENTOS, DIR_DADOS / "conhecimento", get_embedder())
+
+
+@st.cache_resource(show_spinner=False)
+def get_processador_fotos() -> ProcessadorFotos:
+    """Redução das fotos da ferida, com cache (em memória) compartilhado entre as sessões."""
+    return ProcessadorFotos()
+
+
+@st.cache_resource(show_spinner=False)
+def get_historico_perguntas() -> HistoricoPerguntas:
+    """Histórico persistente das perguntas e respostas (todas as sessões)."""
+    return HistoricoPerguntas(DIR_DADOS / "historico.sqlite3")
+
+
+def get_admin_token() -> str | None:
+    try:
+        v = st.secrets.get("ENSINA_FERIDAS_ADMIN_TOKEN")
+    except Exception:
+        v = None
+    return (str(v or "") or os.getenv("ENSINA_FERIDAS_ADMIN_TOKEN") or "").strip() or None
+
+
+# Painel oculto: abra o app com ?admin=<ENSINA_FERIDAS_ADMIN_TOKEN>
+_admin_token = get_admin_token()
+if _admin_token and hmac.compare_digest(st.query_params.get("admin", ""), _admin_token):
+    painel_admin.mostrar(get_telemetria(), get_guarda(), get_registro_decisoes().ler(), get_base_conhecimento(),
+                         get_singleflight(), get_processador_fotos(), get_historico_perguntas())
+    st.stop()
+
+telemetria = get_telemetria()
+
+# Sessão do histórico: o id fica no session_state. Só vai para o endereço (?sessao=...), e aí
+# sobrevive ao F5, se o usuário pedir: quem tiver o link (ex.: a tela projetada na aula) lê o histórico
+sessao_id = st.session_state.get("sessao_id") or st.query_params.get("sessao", "")
+if not re.fullmatch(r"[0-9a-f]{32}", sessao_id):
+    sessao_id = secrets.token_hex(16)
+st.session_state["sessao_id"] = sessao_id
+
+
 # Enxuga o topo do Streamlit (remove espaço antes do banner)
 st.markdown(
     """
@@ -46,12 +173,15 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# Banner da página (UI)
-banner_path = Path(__file__).parent / "assets" / "banner.pdf.a4.png"
-if banner_path.exists():
-    st.image(str(banner_path), use_container_width=True)
+# Banner da página (UI) — lido e reduzido uma vez por processo
+with telemetria.medir("assets"):
+    banner_img = recursos.banner_web()
+    insta_b64 = recursos.icone_b64("instagram")
+    enf_b64 = recursos.icone_b64("enfermagem")
+if banner_img:
+    st.image(banner_img, use_container_width=True)
 else:
-    st.caption(f"Banner não encontrado: {banner_path}")
+    st.caption(f"Banner não encontrado: {recursos.BANNER}")
 
 st.markdown(
     "<h2 style='text-align:center; margin:0.25rem 0 0.25rem 0;'>🩹 Ensina Feridas </h2>",
@@ -59,16 +189,6 @@ st.markdown(
 )
 st.caption("Streamlit + Gemini (SDK estável: `google-generativeai`).")
 
-from pathlib import Path
-import base64
-import streamlit as st
-
-# --- Instagram icon ---
-insta_path = Path("assets/instagram.png")
-insta_b64 = base64.b64encode(insta_path.read_bytes()).decode()
-enf_path = Path("assets/logo.enfermagem.png")
-enf_b64 = base64.b64encode(enf_path.read_bytes()).decode()
-
 st.markdown(
     f"""
     <div style="display:flex; align-items:center; gap:12px; margin-top:-10px; margin-bottom:12px;">
@@ -97,28 +217,9 @@ st.markdown(
 
 
 # =========================
-# Prompts do "GEM"
+# Modo (prompts do "GEM" em `nucleo.py`)
 # =========================
-CLINICAL_HINT = (
-    "Você é um especialista em feridas crônicas e protocolos de cuidado (TIME/TIMERS). "
-    "Responda com orientação clínica segura e prática. "
-    "Se faltarem dados, faça perguntas objetivas. "
-    "Evite prescrever doses/condutas de alto risco sem contexto clínico. "
-    "Quando houver sinais de alarme (ex.: infecção sistêmica, isquemia grave, dor desproporcional), "
-    "recomende avaliação presencial."
-)
-
-EDU_HINT = (
-    "Você é um especialista em ensino & aprendizagem no ensino superior (tutor). "
-    "Seu objetivo é ensinar, não só responder. "
-    "Use explicação progressiva (do básico ao avançado), exemplos, analogias e perguntas diagnósticas. "
-    "Aplique metodologias ativas (PBL): formule hipóteses, peça dados que faltam e estimule raciocínio. "
-    "Sempre que possível, devolva um mini-roteiro de estudo + um exercício curto com gabarito comentado. "
-    "Mantenha o foco em feridas crônicas e protocolos TIME/TIMERS, com segurança clínica."
-)
-
-mode = st.radio("Modo", ["Ensino (tutor)", "Clínico (objetivo)"], horizontal=True)
-SYSTEM_HINT = EDU_HINT if mode == "Ensino (tutor)" else CLINICAL_HINT
+mode = st.radio("Modo", MODOS, horizontal=True)
 
 
 # =========================
@@ -144,32 +245,42 @@ if not api_key:
     )
     st.stop()
 
-genai.configure(api_key=api_key)
+impressao_api = impressao_chave(api_key)
+
+
+@st.cache_resource(show_spinner=False)
+def configurar_gemini(_api_key: str, impressao: str) -> None:
+    """Importa e configura o SDK uma vez por processo (na 1ª pergunta ou no aquecimento)."""
+    configurar_sdk(_api_key)
 
 
 # =========================
-# Modelos disponíveis (cache)
+# Modelos disponíveis (disco + atualização em segundo plano)
 # =========================
-@st.cache_data(ttl=3600, show_spinner=False)
-def list_generate_models(_api_key_fingerprint: str) -> list[str]:
+def list_generate_models(api_key: str) -> list[str]:
+    """Modelos da conta com `generateContent` (chamada de rede: roda fora da página)."""
+    configurar_gemini(api_key, impressao_chave(api_key))
+    import google.generativeai as genai
+
     models: list[str] = []
-    try:
-        for m in genai.list_models():
-            methods = getattr(m, "supported_generation_methods", None) or []
-            if "generateContent" in methods and getattr(m, "name", None):
-                models.append(m.name)
-    except Exception:
-        models = []
-    return models or [
-        "models/gemini-2.0-flash",
-        "models/gemini-2.0-flash-lite",
-        "models/gemini-2.0-pro",
-        "models/gemini-1.5-flash",
-        "models/gemini-1.5-pro",
-    ]
+    for m in genai.list_models():
+        methods = getattr(m, "supported_generation_methods", None) or []
+        if "generateContent" in methods and getattr(m, "name", None):
+            models.append(m.name)
+    return models
+
+
+@st.cache_resource(show_spinner=False)
+def get_catalogo_modelos(_api_key: str, impressao: str) -> CatalogoModelos:
+    """Lista salva em disco; vencida (1 h), é atualizada em segundo plano sem segurar a página."""
+    return CatalogoModelos(DIR_DADOS / "modelos.json", partial(list_generate_models, _api_key), ttl_s=3600,
+                           chave=impressao)
 
 
-available_models = list_generate_models(api_key[:6] + "…" + api_key[-4:])
+# Uma consulta por sessão: interações seguintes não tocam no catálogo
+if "modelos" not in st.session_state:
+    st.session_state["modelos"] = get_catalogo_modelos(api_key, impressao_api).modelos()
+available_models = st.session_state["modelos"]
 
 # =========================
 # Controles do usuário
@@ -184,7 +295,7 @@ with col2:
         "Estilo da resposta",
         0.0,
         1.0,
-        0.25 if mode == "Ensino (tutor)" else 0.3,
+        0.25 if mode == MODO_ENSINO else 0.3,
         0.05,
     )
     st.caption("Mais baixo = respostas objetivas • Mais alto = respostas mais explicativas")
@@ -195,15 +306,46 @@ auto_sketch = st.checkbox(
     help="O app decide automaticamente se um esboço/figura ajudaria na resposta e, se sim, gera um prompt pronto para você colar em um gerador de imagens.",
 )
 
+reserva_model = modelo_reserva(available_models, model_name)
+usar_hedge = st.checkbox(
+    "⏱️ Plano B se o modelo demorar",
+    value=os.getenv("ENSINA_FERIDAS_HEDGE", "0") == "1" and reserva_model is not None,
+    disabled=reserva_model is None,
+    help=f"Se o modelo escolhido demorar a começar a responder, a mesma pergunta vai também para "
+    f"{reserva_model or 'um modelo mais rápido'} e fica a resposta que chegar primeiro.",
+)
+
+
+def nova_conversa() -> None:
+    cancelar_tarefas_pendentes()
+    st.session_state.pop("compactacao", None)
+    st.session_state.pop("resultado", None)
+    st.session_state["conversa"] = Conversa()
+
+
+# Conversa: as próximas perguntas continuam a partir das anteriores (contexto resumido)
+conversa = st.session_state.setdefault("conversa", Conversa())
+col_conv, col_nova = st.columns([3, 1])
+with col_conv:
+    conversa_ativa = st.toggle(
+        "💬 Conversa contínua",
+        value=False,
+        help="Cada pergunta continua a anterior (bom para responder às perguntas diagnósticas do tutor). "
+        "Turnos antigos viram um resumo, então o custo por pergunta não cresce com a conversa.",
+    )
+with col_nova:
+    if conversa_ativa and len(conversa):
+        st.button("🧹 Nova conversa", on_click=nova_conversa, use_container_width=True)
+
 import streamlit.components.v1 as components
 
 # =========================
 # Caixa de pergunta com microfone
 # =========================
 
-# Microfone: injeta texto direto no textarea do Streamlit via DOM
-components.html(
-    """
+# Microfone: injeta texto direto no textarea do Streamlit via DOM.
+# HTML constante: nos reruns o iframe recebe o mesmo conteúdo e não é recarregado.
+MIC_HTML = """
     <style>
       .mic-row { display:flex; align-items:center; gap:10px; margin-bottom:2px; }
       .mic-btn {
@@ -289,10 +431,8 @@ components.html(
       btn.addEventListener('click', () => { if (listening) rec.stop(); else rec.start(); });
     })();
     </script>
-    """,
-    height=55,
-    scrolling=False,
-)
+    """
+components.html(MIC_HTML, height=55, scrolling=False)
 
 # Campo de texto nativo — editável normalmente (voz ou digitado)
 prompt = st.text_area(
@@ -305,381 +445,833 @@ prompt = st.text_area(
     key="prompt_area",
 )
 
+# Fotos da ferida (opcional): vão ao Gemini reduzidas e sem metadados (ver `fotos.py`)
+with st.expander("📷 Foto da ferida (opcional)"):
+    fotos_enviadas = st.file_uploader(
+        "Enviar foto",
+        type=EXTENSOES,
+        accept_multiple_files=True,
+        key="fotos_upload",
+        help=f"Até {MAX_FOTOS} fotos. Antes de ir ao Gemini, cada uma é reduzida e perde os metadados "
+        "(localização, aparelho, data).",
+    )
+    # a câmera só é pedida ao navegador quando o usuário liga
+    if st.toggle("Usar a câmera", key="fotos_camera"):
+        foto_camera = st.camera_input("Foto da ferida", key="foto_camera")
+        if foto_camera is not None:
+            fotos_enviadas = [*fotos_enviadas, foto_camera]
+
 # Botão nativo do Streamlit
 enviar = st.button("🚀 Enviar para o Gemini", type="primary")
 
 
-def build_prompt(user_text: str) -> str:
-    teaching_rules = ""
-    if mode == "Ensino (tutor)":
-        teaching_rules = (
-            "\nFORMATO (modo ensino):"
-            "\n1) Resposta curta (2–5 linhas) para situar."
-            "\n2) Explicação em passos (bullet points)."
-            "\n3) Perguntas diagnósticas (3–5)."
-            "\n4) Exercício rápido + gabarito comentado."
-            "\n5) Alertas de segurança (se aplicável).\n"
-        )
+# =========================
+# Streaming da resposta
+# =========================
+def stream_texto(resp, partes: list[str]):
+    """
+    Itera o stream do Gemini devolvendo só o texto de cada pedaço.
+    Acumula tudo em `partes` para montar o `final_text` depois.
+    """
+    for chunk in resp:
+        try:
+            t = chunk.text
+        except ValueError:
+            # pedaço sem texto (ex.: bloqueado por segurança) — pula
+            continue
+        if t:
+            partes.append(t)
+            yield t
 
-    return f"""INSTRUÇÕES (contexto):
-{SYSTEM_HINT}
 
-SOLICITAÇÃO DO USUÁRIO:
-{user_text}
+def motivo_interrupcao(resp) -> str | None:
+    """Retorna o motivo de bloqueio/corte do stream, ou None se terminou normalmente."""
+    try:
+        feedback = getattr(resp, "prompt_feedback", None)
+        block = getattr(feedback, "block_reason", None)
+        if block:
+            return f"pergunta bloqueada: {getattr(block, 'name', block)}"
+        candidatos = getattr(resp, "candidates", None) or []
+        if candidatos:
+            fim = getattr(candidatos[0], "finish_reason", None)
+            nome = getattr(fim, "name", None)
+            if fim and nome not in ("STOP", "FINISH_REASON_UNSPECIFIED"):
+                return f"finalizado por {nome or fim}"
+    except Exception:
+        return None
+    return None
 
-REGRAS GERAIS:
-- Seja prático e didático.
-- Se houver risco (ex.: sinais de infecção sistêmica, isquemia grave, dor desproporcional), recomende avaliação presencial.
-{teaching_rules}
-"""
 
+# =========================
+# Decisão: precisa de esboço? (`nucleo.decidir_esboco`)
+# =========================
+def decidir_esboco_cacheado(cache: CacheRespostas, chave: str, pergunta: str, resposta: str, modelo: str,
+                            cliente: ClienteGemini | None = None, local: tuple = (MODELO, None)) -> dict:
+    """`decidir_esboco` + grava a decisão no cache e no registro do pré-classificador
+    (`local` = decisão local desse caso). Falhas não são guardadas."""
+    with get_telemetria().medir("decidir_esboco", modelo=modelo) as extra:
+        d = decidir_esboco(pergunta, resposta, modelo, cliente=cliente)
+        extra["need_sketch"] = d.get("need_sketch")
+    if d.get("reason") != MSG_FALHA_ESBOCO:
+        cache.guardar_esboco(chave, d)
+        get_registro_decisoes().registrar(pergunta, resposta, d["need_sketch"], "separado", *local)
+    return d
 
 
 # =========================
-# Decisão: precisa de esboço?
+# Tarefas em segundo plano e cache
 # =========================
-def decidir_esboco(pergunta: str, resposta: str, modelo_decisor: str | None = None) -> dict:
-    """
-    Usa o próprio Gemini para decidir se um esboço/figura ajuda, e propõe um prompt de imagem.
-    Retorna dict com:
-      - need_sketch: bool
-      - reason: str
-      - sketch_prompt: str
-    """
+TIMEOUT_TAREFAS_S = 45
+
+# Decisão de esboço na mesma chamada da resposta (bloco JSON no fim do stream);
+# "0" volta a usar só a segunda chamada (`decidir_esboco`), que segue como reserva
+ESBOCO_NA_RESPOSTA = os.getenv("ENSINA_FERIDAS_ESBOCO_NA_RESPOSTA", "1") != "0"
+
+# Fração dos casos resolvidos pelo pré-classificador que ainda vão ao Gemini,
+# só para medir a concordância (o resultado não é exibido)
+TAXA_AUDITORIA_ESBOCO = float(os.getenv("ENSINA_FERIDAS_AUDITORIA_ESBOCO", "0.05"))
+
+# Plano B (hedge): espera fixa em ms antes de chamar o modelo reserva; com 0,
+# usa o p90 observado do tempo até o 1º pedaço do modelo escolhido
+ATRASO_HEDGE_MS = float(os.getenv("ENSINA_FERIDAS_HEDGE_MS", "0"))
+ATRASO_HEDGE_PADRAO_MS = 4000.0  # até haver amostras suficientes
+ATRASO_HEDGE_MIN_MS = 1000.0
+
+# Base de conhecimento local: trechos por pergunta e orçamento de latência da
+# busca (estourado o orçamento do embedding, fica só a busca por palavras)
+TRECHOS_POR_PERGUNTA = int(os.getenv("ENSINA_FERIDAS_TRECHOS", "4"))
+ORCAMENTO_BUSCA_MS = float(os.getenv("ENSINA_FERIDAS_ORCAMENTO_BUSCA_MS", "250"))
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor() -> ThreadPoolExecutor:
+    """Pool de threads compartilhado por todas as sessões do processo."""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="ensina-tarefa")
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor_gemini() -> ThreadPoolExecutor:
+    """Pool das chamadas principais com plano B (separado para não disputar com as tarefas de fundo)."""
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="ensina-gemini")
+
+
+def submeter_esboco(cache: CacheRespostas, chave: str, prompt: str, final_text: str, model_name: str,
+                    local: tuple) -> Future:
+    """`decidir_esboco_cacheado` em segundo plano; a mesma resposta em várias sessões vira uma chamada só."""
+    fut, lider = get_singleflight().submeter(
+        f"esboco|{chave}", get_executor(),
+        decidir_esboco_cacheado, cache, chave, prompt, final_text, model_name, get_cliente_auxiliar(), local,
+    )
+    if not lider:
+        get_telemetria().registrar("gemini.coalescido", 0.0, modelo=model_name, tipo="esboco")
+    return fut
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache_respostas() -> CacheRespostas:
+    """Cache de respostas em disco, um por processo (compartilhado entre sessões)."""
+    return CacheRespostas(DIR_DADOS / "respostas.sqlite3")
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache_semantico() -> CacheSemantico:
+    """Índice de perguntas parecidas, um por processo (compartilhado entre sessões)."""
+    return CacheSemantico(DIR_DADOS, get_embedder())
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _pre_classificador(caminho: str, mtime: int) -> PreClassificador:
+    return PreClassificador.carregar(DIR_DADOS / caminho)
+
+
+def get_pre_classificador() -> PreClassificador:
+    """Pré-classificador de esboço; pesos retreinados são recarregados (mtime na chave)."""
     try:
-        model_id = modelo_decisor or model_name
-        model = genai.GenerativeModel(model_name=model_id)
-
-        decisor_prompt = f"""
-Você é um assistente que decide se um ESBOÇO/FIGURA simples ajudaria a resposta.
-Contexto: o app é sobre feridas crônicas (TIME/TIMERS), mas a pergunta pode ser geral.
-
-Responda SOMENTE em JSON válido, SEM markdown, SEM texto extra, no formato:
-{{"need_sketch": true/false, "reason": "...", "sketch_prompt": "..."}}
-
-Regras:
-- need_sketch = true quando uma figura melhoraria MUITO a compreensão (ex.: anatomia, posicionamento, escolha de calçado/órtese, passo-a-passo de curativo, fluxogramas, comparação visual, layout de equipamento).
-- need_sketch = false quando for pura explicação textual, listas simples, ou quando um desenho pode induzir erro clínico.
-- Se need_sketch = false, deixe sketch_prompt como string vazia "".
-- Se need_sketch = true, crie um prompt curto, bem específico, para gerar uma imagem didática, sem conteúdo chocante. Evite sangue explícito.
-
-PERGUNTA:
-{pergunta}
-
-RESPOSTA (resumo):
-{resposta[:1200]}
-"""
-        resp = model.generate_content(
-            decisor_prompt,
-            generation_config=genai.types.GenerationConfig(temperature=0.1),
+        mtime = (DIR_DADOS / "classificador_esboco.npz").stat().st_mtime_ns
+    except OSError:
+        mtime = 0
+    return _pre_classificador("classificador_esboco.npz", mtime)
+
+
+@st.cache_resource(show_spinner=False)
+def get_modelo(model_name: str, mode: str | None = None, esboco: bool = False):
+    """`GenerativeModel` por (modelo, modo, esboço embutido), reaproveitado entre perguntas e sessões."""
+    return criar_modelo(model_name, mode, esboco)
+
+
+@st.cache_resource(show_spinner=False)
+def get_cliente_auxiliar() -> ClienteGemini:
+    """Cliente das chamadas auxiliares (decisão de esboço, resumo da conversa):
+    não essenciais para o disjuntor, modelos do `get_modelo`."""
+    return ClienteGemini(get_guarda(), essencial=False, fabrica=get_modelo, telemetria=get_telemetria())
+
+
+def atraso_hedge_s(modelo: str) -> float:
+    """Quanto esperar pelo 1º pedaço de `modelo` antes de acionar o plano B."""
+    if ATRASO_HEDGE_MS > 0:
+        return ATRASO_HEDGE_MS / 1000
+    p90 = get_telemetria().percentil("gemini.ttft", 90, desde_s=3600, minimo=20, modelo=modelo)
+    return max(ATRASO_HEDGE_MIN_MS, p90 or ATRASO_HEDGE_PADRAO_MS) / 1000
+
+
+def fechar_stream(resp) -> None:
+    """Encerra o stream de quem perdeu o hedge (melhor esforço: o SDK não expõe isso)."""
+    cancelar = getattr(getattr(resp, "_iterator", None), "cancel", None)
+    if callable(cancelar):
+        try:
+            cancelar()
+        except Exception:
+            pass
+
+
+# Aquecimento: na 1ª execução do processo, carrega em segundo plano o que a
+# primeira pergunta/exportação usaria ("0" desliga)
+AQUECER = os.getenv("ENSINA_FERIDAS_AQUECER", "1") != "0"
+
+
+def _aquecer_pdf() -> None:
+    if _PDF_OK:
+        import relatorio_pdf  # noqa: F401  (ReportLab, métricas das fontes e `exportar_pdf`)
+
+        recursos.banner_pdf()
+
+
+def _aquecer(api_key: str) -> None:
+    etapas = {
+        "sdk": lambda: configurar_gemini(api_key, impressao_chave(api_key)),
+        "pdf": _aquecer_pdf,
+        "caches": lambda: (get_cache_respostas(), get_cache_semantico(), get_pre_classificador()),
+        # documentos novos/alterados são indexados numa thread própria
+        "conhecimento": lambda: get_base_conhecimento().verificar(0),
+    }
+    for parte, fn in etapas.items():
+        with get_telemetria().medir("aquecimento", parte=parte) as extra:
+            try:
+                fn()
+            except Exception as e:
+                extra["erro"] = type(e).__name__  # a pergunta tenta de novo e mostra o erro
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_aquecimento(_api_key: str, impressao: str) -> threading.Thread:
+    """Dispara o aquecimento uma vez por processo (thread daemon, não segura a página)."""
+    t = threading.Thread(target=_aquecer, args=(_api_key,), name="ensina-aquecimento", daemon=True)
+    t.start()
+    return t
+
+
+def cancelar_tarefas_pendentes() -> None:
+    """Descarta as tarefas da pergunta anterior desta sessão (se ainda não terminaram)."""
+    for fut in st.session_state.pop("tarefas_pendentes", {}).values():
+        fut.cancel()
+
+
+def mostrar_esboco(d: dict) -> None:
+    """Renderiza a sugestão de esboço devolvida por `decidir_esboco`."""
+    if not d.get("need_sketch"):
+        return
+
+    st.markdown("### ✍️ Sugestão de esboço")
+    if d.get("reason"):
+        st.info(d["reason"])
+
+    # BÔNUS ELEGANTE: mostra o prompt com wrap + evita variável não definida
+    sketch = (d.get("sketch_prompt") or "").strip()
+    if sketch:
+        st.info("✅ O sistema sugere que um esboço ajudaria. Copie o prompt abaixo.")
+        st.text_area(
+            "Prompt do esboço (PT-BR) — copie e cole no gerador de imagens",
+            value=sketch,
+            height=200,
         )
-        raw = (getattr(resp, "text", None) or "").strip()
 
-        # tenta JSON direto; se vier “com sujeira”, extrai o primeiro {...}
+        # Botões de download e copiar lado a lado
+        col_download, col_copy_sketch = st.columns([1, 1])
+
+        with col_download:
+            st.download_button(
+                "💾 Baixar prompt (.txt)",
+                data=sketch.encode("utf-8"),
+                file_name="prompt_esboco.txt",
+                mime="text/plain; charset=utf-8",
+                use_container_width=True,
+            )
+
+        with col_copy_sketch:
+            # Botão de copiar o prompt do esboço (azul marinho)
+            copy_sketch_html = f"""
+            <button onclick="copySketchPrompt()" 
+                    style="width:100%; padding:0.5rem 1rem; background-color:#1e3a8a; 
+                           color:white; border:1px solid #2563eb; border-radius:0.5rem; 
+                           cursor:pointer; font-size:0.9rem; font-weight:500;">
+                📋 Copiar prompt
+            </button>
+            <textarea id="sketchTextToCopy" style="position:absolute; left:-9999px;">{sketch}</textarea>
+            <script>
+            function copySketchPrompt() {{
+                const text = document.getElementById('sketchTextToCopy').value;
+                navigator.clipboard.writeText(text).then(function() {{
+                    const btn = event.target;
+                    const original = btn.innerHTML;
+                    btn.innerHTML = '✅ Copiado!';
+                    btn.style.backgroundColor = '#0e7c0e';
+                    setTimeout(function() {{
+                        btn.innerHTML = original;
+                        btn.style.backgroundColor = '#1e3a8a';
+                    }}, 2000);
+                }}, function(err) {{
+                    alert('Erro ao copiar: ' + err);
+                }});
+            }}
+            </script>
+            """
+            components.html(copy_sketch_html, height=50)
+    else:
+        st.caption("O decisor marcou que um esboço ajudaria, mas não gerou um prompt. Tente novamente ou reformule o caso.")
+
+    st.caption(
+        "Dica: cole esse prompt em um gerador de imagens (NanoBanana, Leonardo, Stable Diffusion, etc.). "
+        "Se quiser, eu também posso adaptar o prompt para a ferramenta que você for usar."
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def pdf_em_cache(pergunta: str, resposta: str, historico: tuple, versao_banner: int, fotos: tuple = ()) -> bytes:
+    """PDF memoizado por (conversa, versão do banner, miniaturas), com no máximo 32 entradas."""
+    from exportar_pdf import gerar_pdf_a4
+
+    with get_telemetria().medir("gerar_pdf_a4", turnos=len(historico) + 1, fotos=len(fotos)):
+        return gerar_pdf_a4(pergunta, resposta, historico, fotos)
+
+
+def mostrar_download_pdf(pergunta: str, resposta: str, historico: tuple = (), fotos: tuple = ()) -> None:
+    st.download_button(
+        "📥 Gerar PDF A4",
+        # callable: o Streamlit só chama quando o usuário clica em baixar
+        data=partial(pdf_em_cache, pergunta, resposta, historico, recursos.versao_banner(), fotos),
+        file_name="ensina_feridas_conversa.pdf" if historico else "ensina_feridas_resposta.pdf",
+        mime="application/pdf",
+        key="download_pdf_a4",
+        # baixar não precisa de rerun (nem do fragmento)
+        on_click="ignore",
+        use_container_width=True,
+    )
+
+
+# Relatório da sessão: todas as respostas da sessão num PDF com sumário
+MAX_RELATORIO_SESSAO = 100
+
+
+def registrar_na_sessao(pergunta: str, resposta: str) -> None:
+    entradas = st.session_state.setdefault("respostas_sessao", [])
+    if (pergunta, resposta) not in entradas:
+        entradas.append((pergunta, resposta))
+        del entradas[:-MAX_RELATORIO_SESSAO]
+
+
+def relatorio_sessao(entradas: tuple) -> bytes:
+    """Seções já diagramadas vêm do cache do processo: só as respostas novas custam."""
+    from relatorio_pdf import gerar_relatorio_pdf
+
+    with get_telemetria().medir("relatorio_pdf", secoes=len(entradas)):
+        return gerar_relatorio_pdf(entradas)
+
+
+def mostrar_download_relatorio(entradas: tuple) -> None:
+    st.download_button(
+        f"📚 Relatório da sessão ({len(entradas)} respostas, com sumário)",
+        data=partial(relatorio_sessao, entradas),
+        file_name="ensina_feridas_relatorio.pdf",
+        mime="application/pdf",
+        key="download_relatorio",
+        on_click="ignore",
+        use_container_width=True,
+    )
+
+
+# =========================
+# Resultado da sessão
+# =========================
+# O último resultado (resposta, decisão de esboço, avisos) fica em
+# `st.session_state["resultado"]` e é redesenhado a partir daí: baixar o PDF
+# ou mexer em qualquer widget não apaga a resposta nem chama o Gemini de novo.
+def mostrar_historico(historico: tuple) -> None:
+    """Turnos anteriores da conversa (recolhidos, para não empurrar a resposta para baixo)."""
+    if not historico:
+        return
+    with st.expander(f"💬 Conversa até aqui ({len(historico)} pergunta{'s' if len(historico) > 1 else ''})"):
+        for pergunta, resposta in historico:
+            with st.chat_message("user"):
+                st.markdown(pergunta)
+            with st.chat_message("assistant"):
+                st.markdown(resposta)
+
+
+def mostrar_fotos(miniaturas: tuple) -> None:
+    if miniaturas:
+        st.image(list(miniaturas), width=160)
+
+
+def mostrar_resposta(r: dict) -> None:
+    mostrar_historico(r["historico"])
+    mostrar_fotos(r["fotos"])
+    st.subheader("Resposta:")
+    st.write(r["resposta"])
+    for aviso in r["avisos"]:
+        st.caption(aviso)
+
+
+def coletar_esboco(r: dict) -> bool:
+    """Recolhe a decisão de esboço que rodava em segundo plano. True se o estado mudou."""
+    fut = st.session_state.get("tarefas_pendentes", {}).get("esboco")
+    if fut is None:
+        return False
+    if fut.done():
+        st.session_state["tarefas_pendentes"].pop("esboco")
         try:
-            data = json.loads(raw)
+            r["esboco"] = fut.result()
         except Exception:
-            m = re.search(r"\{.*\}", raw, flags=re.DOTALL)
-            data = json.loads(m.group(0)) if m else {"need_sketch": False, "reason": "Não consegui interpretar a decisão.", "sketch_prompt": ""}
+            r["esboco"] = {"need_sketch": False, "reason": MSG_FALHA_ESBOCO, "sketch_prompt": ""}
+        else:
+            if r.get("id_historico"):
+                get_historico_perguntas().atualizar_esboco(r["id_historico"], r["esboco"])
+        r["esboco_status"] = None
+        return True
+    if time.monotonic() - r["esboco_desde"] > TIMEOUT_TAREFAS_S:
+        st.session_state["tarefas_pendentes"].pop("esboco")
+        fut.cancel()
+        r["esboco_status"] = "timeout"
+        return True
+    return False
+
+
+def secao_esboco() -> None:
+    """Sugestão de esboço; enquanto a decisão está pendente, o fragmento se reexecuta sozinho."""
+    r = st.session_state.get("resultado")
+    if r is None:
+        return
+    if coletar_esboco(r) and st.session_state.get("esboco_aguardando"):
+        # decisão chegou numa reexecução do fragmento: um rerun completo desliga o timer
+        st.rerun()
+    status = r["esboco_status"]
+    if status == "pendente":
+        st.caption("✍️ Checando se um esboço ajudaria…")
+    elif status == "pausado":
+        st.caption("✍️ Sugestão de esboço pausada: o Gemini está instável no momento.")
+    elif status == "timeout":
+        st.caption("Decisão de esboço demorou demais; tente de novo.")
+    elif r["esboco"] is not None:
+        mostrar_esboco(r["esboco"])
+
+
+@st.fragment
+def secao_exportar() -> None:
+    """Exportação (PDF + copiar): interações aqui reexecutam só este fragmento."""
+    r = st.session_state.get("resultado")
+    if r is None:
+        return
+    pergunta, resposta, historico = r["pergunta"], r["resposta"], r["historico"]
+
+    # Botão de exportação (fica logo após a resposta)
+    titulo = "📄 Exportar conversa" if historico else "📄 Exportar resposta"
+    st.markdown(f"<h4 style='font-size:1.1rem; margin-top:1.5rem;'>{titulo}</h4>", unsafe_allow_html=True)
+
+    # Dois botões lado a lado
+    col_pdf, col_copy = st.columns([1, 1])
+
+    with col_pdf:
+        if not _PDF_OK:
+            st.warning("Exportação PDF indisponível: instale `reportlab` no requirements.txt.")
+        else:
+            # PDF sob demanda: só é montado quando o download é pedido
+            mostrar_download_pdf(pergunta, resposta, historico, r["fotos"])
+
+    with col_copy:
+        # Prepara texto completo para copiar
+        texto_completo = f"\n\n{'='*50}\n\n".join(
+            f"PERGUNTA:\n{p}\n\n{'='*50}\n\nRESPOSTA:\n{r}" for p, r in [*historico, (pergunta, resposta)]
+        )
+
+        # Botão de copiar com JavaScript (azul marinho)
+        copy_button_html = f"""
+        <button onclick="copyToClipboard()" 
+                style="width:100%; padding:0.5rem 1rem; background-color:#1e3a8a; 
+                       color:white; border:1px solid #2563eb; border-radius:0.5rem; 
+                       cursor:pointer; font-size:0.9rem; font-weight:500;">
+            📋 Copiar texto
+        </button>
+        <textarea id="textToCopy" style="position:absolute; left:-9999px;">{texto_completo}</textarea>
+        <script>
+        function copyToClipboard() {{
+            const text = document.getElementById('textToCopy').value;
+            navigator.clipboard.writeText(text).then(function() {{
+                const btn = event.target;
+                const original = btn.innerHTML;
+                btn.innerHTML = '✅ Copiado!';
+                btn.style.backgroundColor = '#0e7c0e';
+                setTimeout(function() {{
+                    btn.innerHTML = original;
+                    btn.style.backgroundColor = '#1e3a8a';
+                }}, 2000);
+            }}, function(err) {{
+                alert('Erro ao copiar: ' + err);
+            }});
+        }}
+        </script>
+        """
+        components.html(copy_button_html, height=50)
+
+    entradas = st.session_state.get("respostas_sessao", [])
+    if _PDF_OK and len(entradas) > 1:
+        mostrar_download_relatorio(tuple(entradas))
 
-        return {
-            "need_sketch": bool(data.get("need_sketch", False)),
-            "reason": str(data.get("reason", "")).strip(),
-            "sketch_prompt": str(data.get("sketch_prompt", "")).strip(),
-        }
-    except Exception:
-        return {"need_sketch": False, "reason": "Falha ao decidir esboço.", "sketch_prompt": ""}
 
 # =========================
-# Exportação PDF
+# Fotos da ferida
 # =========================
-def wrap_text(text: str, max_chars: int = 110) -> list[str]:
-    """Quebra texto em linhas por comprimento aproximado (robusto e simples)."""
-    lines: list[str] = []
-    for para in (text or "").splitlines():
-        if not para.strip():
-            lines.append("")
-            continue
-        words = para.split()
-        line = ""
-        for w in words:
-            test = (line + " " + w).strip()
-            if len(test) <= max_chars:
-                line = test
-            else:
-                if line:
-                    lines.append(line)
-                line = w
-        if line:
-            lines.append(line)
-    return lines
-
-
-class NumberedCanvas(canvas.Canvas):
-    def __init__(self, *args, footer_text: str = "", **kwargs):
-        super().__init__(*args, **kwargs)
-        self._saved_page_states = []
-        self._footer_text = footer_text
-
-    def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
-
-    def save(self):
-        num_pages = len(self._saved_page_states)
-        for i, state in enumerate(self._saved_page_states, start=1):
-            self.__dict__.update(state)
-            self._draw_footer(i, num_pages)
-            super().showPage()
-        super().save()
-
-    def _draw_footer(self, page_num: int, total_pages: int):
-        width, _ = self._pagesize
-        margin = 2 * cm
-        y = 1.2 * cm
-
-        self.setFont("Helvetica", 9)
-        self.drawString(margin, y, self._footer_text)
-        self.drawRightString(width - margin, y, f"Página {page_num} de {total_pages}")
-
-
-def gerar_pdf_a4(pergunta: str, resposta: str) -> bytes:
-    """Gera PDF A4 com banner no cabeçalho, rodapé fixo e numeração."""
-    footer_text = "PET G10 UFPel - Telemonitoramento de Feridas Crônicas"
-
-    buffer = io.BytesIO()
-    c = NumberedCanvas(buffer, pagesize=A4, footer_text=footer_text)
-    largura, altura = A4
-
-    margem_esq = 2 * cm
-    margem_dir = 2 * cm
-    margem_inf = 2 * cm
-    y = altura - 2 * cm
-
-    # --- Banner no topo (proporcional, sem deformar) ---
-    banner = Path(__file__).parent / "assets" / "banner.pdf.a4.png"
-    largura_util = largura - margem_esq - margem_dir
-    max_banner_h = 3.2 * cm  # ajuste fino: 2.8–3.6 cm
-
-    if banner.exists():
-        img = ImageReader(str(banner))
-        iw, ih = img.getSize()
-
-        # escala para caber na largura
-        escala = largura_util / float(iw)
-        w = largura_util
-        h = ih * escala
-
-        # se ficou alto demais, limita pela altura máxima (mantém proporção)
-        if h > max_banner_h:
-            escala = max_banner_h / float(ih)
-            h = max_banner_h
-            w = iw * escala
-
-        # centraliza horizontalmente se sobrou espaço (quando limitou pela altura)
-        x = margem_esq + (largura_util - w) / 2.0
-
-        c.drawImage(
-            img,
-            x,
-            y - h,
-            width=w,
-            height=h,
-            preserveAspectRatio=True,
-            mask="auto",
+def preparar_fotos(arquivos: list) -> tuple[list, list[str]]:
+    """Fotos reduzidas (cache por hash do conteúdo) e os avisos para o usuário."""
+    fotos, avisos = [], []
+    if len(arquivos) > MAX_FOTOS:
+        avisos.append(f"📷 Só as {MAX_FOTOS} primeiras fotos foram enviadas ao Gemini.")
+    processador = get_processador_fotos()
+    with telemetria.medir("fotos.processar", fotos=min(len(arquivos), MAX_FOTOS)) as extra:
+        for arq in arquivos[:MAX_FOTOS]:
+            try:
+                fotos.append(processador.processar(arq.getvalue()))
+            except FotoInvalida as e:
+                avisos.append(f"📷 {arq.name}: {e} Foto ignorada.")
+        extra.update(bytes_original=sum(f.bytes_original for f in fotos),
+                     bytes_enviados=sum(len(f.dados) for f in fotos))
+    if fotos:
+        avisos.append(
+            f"📷 {len(fotos)} foto{'s' if len(fotos) > 1 else ''} sem metadados, "
+            f"{extra['bytes_original'] / 2**20:.1f} MiB → {extra['bytes_enviados'] / 2**20:.2f} MiB "
+            f"(~{sum(f.tokens for f in fotos)} tokens de imagem)."
         )
-        y -= h + 0.8 * cm
-    else:
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(margem_esq, y, f"Banner não encontrado: {banner}")
-        y -= 0.8 * cm
-
-    c.setFont("Helvetica", 10)
-    for linha in wrap_text(pergunta):
-        if y < (margem_inf + 1.6 * cm):  # reserva espaço pro rodapé
-            c.showPage()
-            y = altura - 2 * cm
-            c.setFont("Helvetica", 10)
-        c.drawString(margem_esq, y, linha)
-        y -= 0.45 * cm
-
-    y -= 0.8 * cm
-    if y < (margem_inf + 1.6 * cm):
-        c.showPage()
-        y = altura - 2 * cm
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margem_esq, y, "Resposta do Sistema")
-    y -= 0.6 * cm
-
-    c.setFont("Helvetica", 10)
-    for linha in wrap_text(resposta):
-        if y < (margem_inf + 1.6 * cm):
-            c.showPage()
-            y = altura - 2 * cm
-            c.setFont("Helvetica", 10)
-        c.drawString(margem_esq, y, linha)
-        y -= 0.45 * cm
-
-    c.save()
-    buffer.seek(0)
-    return buffer.getvalue()
+    return fotos, avisos
 
 
 # =========================
 # Execução
 # =========================
-# O envio é feito pelo botão dentro do componente HTML acima
+resposta_exibida = False
 if enviar and prompt:
     if not prompt.strip():
         st.warning("Escreve algo antes. O modelo não lê pensamento (ainda). 😄")
         st.stop()
 
-    with st.spinner("Gerando resposta..."):
-        try:
-            model = genai.GenerativeModel(model_name=model_name)
-            resp = model.generate_content(
-                build_prompt(prompt),
-                generation_config=genai.types.GenerationConfig(
-                    temperature=temperature,
-                ),
-            )
+    t_envio = time.perf_counter()
+    # Nova pergunta: descarta o resultado e as tarefas da anterior
+    cancelar_tarefas_pendentes()
+    st.session_state.pop("resultado", None)
+    configurar_gemini(api_key, impressao_api)
 
-            st.subheader("Resposta:")
-            text = getattr(resp, "text", None)
-            final_text = text if text else str(resp)
-            st.write(final_text)
-
-            # --- Sugestão de esboço (quando fizer sentido) ---
-            if auto_sketch:
-                with st.spinner("Checando se um esboço ajudaria…"):
-                    d = decidir_esboco(prompt, final_text)
-                if d.get("need_sketch"):
-                    st.markdown("### ✍️ Sugestão de esboço")
-                    if d.get("reason"):
-                        st.info(d["reason"])
-
-                    # BÔNUS ELEGANTE: mostra o prompt com wrap + evita variável não definida
-                    sketch = (d.get("sketch_prompt") or "").strip()
-                    if sketch:
-                        st.info("✅ O sistema sugere que um esboço ajudaria. Copie o prompt abaixo.")
-                        st.text_area(
-                            "Prompt do esboço (PT-BR) — copie e cole no gerador de imagens",
-                            value=sketch,
-                            height=200,
-                        )
-                        
-                        # Botões de download e copiar lado a lado
-                        col_download, col_copy_sketch = st.columns([1, 1])
-                        
-                        with col_download:
-                            st.download_button(
-                                "💾 Baixar prompt (.txt)",
-                                data=sketch.encode("utf-8"),
-                                file_name="prompt_esboco.txt",
-                                mime="text/plain; charset=utf-8",
-                                use_container_width=True,
+    try:
+        cache = get_cache_respostas()
+        guarda = get_guarda()
+
+        # Conversa: espera o resumo da rodada anterior (se ainda estiver rodando)
+        if not conversa_ativa:
+            conversa = Conversa()
+        compactacao = st.session_state.pop("compactacao", None)
+        if compactacao is not None:
+            try:
+                compactacao.result(timeout=TIMEOUT_TAREFAS_S)
+            except Exception:
+                pass  # sem resumo novo: segue com o histórico como está
+        historico = tuple(conversa.turnos)
+        fotos, avisos_fotos = preparar_fotos(fotos_enviadas) if fotos_enviadas else ([], [])
+
+        with telemetria.medir("build_prompt", modo=mode):
+            prompt_montado = build_prompt(prompt, mode, fotos=len(fotos))
+            conteudos = conversa.conteudos(prompt_montado, mode)
+        # com histórico, a resposta depende do contexto: a chave do cache inclui tudo o que vai ao modelo
+        texto_chave = conteudos if isinstance(conteudos, str) else json.dumps(conteudos, ensure_ascii=False)
+        if fotos:
+            # as fotos entram pela identidade do conteúdo (hash), não pelos bytes
+            texto_chave += f"\n[fotos {','.join(f.chave for f in fotos)}]"
+        # documentos mudaram → respostas antigas (sem os trechos novos) deixam de valer
+        base = get_base_conhecimento()
+        base.verificar()
+        if base.versao:
+            texto_chave += f"\n[base de conhecimento {base.versao}]"
+        chave = chave_cache(texto_chave, mode, model_name, temperature)
+        with telemetria.medir("cache.exato", modelo=model_name, modo=mode) as extra:
+            final_text = cache.obter(chave)
+            extra["hit"] = final_text is not None
+
+        # Sem hit exato: procura pergunta parecida no cache semântico (só sem histórico e sem fotos)
+        semantico = get_cache_semantico()
+        vetor = achado = busca_ms = None  # busca_ms: só desta pergunta (a do índice é do processo)
+        if final_text is None and not historico and not fotos and semantico.reaproveita(mode):
+            with telemetria.medir("cache.semantico", modelo=model_name, modo=mode) as extra:
+                try:
+                    vetor = semantico.vetor(prompt)
+                    t_busca = time.perf_counter()
+                    achado = semantico.procurar_resposta(vetor, mode, model_name, temperature, base.versao)
+                    busca_ms = (time.perf_counter() - t_busca) * 1000
+                except Exception:
+                    vetor = None  # embedding indisponível: segue sem cache semântico
+                extra["hit"] = achado is not None
+
+        avisos: list[str] = avisos_fotos
+        modelo_resposta = model_name
+        esboco_embutido = None
+        lider = True  # False quando a resposta veio de uma chamada de outra sessão (singleflight)
+        origem = "gemini"
+        if final_text is not None:
+            origem = "cache"
+            avisos.append("⚡ Cache: hit — resposta reaproveitada, sem chamada à API.")
+        elif achado is not None:
+            origem = "semantico"
+            similaridade, meta = achado
+            final_text = meta["resposta"]
+            avisos.append(
+                f"🧠 Cache semântico: hit (similaridade {similaridade:.2f}, busca em "
+                f"{busca_ms:.1f} ms) — pergunta parecida: “{meta['pergunta'][:120]}”"
+            )
+        else:
+            mostrar_historico(historico)
+            mostrar_fotos(tuple(f.miniatura for f in fotos))
+            # instância reaproveitada; a instrução fixa do modo já vai em system_instruction
+            # (com o pedido da decisão de esboço no fim, quando ligado)
+            embutir = auto_sketch and ESBOCO_NA_RESPOSTA
+            historico_tokens = conversa.tokens_historico() if historico else None
+
+            # Mesma pergunta já em andamento em outra sessão (ex.: a turma enviando o caso
+            # projetado pelo professor): espera aquela chamada e reparte o stream dela
+            voos = get_singleflight()
+            chave_voo = f"{chave}|{int(embutir)}"
+            transmissao, lider = voos.entrar(chave_voo, Transmissao)
+            t0 = time.perf_counter()
+            if lider:
+                try:
+                    # Trechos dos documentos locais: só os relevantes vão ao prompt
+                    trechos = []
+                    if len(base):
+                        t_rag = time.perf_counter()
+                        with telemetria.medir("rag.buscar", modo=mode) as extra:
+                            trechos = base.buscar(
+                                prompt, k=TRECHOS_POR_PERGUNTA, orcamento_ms=ORCAMENTO_BUSCA_MS,
+                                vetor=vetor if base.embedder is semantico.embedder else None,
                             )
-                        
-                        with col_copy_sketch:
-                            # Botão de copiar o prompt do esboço (azul marinho)
-                            copy_sketch_html = f"""
-                            <button onclick="copySketchPrompt()" 
-                                    style="width:100%; padding:0.5rem 1rem; background-color:#1e3a8a; 
-                                           color:white; border:1px solid #2563eb; border-radius:0.5rem; 
-                                           cursor:pointer; font-size:0.9rem; font-weight:500;">
-                                📋 Copiar prompt
-                            </button>
-                            <textarea id="sketchTextToCopy" style="position:absolute; left:-9999px;">{sketch}</textarea>
-                            <script>
-                            function copySketchPrompt() {{
-                                const text = document.getElementById('sketchTextToCopy').value;
-                                navigator.clipboard.writeText(text).then(function() {{
-                                    const btn = event.target;
-                                    const original = btn.innerHTML;
-                                    btn.innerHTML = '✅ Copiado!';
-                                    btn.style.backgroundColor = '#0e7c0e';
-                                    setTimeout(function() {{
-                                        btn.innerHTML = original;
-                                        btn.style.backgroundColor = '#1e3a8a';
-                                    }}, 2000);
-                                }}, function(err) {{
-                                    alert('Erro ao copiar: ' + err);
-                                }});
-                            }}
-                            </script>
-                            """
-                            components.html(copy_sketch_html, height=50)
-                    else:
-                        st.caption("O decisor marcou que um esboço ajudaria, mas não gerou um prompt. Tente novamente ou reformule o caso.")
-
-                    st.caption(
-                        "Dica: cole esse prompt em um gerador de imagens (NanoBanana, Leonardo, Stable Diffusion, etc.). "
-                        "Se quiser, eu também posso adaptar o prompt para a ferramenta que você for usar."
-                    )
-
-            # Guarda para exportação em PDF
-            st.session_state["ultima_pergunta"] = prompt
-            st.session_state["ultima_resposta"] = final_text
-            st.session_state["ultimo_modelo"] = model_name
-            st.session_state["ultimo_modo"] = mode
-
-            # Botão de exportação (fica logo após a resposta)
-            st.markdown("<h4 style='font-size:1.1rem; margin-top:1.5rem;'>📄 Exportar resposta</h4>", unsafe_allow_html=True)
-            
-            # Dois botões lado a lado
-            col_pdf, col_copy = st.columns([1, 1])
-            
-            with col_pdf:
-                if not _PDF_OK:
-                    st.warning("Exportação PDF indisponível: instale `reportlab` no requirements.txt.")
-                else:
-                    pdf_bytes = gerar_pdf_a4(prompt, final_text)
-                    st.download_button(
-                        "📥 Gerar PDF A4",
-                        data=pdf_bytes,
-                        file_name="ensina_feridas_resposta.pdf",
-                        mime="application/pdf",
-                        key="download_pdf_a4",
-                        use_container_width=True,
+                            extra.update(trechos=len(trechos), fonte=base.ultima_fonte)
+                    if trechos:
+                        prompt_montado = build_prompt(prompt, mode, trechos, fotos=len(fotos))
+                        conteudos = conversa.conteudos(prompt_montado, mode)
+                        avisos.append("📚 Base local: " + "; ".join(t["rotulo"] for t in trechos)
+                                      + f" (busca em {(time.perf_counter() - t_rag) * 1000:.0f} ms).")
+                    tokens_prompt = estimar_tokens(
+                        conteudos if isinstance(conteudos, str) else json.dumps(conteudos, ensure_ascii=False)
+                    ) + sum(f.tokens for f in fotos)
+                    conteudos = anexar_imagens(conteudos, [f.parte() for f in fotos])
+
+                    def chamada(nome: str, essencial: bool = True):
+                        model = get_modelo(nome, mode, embutir)
+
+                        def executar():
+                            # stream=True: o SDK só bloqueia até o primeiro pedaço chegar
+                            # passa pelo limitador/retry/disjuntor compartilhados do processo
+                            t = time.perf_counter()
+                            resp = guarda.executar(
+                                lambda: model.generate_content(
+                                    conteudos,
+                                    generation_config={"temperature": temperature},
+                                    stream=True,
+                                ),
+                                tokens=tokens_prompt,
+                                essencial=essencial,
+                            )
+                            # medido por modelo (inclusive o perdedor do hedge): é a base do atraso do plano B
+                            telemetria.registrar("gemini.ttft", (time.perf_counter() - t) * 1000, modelo=nome,
+                                                 modo=mode, historico_tokens=historico_tokens)
+                            return resp
+
+                        return executar
+
+                    with st.spinner("Gerando resposta..."):
+                        if usar_hedge and reserva_model:
+                            atraso = atraso_hedge_s(model_name)
+                            # o reserva é não essencial: com o Gemini instável, o disjuntor corta o plano B primeiro
+                            vencedor, resp, disparou = hedge(
+                                get_executor_gemini(), chamada(model_name), chamada(reserva_model, essencial=False),
+                                atraso, descartar=fechar_stream,
+                            )
+                            if vencedor == "reserva":
+                                modelo_resposta = reserva_model
+                                avisos.append(f"⏱️ Plano B: respondido por {reserva_model} ({model_name} "
+                                              f"não começou a responder em {atraso:.1f} s).")
+                            telemetria.registrar("gemini.hedge", (time.perf_counter() - t0) * 1000,
+                                                 modelo=model_name, modo=mode, reserva=reserva_model,
+                                                 atraso_ms=round(atraso * 1000), disparou=disparou, vencedor=vencedor)
+                        else:
+                            resp = chamada(model_name)()
+                except BaseException as e:
+                    transmissao.falhar(e)
+                    voos.sair(chave_voo, transmissao)
+                    raise
+                transmissao.iniciar(resp, modelo=modelo_resposta, avisos=list(avisos))
+            else:
+                with st.spinner("Gerando resposta (a mesma pergunta já está sendo respondida)..."):
+                    meta = transmissao.aguardar(timeout=TIMEOUT_TAREFAS_S)
+                modelo_resposta = meta["modelo"]
+                origem = "coalescido"
+                avisos.extend(meta["avisos"])
+                avisos.append("🔗 Mesma pergunta já em andamento em outra sessão: resposta compartilhada, "
+                              "sem nova chamada à API.")
+                telemetria.registrar("gemini.coalescido", (time.perf_counter() - t0) * 1000, modelo=modelo_resposta,
+                                     modo=mode, tipo="resposta")
+            resp = transmissao.leitor()
+
+            try:
+                if modelo_resposta != model_name:
+                    # resposta de outro modelo: cache (resposta e esboço) na chave dele
+                    chave = chave_cache(texto_chave, mode, modelo_resposta, temperature)
+
+                st.subheader("Resposta:")
+                partes: list[str] = []
+                interrompido = False
+                try:
+                    # o bloco JSON do esboço (depois do marcador) não aparece na tela
+                    st.write_stream(filtrar_marcador(stream_texto(resp, partes)))
+                except Exception:
+                    # stream caiu no meio: se já chegou texto, segue com o parcial
+                    if not partes:
+                        raise
+                    interrompido = True
+                    st.warning("A conexão com o Gemini caiu no meio da resposta. Exibindo o que chegou.")
+
+                final_text, esboco_embutido = separar_esboco("".join(partes))
+                motivo = motivo_interrupcao(resp)
+                if lider:
+                    telemetria.registrar(
+                        "gemini.total", (time.perf_counter() - t0) * 1000, modelo=modelo_resposta, modo=mode,
+                        esboco_embutido=(esboco_embutido is not None) if embutir else None, **uso_tokens(resp)
                     )
-            
-            with col_copy:
-                # Prepara texto completo para copiar
-                texto_completo = f"PERGUNTA:\n{prompt}\n\n{'='*50}\n\nRESPOSTA:\n{final_text}"
-                
-                # Botão de copiar com JavaScript (azul marinho)
-                copy_button_html = f"""
-                <button onclick="copyToClipboard()" 
-                        style="width:100%; padding:0.5rem 1rem; background-color:#1e3a8a; 
-                               color:white; border:1px solid #2563eb; border-radius:0.5rem; 
-                               cursor:pointer; font-size:0.9rem; font-weight:500;">
-                    📋 Copiar texto
-                </button>
-                <textarea id="textToCopy" style="position:absolute; left:-9999px;">{texto_completo}</textarea>
-                <script>
-                function copyToClipboard() {{
-                    const text = document.getElementById('textToCopy').value;
-                    navigator.clipboard.writeText(text).then(function() {{
-                        const btn = event.target;
-                        const original = btn.innerHTML;
-                        btn.innerHTML = '✅ Copiado!';
-                        btn.style.backgroundColor = '#0e7c0e';
-                        setTimeout(function() {{
-                            btn.innerHTML = original;
-                            btn.style.backgroundColor = '#1e3a8a';
-                        }}, 2000);
-                    }}, function(err) {{
-                        alert('Erro ao copiar: ' + err);
-                    }});
-                }}
-                </script>
-                """
-                components.html(copy_button_html, height=50)
-
-        except Exception as e:
-            st.error("Erro ao chamar o Gemini:")
-            st.exception(e)
+                if not final_text:
+                    st.warning(f"O Gemini não retornou texto ({motivo or 'resposta vazia'}).")
+                    st.stop()
+                if motivo:
+                    avisos.append(f"⚠️ Resposta possivelmente incompleta ({motivo}).")
+                elif interrompido:
+                    avisos.append("⚠️ Resposta incompleta: a conexão com o Gemini caiu no meio.")
+                elif lider:
+                    # só guarda respostas completas (uma vez: quem repartiu o stream não grava de novo)
+                    cache.guardar(chave, final_text, modelo=modelo_resposta, modo=mode)
+                    if esboco_embutido is not None:
+                        cache.guardar_esboco(chave, esboco_embutido)
+                    if vetor is not None:
+                        semantico.adicionar(vetor, mode, modelo_resposta, temperature, base.versao, prompt, final_text)
+                if lider:
+                    busca = f" (busca semântica em {busca_ms:.1f} ms)" if busca_ms is not None else ""
+                    avisos.append(f"🌐 Cache: miss — resposta nova do Gemini{busca}.")
+                for aviso in avisos:
+                    st.caption(aviso)
+                resposta_exibida = True
+            finally:
+                if lider:
+                    voos.sair(chave_voo, transmissao)
+
+        # --- Decisão de esboço: veio junto com a resposta, está no cache, o
+        # pré-classificador local resolve, ou roda em segundo plano numa segunda
+        # chamada (pool compartilhado do processo) ---
+        esboco = esboco_embutido or (cache.obter_esboco(chave) if auto_sketch else None)
+        esboco_status = None
+        local = (MODELO, None)
+        if auto_sketch and (esboco is None or esboco_embutido is not None):
+            t_pre = time.perf_counter()
+            local = get_pre_classificador().decidir(prompt, final_text)
+            if esboco_embutido is None:
+                # com a decisão embutida, a local só vira dado de concordância: não poupou chamada nenhuma
+                telemetria.registrar("esboco.pre", (time.perf_counter() - t_pre) * 1000, classe=local[0])
+        if esboco_embutido is not None and lider:
+            # decisão do Gemini de graça: vira dado de treino/concordância
+            get_registro_decisoes().registrar(prompt, final_text, esboco_embutido["need_sketch"], "embutido", *local)
+        elif auto_sketch and esboco is None and local[0] == NAO:
+            # só o "não" dispensa o Gemini; no "sim", a chamada abaixo escreve o prompt do esboço
+            esboco = decisao_local(local[0])
+            if random.random() < TAXA_AUDITORIA_ESBOCO:
+                submeter_esboco(cache, chave, prompt, final_text, model_name, local)
+        if auto_sketch and esboco is None:
+            try:
+                # com o Gemini instável, a decisão de esboço é a primeira coisa a ser cortada
+                guarda.disjuntor.permitir(essencial=False)
+            except CircuitoAberto:
+                esboco_status = "pausado"
+            else:
+                st.session_state["tarefas_pendentes"] = {
+                    "esboco": submeter_esboco(cache, chave, prompt, final_text, model_name, local)
+                }
+                esboco_status = "pendente"
+
+        # --- Conversa: guarda o turno e resume os antigos em segundo plano ---
+        if conversa_ativa:
+            conversa.adicionar(prompt, final_text)
+            if conversa.precisa_compactar():
+                st.session_state["compactacao"] = get_executor().submit(
+                    conversa.compactar, model_name, get_cliente_auxiliar()
+                )
+
+        # Histórico persistente (o resultado da sessão some no F5; este fica)
+        try:
+            id_historico = get_historico_perguntas().registrar(
+                sessao_id, prompt, final_text, modo=mode, modelo=modelo_resposta, origem=origem,
+                duracao_ms=(time.perf_counter() - t_envio) * 1000, conversa=conversa.id, esboco=esboco,
+                fotos=len(fotos),
+            )
+        except sqlite3.Error:
+            id_historico = None  # histórico indisponível não derruba a resposta
+
+        st.session_state["resultado"] = {
+            "id_historico": id_historico,
+            "pergunta": prompt,
+            "resposta": final_text,
+            "modelo": modelo_resposta,
+            "modo": mode,
+            "avisos": avisos,
+            "historico": historico,
+            "fotos": tuple(f.miniatura for f in fotos),
+            "esboco": esboco,
+            "esboco_status": esboco_status,
+            "esboco_desde": time.monotonic(),
+        }
+        registrar_na_sessao(prompt, final_text)
+
+    except (LimiteExcedido, CircuitoAberto) as e:
+        st.warning(f"Muita demanda no Gemini agora — tente de novo em instantes. ({e})")
+    except Exception as e:
+        st.error("Erro ao chamar o Gemini:")
+        st.exception(e)
+
+resultado = st.session_state.get("resultado")
+if resultado is not None:
+    if not resposta_exibida:
+        mostrar_resposta(resultado)
+    # enquanto a decisão de esboço roda, só o fragmento dela é reexecutado (1x/s)
+    coletar_esboco(resultado)
+    aguardando = resultado["esboco_status"] == "pendente"
+    st.session_state["esboco_aguardando"] = aguardando
+    st.fragment(secao_esboco, run_every=1.0 if aguardando else None)()
+    secao_exportar()
+
+# Perguntas anteriores desta sessão: busca e páginas rodam só no fragmento
+with st.expander("🕘 Minhas perguntas anteriores"):
+    if st.query_params.get("sessao") == sessao_id:
+        st.warning("🔗 Este histórico está no endereço da página: quem tiver o link vê estas perguntas. "
+                   "Não compartilhe nem projete o endereço.")
+        if st.button("Tirar do endereço", key="sessao_fora_do_link"):
+            del st.query_params["sessao"]
+            st.rerun()
+    elif st.button("🔗 Manter no endereço da página", key="sessao_no_link",
+                   help="Para reabrir este histórico depois de recarregar a página. "
+                        "Quem tiver o link também vê as suas perguntas."):
+        st.query_params["sessao"] = sessao_id
+        st.rerun()
+    st.fragment(painel_historico.mostrar)(get_historico_perguntas(), sessao_id)
 
 st.divider()
 
+# Depois da página pronta: o aquecimento não disputa a primeira tela
+if AQUECER:
+    iniciar_aquecimento(api_key, impressao_api)
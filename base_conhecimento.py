@@ -0,0 +1,448 @@
+"""
+Base de conhecimento local: trechos dos protocolos e do material do curso no prompt.
+
+Os documentos (PDF, Markdown, TXT) de `DIR_DOCUMENTOS` são quebrados em
+trechos de ~`TAMANHO_TRECHO` caracteres. Cada trecho vira um vetor (o mesmo
+embedder do cache semântico) numa matriz float32 em disco, lida com
+`np.memmap`. Para cada pergunta, só os top-k trechos relevantes vão ao
+prompt — nunca o documento inteiro:
+
+- busca densa (produto escalar contra a matriz) e BM25 por palavras,
+  combinadas por reciprocal rank fusion; se o embedding da pergunta não sai
+  dentro do orçamento de latência (rede lenta, offline), fica só o BM25;
+- reindexação incremental: só arquivos novos ou alterados são lidos de
+  novo, e trechos com o mesmo texto reaproveitam o vetor já calculado.
+
+Arquivos (em `<pasta do índice>`, por embedder):
+  trechos-<embedder>.jsonl   um trecho por linha (arquivo, página, seção, texto, hash)
+  vetores-<embedder>.f32     matriz (trechos × dim), linhas normalizadas
+  arquivos-<embedder>.json   manifesto (mtime e tamanho de cada documento)
+
+Pré-computar o índice (ex.: antes do deploy):
+    python base_conhecimento.py indexar --embedder gemini
+    python base_conhecimento.py buscar "como manejar biofilme?"
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+DIR_DOCUMENTOS = Path(os.getenv("ENSINA_FERIDAS_DOCUMENTOS") or Path(__file__).parent / "documentos")
+EXTENSOES = {".pdf", ".md", ".markdown", ".txt"}
+
+TAMANHO_TRECHO = 900  # caracteres
+SOBREPOSICAO = 150  # entre janelas de um parágrafo longo
+K_PADRAO = 4
+MAX_CHARS_CONTEXTO = 5000  # teto dos trechos somados no prompt (~1,2k tokens)
+ORCAMENTO_PADRAO_MS = 250.0
+WORKERS_EMBEDDING = 2  # embeddings de pergunta em andamento ao mesmo tempo (além disso, só BM25)
+# Similaridade mínima para um trecho entrar pela busca densa, por embedder
+# (o de hashing tem mais ruído entre textos sem relação)
+LIMIAR_DENSO = {"hash512": 0.35, "text-embedding-004": 0.55}
+LIMIAR_DENSO_OUTROS = 0.5
+LIMIAR_BM25 = 0.5  # fração da melhor pontuação BM25 (e > 0) para entrar pela busca por palavras
+RRF_K = 60
+
+_STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e em entre era esta este isso la lhe mais mas me na nas no nos
+o os ou para pela pelas pelo pelos por qual quando que se sem ser seu sua sao so tem um uma umas uns
+the and of to in is for on with
+""".split())
+_PALAVRA = re.compile(r"[a-z0-9]{2,}")
+_TITULO_MD = re.compile(r"^(#{1,6})\s+(.*)$")
+
+
+def _tokens(texto: str) -> list[str]:
+    """Palavras sem acento e em minúsculas, sem stopwords; plural simples vira singular."""
+    texto = unicodedata.normalize("NFKD", texto or "").casefold().encode("ascii", "ignore").decode()
+    return [w[:-1] if len(w) > 4 and w.endswith("s") else w
+            for w in _PALAVRA.findall(texto) if w not in _STOPWORDS]
+
+
+# =========================
+# Leitura e quebra dos documentos
+# =========================
+def _paginas(caminho: Path) -> list[tuple[int | None, str]]:
+    """(página, texto) do documento; Markdown/TXT são uma "página" só."""
+    if caminho.suffix.lower() == ".pdf":
+        from pypdf import PdfReader  # opcional: sem pypdf, PDFs ficam de fora do índice
+
+        return [(i, p.extract_text() or "") for i, p in enumerate(PdfReader(caminho).pages, start=1)]
+    return [(None, caminho.read_text(encoding="utf-8", errors="replace"))]
+
+
+def _janelas(paragrafo: str) -> list[str]:
+    """Parágrafo maior que um trecho → janelas com sobreposição, cortadas em espaço."""
+    janelas, ini = [], 0
+    while ini < len(paragrafo):
+        fim = min(len(paragrafo), ini + TAMANHO_TRECHO)
+        if fim < len(paragrafo):
+            corte = paragrafo.rfind(" ", ini + TAMANHO_TRECHO // 2, fim)
+            fim = corte if corte > 0 else fim
+        janelas.append(paragrafo[ini:fim].strip())
+        if fim >= len(paragrafo):
+            break
+        ini = max(ini + 1, fim - SOBREPOSICAO)
+    return janelas
+
+
+def quebrar(texto: str) -> list[tuple[str, str]]:
+    """(seção, trecho): parágrafos agrupados até `TAMANHO_TRECHO`; títulos Markdown viram a seção."""
+    trechos: list[tuple[str, str]] = []
+    titulos: list[str] = []
+    atual: list[str] = []
+
+    def fechar() -> None:
+        if atual:
+            trechos.append((" › ".join(titulos), "\n".join(atual)))
+            atual.clear()
+
+    for bloco in re.split(r"\n\s*\n", texto or ""):
+        bloco = bloco.strip()
+        if not bloco:
+            continue
+        m = _TITULO_MD.match(bloco.splitlines()[0])
+        if m:
+            fechar()
+            nivel = len(m.group(1))
+            titulos[nivel - 1:] = [m.group(2).strip()]
+            bloco = "\n".join(bloco.splitlines()[1:]).strip()
+            if not bloco:
+                continue
+        bloco = " ".join(bloco.split())
+        if len(bloco) > TAMANHO_TRECHO:
+            fechar()
+            trechos.extend((" › ".join(titulos), j) for j in _janelas(bloco))
+        elif sum(map(len, atual)) + len(bloco) > TAMANHO_TRECHO:
+            fechar()
+            atual.append(bloco)
+        else:
+            atual.append(bloco)
+    fechar()
+    return trechos
+
+
+def trechos_documento(caminho: Path, raiz: Path) -> list[dict]:
+    nome = caminho.relative_to(raiz).as_posix()
+    saida = []
+    for pagina, texto in _paginas(caminho):
+        for secao, trecho in quebrar(texto):
+            rotulo = nome + (f", p. {pagina}" if pagina else "") + (f" › {secao}" if secao else "")
+            saida.append({"arquivo": nome, "pagina": pagina, "secao": secao, "rotulo": rotulo, "texto": trecho,
+                          "hash": hashlib.sha256(trecho.encode("utf-8")).hexdigest()[:20]})
+    return saida
+
+
+# =========================
+# BM25 (busca por palavras, sem rede)
+# =========================
+class BM25:
+    def __init__(self, documentos: list[list[str]], k1: float = 1.5, b: float = 0.75):
+        self.n = len(documentos)
+        comprimentos = np.array([len(d) for d in documentos], dtype=np.float32)
+        media = float(comprimentos.mean()) if self.n else 1.0
+        self._norma = k1 * (1 - b + b * comprimentos / max(media, 1.0))
+        self.k1 = k1
+        listas: dict[str, dict[int, int]] = {}
+        for i, doc in enumerate(documentos):
+            for t in doc:
+                contagem = listas.setdefault(t, {})
+                contagem[i] = contagem.get(i, 0) + 1
+        self._postings = {
+            t: (np.fromiter(c.keys(), dtype=np.int32, count=len(c)),
+                np.fromiter(c.values(), dtype=np.float32, count=len(c)),
+                math.log(1 + (self.n - len(c) + 0.5) / (len(c) + 0.5)))
+            for t, c in listas.items()
+        }
+
+    def pontuar(self, tokens: list[str]) -> np.ndarray:
+        pontos = np.zeros(self.n, dtype=np.float32)
+        for t in set(tokens):
+            if t in self._postings:
+                docs, tf, idf = self._postings[t]
+                pontos[docs] += idf * tf * (self.k1 + 1) / (tf + self._norma[docs])
+        return pontos
+
+
+# =========================
+# Índice
+# =========================
+class BaseConhecimento:
+    def __init__(self, pasta_documentos: Path, pasta_indice: Path, embedder, limiar_denso: float | None = None):
+        self.pasta_documentos = Path(pasta_documentos)
+        self.embedder = embedder
+        self.limiar_denso = limiar_denso or LIMIAR_DENSO.get(embedder.nome, LIMIAR_DENSO_OUTROS)
+        self.ultima_latencia_ms = 0.0
+        self.ultima_fonte = ""
+        self.ultimo_erro: str | None = None
+
+        pasta_indice = Path(pasta_indice)
+        pasta_indice.mkdir(parents=True, exist_ok=True)
+        self._arq_trechos = pasta_indice / f"trechos-{embedder.nome}.jsonl"
+        self._arq_vetores = pasta_indice / f"vetores-{embedder.nome}.f32"
+        self._arq_manifesto = pasta_indice / f"arquivos-{embedder.nome}.json"
+
+        self._lock = threading.Lock()
+        self._atualizando = False
+        self._proxima_verificacao = 0.0
+        # o embedding da pergunta roda aqui para respeitar o orçamento de latência; um que estourou
+        # o orçamento não tem como ser interrompido, então no máximo `WORKERS_EMBEDDING` de uma vez
+        self._pool = ThreadPoolExecutor(max_workers=WORKERS_EMBEDDING, thread_name_prefix="ensina-rag")
+        self._embeddings_em_curso = 0
+        self.embeddings_pulados = 0
+        self._carregar()
+
+    # ---- estado (trocado inteiro a cada reindexação; a busca só lê a referência) ----
+    def _carregar(self) -> None:
+        try:
+            manifesto = json.loads(self._arq_manifesto.read_text(encoding="utf-8"))
+            with self._arq_trechos.open(encoding="utf-8") as f:
+                trechos = [json.loads(l) for l in f if l.strip()]
+        except (OSError, ValueError):
+            manifesto, trechos = {}, []
+        matriz = None
+        if trechos and self._arq_vetores.exists():
+            dim = self._arq_vetores.stat().st_size // (4 * len(trechos))
+            matriz = np.memmap(self._arq_vetores, dtype=np.float32, mode="r", shape=(len(trechos), dim))
+        self._trocar(manifesto, trechos, matriz)
+
+    def _trocar(self, manifesto: dict, trechos: list[dict], matriz) -> None:
+        bm25 = BM25([_tokens(f"{t['secao']} {t['texto']}") for t in trechos])
+        versao = hashlib.sha256(json.dumps(manifesto, sort_keys=True).encode()).hexdigest()[:12] if trechos else ""
+        with self._lock:
+            self._estado = (manifesto, trechos, matriz, bm25, versao)
+
+    def __len__(self) -> int:
+        return len(self._estado[1])
+
+    @property
+    def versao(self) -> str:
+        """Muda quando os documentos mudam ("" sem documentos): entra na chave do cache de respostas."""
+        return self._estado[4]
+
+    # ---- reindexação ----
+    def _documentos(self) -> dict[str, list]:
+        if not self.pasta_documentos.is_dir():
+            return {}
+        atuais = {}
+        for caminho in sorted(self.pasta_documentos.rglob("*")):
+            if caminho.suffix.lower() in EXTENSOES and caminho.is_file():
+                st = caminho.stat()
+                atuais[caminho.relative_to(self.pasta_documentos).as_posix()] = [st.st_mtime_ns, st.st_size]
+        return atuais
+
+    def precisa_atualizar(self) -> bool:
+        return self._documentos() != self._estado[0]
+
+    def verificar(self, intervalo_s: float = 30.0) -> bool:
+        """Olha a pasta no máximo a cada `intervalo_s`; se mudou, reindexa numa thread. True se disparou."""
+        agora = time.monotonic()
+        with self._lock:
+            if self._atualizando or agora < self._proxima_verificacao:
+                return False
+            self._proxima_verificacao = agora + intervalo_s
+        if not self.precisa_atualizar():
+            return False
+        with self._lock:
+            if self._atualizando:
+                return False
+            self._atualizando = True
+        threading.Thread(target=self._atualizar_fundo, name="ensina-indexacao", daemon=True).start()
+        return True
+
+    def _atualizar_fundo(self) -> None:
+        try:
+            self.atualizar()
+        except Exception as e:
+            self.ultimo_erro = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self._atualizando = False
+
+    def _embed_varios(self, textos: list[str]) -> np.ndarray:
+        lote = getattr(self.embedder, "embed_lote", None)
+        vetores = lote(textos) if lote else [self.embedder.embed(t) for t in textos]
+        m = np.asarray(vetores, dtype=np.float32).reshape(len(textos), -1)
+        normas = np.linalg.norm(m, axis=1, keepdims=True)
+        return m / np.where(normas == 0, 1, normas)
+
+    def atualizar(self) -> dict:
+        """Reindexa só o que mudou na pasta de documentos (bloqueia). Devolve um resumo."""
+        manifesto_antigo, trechos_antigos, matriz_antiga, _, _ = self._estado
+        atuais = self._documentos()
+        if atuais == manifesto_antigo:
+            return {"documentos": len(atuais), "lidos": 0, "trechos": len(trechos_antigos), "embeddings_novos": 0,
+                    "reaproveitados": len(trechos_antigos), "erros": {}}
+        mantidos = {a for a, assinatura in atuais.items() if manifesto_antigo.get(a) == assinatura}
+        vetor_por_hash = {t["hash"]: i for i, t in enumerate(trechos_antigos)} if matriz_antiga is not None else {}
+
+        trechos: list[dict] = [t for t in trechos_antigos if t["arquivo"] in mantidos]
+        erros: dict[str, str] = {}
+        lidos = 0
+        for arquivo in atuais:
+            if arquivo in mantidos:
+                continue
+            try:
+                trechos.extend(trechos_documento(self.pasta_documentos / arquivo, self.pasta_documentos))
+                lidos += 1
+            except Exception as e:  # ex.: PDF sem pypdf instalado ou corrompido
+                erros[arquivo] = f"{type(e).__name__}: {e}"
+        trechos.sort(key=lambda t: (t["arquivo"], t["pagina"] or 0))
+
+        novos = [i for i, t in enumerate(trechos) if t["hash"] not in vetor_por_hash]
+        matriz = None
+        if trechos:
+            vetores_novos = self._embed_varios([trechos[i]["texto"] for i in novos]) if novos else None
+            dim = vetores_novos.shape[1] if vetores_novos is not None else matriz_antiga.shape[1]
+            matriz = np.empty((len(trechos), dim), dtype=np.float32)
+            for i, t in enumerate(trechos):
+                if t["hash"] in vetor_por_hash:
+                    matriz[i] = matriz_antiga[vetor_por_hash[t["hash"]]]
+            if novos:
+                matriz[novos] = vetores_novos
+
+        # grava em temporários e troca de uma vez: quem está buscando segue com o estado antigo
+        # arquivos com erro também entram no manifesto: só são relidos quando mudarem
+        manifesto = atuais
+        tmp = {arq: arq.with_suffix(arq.suffix + ".tmp") for arq in (self._arq_vetores, self._arq_trechos,
+                                                                    self._arq_manifesto)}
+        (matriz if matriz is not None else np.empty((0, 0), dtype=np.float32)).tofile(tmp[self._arq_vetores])
+        tmp[self._arq_trechos].write_text("".join(json.dumps(t, ensure_ascii=False) + "\n" for t in trechos),
+                                          encoding="utf-8")
+        tmp[self._arq_manifesto].write_text(json.dumps(manifesto), encoding="utf-8")
+        for arq, temporario in tmp.items():
+            os.replace(temporario, arq)
+        self._carregar()
+        self.ultimo_erro = "; ".join(f"{a}: {e}" for a, e in erros.items()) or None
+        return {"documentos": len(atuais), "lidos": lidos, "trechos": len(trechos), "embeddings_novos": len(novos),
+                "reaproveitados": len(trechos) - len(novos), "erros": erros}
+
+    # ---- busca ----
+    def buscar(self, pergunta: str, k: int = K_PADRAO, orcamento_ms: float = ORCAMENTO_PADRAO_MS,
+               vetor: np.ndarray | None = None, max_chars: int = MAX_CHARS_CONTEXTO) -> list[dict]:
+        """
+        Top-k trechos para `pergunta` (cada um com "rotulo", "texto" e "pontos").
+        `vetor` (normalizado, do mesmo embedder) evita um segundo embedding da pergunta.
+        """
+        t0 = time.perf_counter()
+        _, trechos, matriz, bm25, _ = self._estado
+        if not trechos:
+            self.ultima_latencia_ms, self.ultima_fonte = 0.0, ""
+            return []
+
+        if vetor is None and matriz is not None:
+            vetor = self._embed_pergunta(pergunta, orcamento_ms / 1000 - (time.perf_counter() - t0))
+
+        rankings, fontes = [], []
+        pontos_bm25 = bm25.pontuar(_tokens(pergunta))
+        melhor = float(pontos_bm25.max()) if len(pontos_bm25) else 0.0
+        if melhor > 0:
+            candidatos = np.flatnonzero(pontos_bm25 >= LIMIAR_BM25 * melhor)
+            rankings.append(candidatos[np.argsort(-pontos_bm25[candidatos])][: 4 * k])
+            fontes.append("bm25")
+        if vetor is not None and matriz is not None and vetor.shape[0] == matriz.shape[1]:
+            sims = np.asarray(matriz @ vetor)
+            candidatos = np.flatnonzero(sims >= self.limiar_denso)
+            rankings.append(candidatos[np.argsort(-sims[candidatos])][: 4 * k])
+            fontes.append("denso")
+        self.ultima_fonte = "+".join(fontes)
+
+        # reciprocal rank fusion: robusto a escalas diferentes de pontuação
+        fusao: dict[int, float] = {}
+        for ranking in rankings:
+            for pos, i in enumerate(ranking):
+                fusao[int(i)] = fusao.get(int(i), 0.0) + 1.0 / (RRF_K + pos + 1)
+        achados, total = [], 0
+        for i in sorted(fusao, key=fusao.get, reverse=True)[:k]:
+            t = trechos[i]
+            if achados and total + len(t["texto"]) > max_chars:
+                break
+            total += len(t["texto"])
+            achados.append({**t, "pontos": round(fusao[i], 5)})
+        self.ultima_latencia_ms = (time.perf_counter() - t0) * 1000
+        return achados
+
+    def _embed_pergunta(self, pergunta: str, prazo_s: float) -> np.ndarray | None:
+        """
+        Vetor normalizado da pergunta em até `prazo_s`, ou None (só palavras).
+        Com os workers ainda presos em embeddings que estouraram o orçamento,
+        nem tenta: ficaria na fila atrás deles e estouraria também.
+        """
+        with self._lock:
+            if self._embeddings_em_curso >= WORKERS_EMBEDDING:
+                self.embeddings_pulados += 1
+                return None
+            self._embeddings_em_curso += 1
+        fut = self._pool.submit(self.embedder.embed, pergunta)
+        fut.add_done_callback(self._embedding_terminou)
+        try:
+            v = np.asarray(fut.result(timeout=max(0.0, prazo_s)), dtype=np.float32)
+        except Exception:
+            fut.cancel()  # se ainda não começou, nem roda
+            return None  # sem embedding a tempo (ou offline)
+        n = float(np.linalg.norm(v))
+        return v / n if n else None
+
+    def _embedding_terminou(self, _fut) -> None:
+        with self._lock:
+            self._embeddings_em_curso -= 1
+
+    def estado(self) -> dict:
+        manifesto, trechos, matriz, _, versao = self._estado
+        return {"documentos": len(manifesto), "trechos": len(trechos), "versao": versao,
+                "dim": None if matriz is None else int(matriz.shape[1]), "indexando": self._atualizando,
+                "embeddings_pulados": self.embeddings_pulados, "erro": self.ultimo_erro}
+
+
+# =========================
+# CLI
+# =========================
+def main(argv: list[str] | None = None) -> None:
+    from cache_respostas import DIR_DADOS
+    from cache_semantico import EmbedderGemini, EmbedderHashing
+
+    p = argparse.ArgumentParser(description="Índice local dos documentos do Ensina Feridas.")
+    p.add_argument("comando", choices=["indexar", "buscar"])
+    p.add_argument("pergunta", nargs="?", default="")
+    p.add_argument("--documentos", default=str(DIR_DOCUMENTOS))
+    p.add_argument("--indice", default=str(DIR_DADOS / "conhecimento"))
+    p.add_argument("--embedder", choices=["hash", "gemini"],
+                   default=os.getenv("ENSINA_FERIDAS_EMBEDDER", "gemini"))
+    p.add_argument("-k", type=int, default=K_PADRAO)
+    args = p.parse_args(argv)
+
+    if args.embedder == "gemini":
+        from nucleo import configurar_sdk
+        from resiliencia import Disjuntor, GuardaGemini, Limitador
+
+        configurar_sdk(os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY"))
+        embedder = EmbedderGemini(guarda=GuardaGemini(
+            Limitador(rpm=float(os.getenv("ENSINA_FERIDAS_RPM", "60")),
+                      tpm=float(os.getenv("ENSINA_FERIDAS_TPM", "1000000"))),
+            Disjuntor(),
+        ))
+    else:
+        embedder = EmbedderHashing()
+    base = BaseConhecimento(Path(args.documentos), Path(args.indice), embedder)
+    if args.comando == "indexar":
+        t0 = time.perf_counter()
+        resumo = base.atualizar()
+        resumo["duracao_s"] = round(time.perf_counter() - t0, 3)
+        print(json.dumps(resumo, ensure_ascii=False, indent=2))
+        return
+    for t in base.buscar(args.pergunta, k=args.k, orcamento_ms=5000):
+        print(f"[{t['pontos']:.4f}] {t['rotulo']}\n    {t['texto'][:200]}…\n")
+    print(f"({base.ultima_fonte}, {base.ultima_latencia_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
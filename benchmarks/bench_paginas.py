@@ -0,0 +1,66 @@
+"""
+Memória e tempo do `NumberedCanvas` por número de páginas.
+
+Uso (na raiz do repositório):
+    python benchmarks/bench_paginas.py [1 50 500]
+
+Cada página recebe ~50 linhas de texto. O tempo é medido numa execução
+sem tracemalloc; o pico de memória Python numa segunda execução. O que
+sobra por página é o próprio conteúdo do PDF, que o ReportLab mantém em
+memória até `save()`.
+"""
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.lib.units import cm  # noqa: E402
+
+from exportar_pdf import FOOTER_TEXT, NumberedCanvas  # noqa: E402
+
+LINHA = "Tecido, Infecção/inflamação, Umidade e Bordas (TIME): avaliação e conduta. " * 2
+
+
+def gerar(paginas: int) -> int:
+    buffer = io.BytesIO()
+    c = NumberedCanvas(buffer, pagesize=A4, footer_text=FOOTER_TEXT)
+    _, altura = A4
+    for p in range(paginas):
+        if p:
+            c.showPage()
+        c.setFont("Helvetica", 10)
+        y = altura - 2 * cm
+        while y > 3.6 * cm:
+            c.drawString(2 * cm, y, LINHA[:110])
+            y -= 0.45 * cm
+    c.save()
+    return len(buffer.getvalue())
+
+
+def medir(paginas: int) -> dict:
+    t0 = time.perf_counter()
+    tamanho = gerar(paginas)
+    dt = time.perf_counter() - t0
+
+    tracemalloc.start()
+    gerar(paginas)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"paginas": paginas, "tempo_s": round(dt, 4), "pico_mib": round(pico / 2**20, 2),
+            "kib_por_pagina": round(pico / 1024 / paginas, 1), "pdf_kib": round(tamanho / 1024, 1)}
+
+
+def main(argv: list[str]) -> None:
+    paginas = [int(a) for a in argv] or [1, 50, 500]
+    print(f"{'páginas':>8} {'tempo (s)':>10} {'pico (MiB)':>11} {'KiB/pág':>8} {'PDF (KiB)':>10}")
+    for n in paginas:
+        r = medir(n)
+        print(f"{r['paginas']:>8} {r['tempo_s']:>10} {r['pico_mib']:>11} {r['kib_por_pagina']:>8} {r['pdf_kib']:>10}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,441 @@
+"""
+Benchmarks offline dos caminhos quentes do app (sem rede: backend Gemini falso).
+
+Uso (na raiz do repositório):
+    python benchmarks/bench_suite.py --saida bench.json
+    python benchmarks/bench_suite.py --secoes wrap pdf --paginas 1 50
+    python benchmarks/bench_suite.py --comparar base.json --saida atual.json
+
+Seções:
+  wrap    `wrap_text` em textos grandes
+  pdf     `gerar_pdf_a4` de 1 a 500 páginas (tempo e pico de memória Python)
+  relatorio  relatório com sumário (`relatorio_pdf`) de 10 e 100 respostas:
+          frio, com as seções em cache e com uma resposta nova
+  conhecimento  base de conhecimento local (`base_conhecimento`) com um acervo
+          sintético: indexação fria, reindexação sem e com mudança, busca
+          (densa + BM25 e só BM25) e tamanho do contexto no prompt
+  esboco  extração do JSON de `decidir_esboco` em saídas "sujas" do modelo
+  app     execução completa do `app.py` pelo `AppTest` do Streamlit
+          (primeira execução, pergunta nova, hit de cache e rerun ocioso)
+  partida partida a frio num interpretador novo: até a primeira tela,
+          segunda sessão e primeira pergunta (sem e com dados em disco)
+
+O resultado é um JSON (stdout ou `--saida`) com os tempos em ms e o
+ambiente da execução; `--comparar` mostra a razão atual/base de cada
+métrica de tempo/memória.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stderr
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from benchmarks import gemini_fake  # noqa: E402
+
+SECOES = ("wrap", "pdf", "relatorio", "conhecimento", "esboco", "app", "partida")
+
+
+def cronometrar(fn, repeticoes: int) -> dict:
+    """Mediana/mín/máx em ms de `repeticoes` chamadas de `fn`."""
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return {"mediana_ms": round(statistics.median(tempos), 3), "min_ms": round(min(tempos), 3),
+            "max_ms": round(max(tempos), 3), "repeticoes": repeticoes}
+
+
+# =========================
+# wrap_text
+# =========================
+def bench_wrap(repeticoes: int) -> list[dict]:
+    from exportar_pdf import largura_palavra, wrap_text
+
+    resultados = []
+    for tamanho in (10_000, 100_000, 1_000_000):
+        texto = gemini_fake.texto_resposta(f"wrap{tamanho}", tamanho)
+        largura_palavra.cache_clear()
+        t0 = time.perf_counter()
+        linhas = wrap_text(texto)
+        frio_ms = (time.perf_counter() - t0) * 1000
+        r = {"caracteres": len(texto), "linhas": len(linhas), "frio_ms": round(frio_ms, 3)}
+        r.update(cronometrar(lambda: wrap_text(texto), repeticoes))
+        resultados.append(r)
+    return resultados
+
+
+# =========================
+# gerar_pdf_a4
+# =========================
+def _contar_paginas(pdf: bytes) -> int:
+    return pdf.count(b"/Type /Page\n") or pdf.count(b"/Type /Page")  # "/Pages" não conta
+
+
+def bench_pdf(paginas: list[int], repeticoes: int) -> list[dict]:
+    from exportar_pdf import gerar_pdf_a4
+
+    pergunta = "Como avaliar uma lesão por pressão estágio 3 na região sacral?"
+    # calibra caracteres por página com duas respostas de tamanho conhecido
+    # (a primeira página tem banner e pergunta, então mede o incremento)
+    pags = [_contar_paginas(gerar_pdf_a4(pergunta, gemini_fake.texto_resposta("calibracao", n)))
+            for n in (20_000, 120_000)]
+    por_pagina = 100_000 / max(1, pags[1] - pags[0])
+
+    resultados = []
+    for alvo in paginas:
+        tamanho = max(500, int(20_000 + por_pagina * (alvo - pags[0] - 0.5)))
+        resposta = gemini_fake.texto_resposta(f"pdf{alvo}", tamanho)
+        pdf = gerar_pdf_a4(pergunta, resposta)
+        r = {"paginas_alvo": alvo, "paginas": _contar_paginas(pdf), "pdf_kib": round(len(pdf) / 1024, 1)}
+        r.update(cronometrar(lambda: gerar_pdf_a4(pergunta, resposta), repeticoes))
+
+        tracemalloc.start()
+        gerar_pdf_a4(pergunta, resposta)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        r["pico_mib"] = round(pico / 2**20, 2)
+        resultados.append(r)
+    return resultados
+
+
+# =========================
+# relatorio_pdf
+# =========================
+def bench_relatorio(repeticoes: int) -> list[dict]:
+    from relatorio_pdf import CacheSecoes, escrever_relatorio
+
+    resultados = []
+    for n in (10, 100):
+        entradas = [(f"Caso {i}: como conduzir lesão por pressão estágio {i % 4 + 1}?",
+                     gemini_fake.texto_resposta(f"rel{i}", 2000 + (i % 5) * 1500)) for i in range(n)]
+        nova = ("Caso extra: e se houver necrose?", gemini_fake.texto_resposta("rel-extra", 3000))
+
+        def escrever(cache, itens) -> int:
+            with tempfile.TemporaryFile() as f:
+                escrever_relatorio(itens, f, cache=cache)
+                return f.tell()
+
+        t0 = time.perf_counter()
+        tamanho = escrever(cache := CacheSecoes(), entradas)
+        r = {"entradas": n, "frio_ms": round((time.perf_counter() - t0) * 1000, 3), "pdf_kib": round(tamanho / 1024, 1)}
+        r.update(cronometrar(lambda: escrever(cache, entradas), repeticoes))
+        r["mais_uma_ms"] = cronometrar(lambda: escrever(cache, [*entradas, nova]), 1)["mediana_ms"]
+
+        tracemalloc.start()
+        escrever(CacheSecoes(), entradas)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        r["pico_mib"] = round(pico / 2**20, 2)
+        resultados.append(r)
+    return resultados
+
+
+# =========================
+# base de conhecimento
+# =========================
+def bench_conhecimento(repeticoes: int, documentos: int = 200) -> dict:
+    from base_conhecimento import BaseConhecimento
+    from cache_semantico import EmbedderHashing
+
+    temas = ["lesão por pressão", "biofilme", "pé diabético", "úlcera venosa", "queimadura", "deiscência"]
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta = Path(tmp) / "docs"
+        pasta.mkdir()
+        for i in range(documentos):
+            tema = temas[i % len(temas)]
+            secoes = [f"## Seção {j}\n\n" + gemini_fake.texto_resposta(f"doc{i}-{j}", 1500) for j in range(8)]
+            (pasta / f"protocolo_{i:03d}.md").write_text(f"# Protocolo {i}: {tema}\n\n" + "\n\n".join(secoes),
+                                                         encoding="utf-8")
+        acervo_chars = sum(len(a.read_text(encoding="utf-8")) for a in pasta.iterdir())
+        base = BaseConhecimento(pasta, Path(tmp) / "indice", EmbedderHashing())
+
+        t0 = time.perf_counter()
+        indexacao = base.atualizar()
+        r = {"documentos": documentos, "trechos": indexacao["trechos"], "acervo_kib": round(acervo_chars / 1024),
+             "indexar_frio_ms": round((time.perf_counter() - t0) * 1000, 3)}
+        r["reindexar_sem_mudanca_ms"] = cronometrar(base.atualizar, 1)["mediana_ms"]
+        alterado = pasta / "protocolo_000.md"
+        alterado.write_text(alterado.read_text(encoding="utf-8") + "\n\nAtualização: reavaliar em 7 dias.",
+                            encoding="utf-8")
+        t0 = time.perf_counter()
+        reindexacao = base.atualizar()
+        r["reindexar_um_arquivo_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        r["reindexar_embeddings_novos"] = reindexacao["embeddings_novos"]
+
+        perguntas = [f"como tratar {t} com exsudato e sinais de infecção?" for t in temas]
+        r["busca"] = cronometrar(lambda: [base.buscar(q) for q in perguntas], repeticoes)
+        r["busca"]["por_pergunta_ms"] = round(r["busca"]["mediana_ms"] / len(perguntas), 3)
+        # embedding que não sai dentro do orçamento: só BM25
+        lento = type("EmbedderLento", (), {"nome": base.embedder.nome, "embed": lambda _, t: time.sleep(1)})()
+        base.embedder, normal = lento, base.embedder
+        r["busca_so_bm25_ms"] = cronometrar(lambda: base.buscar(perguntas[0], orcamento_ms=50), 1)["mediana_ms"]
+        base.embedder = normal
+        r["contexto_chars"] = sum(len(t["texto"]) for t in base.buscar(perguntas[0]))
+    return r
+
+
+# =========================
+# decidir_esboco
+# =========================
+SAIDAS_SUJAS = [
+    ('{"need_sketch": true, "reason": "ok", "sketch_prompt": "corte da pele"}', True),
+    ('```json\n{"need_sketch": false, "reason": "texto basta", "sketch_prompt": ""}\n```', False),
+    ('Claro! Segue a decisão:\n{"need_sketch": true,\n "reason": "mostra camadas",\n'
+     ' "sketch_prompt": "camadas da pele"}\nEspero ter ajudado.', True),
+    ("Não é necessário esboço para esta pergunta.", False),
+    ('{"need_sketch": "sim", "reason": 3}', True),
+    ('{"need_sketch": true, "reason": "incompleto"', False),
+    ("", False),
+]
+
+
+class ClienteRoteiro:
+    """Devolve as saídas de `SAIDAS_SUJAS` em ordem (como se fossem do modelo)."""
+
+    def __init__(self):
+        self.i = 0
+
+    def gerar(self, prompt: str, modelo: str, temperatura: float, modo: str | None = None) -> str:
+        raw = SAIDAS_SUJAS[self.i % len(SAIDAS_SUJAS)][0]
+        self.i += 1
+        return raw
+
+
+def bench_esboco(repeticoes: int) -> dict:
+    from nucleo import decidir_esboco
+
+    resposta = gemini_fake.texto_resposta("esboco", 3000)
+    cliente = ClienteRoteiro()
+    acertos = sum(
+        decidir_esboco("pergunta", resposta, "models/fake", cliente=cliente)["need_sketch"] == esperado
+        for _, esperado in SAIDAS_SUJAS
+    )
+    chamadas = repeticoes * 200
+
+    def lote():
+        for _ in range(200):
+            decidir_esboco("pergunta", resposta, "models/fake", cliente=cliente)
+
+    r = cronometrar(lote, repeticoes)
+    r.update({"saidas": len(SAIDAS_SUJAS), "acertos": acertos, "chamadas": chamadas,
+              "us_por_chamada": round(r["mediana_ms"] * 1000 / 200, 2)})
+    return r
+
+
+# =========================
+# app.py (AppTest)
+# =========================
+def bench_app(repeticoes: int, latencia_s: float) -> dict:
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    import cache_respostas
+
+    os.environ.setdefault("GOOGLE_API_KEY", "chave-falsa-para-benchmark")
+    # pasta de dados vazia a cada medição, como em `bench_partida`: com a `dados/` do repositório ou a de
+    # outra execução, a "pergunta nova" vira hit do cache em disco. `DIR_DADOS` é lido no import.
+    dados = tempfile.mkdtemp(prefix="bench_app_")
+    os.environ["ENSINA_FERIDAS_DADOS"] = dados
+    cache_respostas.DIR_DADOS = Path(dados)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    def rodar(at) -> float:
+        t0 = time.perf_counter()
+        at.run()
+        dt = (time.perf_counter() - t0) * 1000
+        if at.exception:
+            raise RuntimeError(f"app.py falhou no AppTest: {at.exception[0].message}")
+        return dt
+
+    at = AppTest.from_file(str(RAIZ / "app.py"), default_timeout=120)
+    r = {"primeira_execucao_ms": round(rodar(at), 3)}
+
+    perguntas, hits, ociosos = [], [], []
+    for i in range(repeticoes):
+        at.text_area(key="prompt_area").input(f"Como tratar ferida com esfacelo? (variante {i})")
+        at.button[0].click()
+        perguntas.append(rodar(at))
+        at.button[0].click()
+        hits.append(rodar(at))
+        ociosos.append(rodar(at))
+    r.update({
+        "latencia_fake_s": latencia_s,
+        "pergunta_nova_ms": round(statistics.median(perguntas), 3),
+        "hit_cache_ms": round(statistics.median(hits), 3),
+        "rerun_ocioso_ms": round(statistics.median(ociosos), 3),
+        "repeticoes": repeticoes,
+    })
+    return r
+
+
+# =========================
+# Partida a frio (processo novo)
+# =========================
+# Roda num interpretador novo: nada importado, caches do Streamlit vazios.
+# O backend falso só entra quando o app importar o SDK do Gemini.
+SCRIPT_PARTIDA = r"""
+import importlib.util, json, os, sys, time
+t0 = time.perf_counter()
+raiz, fake, latencia, pausa = sys.argv[1], sys.argv[2], float(sys.argv[3]), float(sys.argv[4])
+sys.path.insert(0, raiz)
+spec = importlib.util.spec_from_file_location("gemini_fake", fake)
+gemini_fake = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(gemini_fake)
+gemini_fake.instalar_ao_importar(latencia_s=latencia)
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(os.path.join(raiz, "app.py"), default_timeout=120)
+at.run()
+t2 = time.perf_counter()
+outra = AppTest.from_file(os.path.join(raiz, "app.py"), default_timeout=120)
+outra.run()
+t3 = time.perf_counter()
+time.sleep(pausa)  # o usuário lendo a página e digitando a pergunta
+t4 = time.perf_counter()
+at.text_area(key="prompt_area").input("Como avaliar uma lesão por pressão estágio 2?")
+[b for b in at.button if "Enviar" in b.label][0].click()
+at.run()
+t5 = time.perf_counter()
+erro = [e.message for e in (at.exception or outra.exception)]
+ms = lambda a, b: round((b - a) * 1000, 1)
+print(json.dumps({"importar_streamlit_ms": ms(t0, t1), "primeira_execucao_ms": ms(t1, t2),
+                  "ate_primeira_tela_ms": ms(t0, t2), "segunda_sessao_ms": ms(t2, t3),
+                  "primeira_pergunta_ms": ms(t4, t5), "erro": erro[:1]}))
+"""
+
+
+def bench_partida(repeticoes: int, latencia_s: float, raiz: Path = RAIZ, pausa_s: float = 3.0) -> dict:
+    """Partida a frio do `app.py` de `raiz` (padrão: este repositório), sem e com dados já em disco.
+    A primeira pergunta vem `pausa_s` depois da segunda sessão abrir (tempo de digitar)."""
+    fake = Path(__file__).resolve().parent / "gemini_fake.py"
+    env = {**os.environ, "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "chave-falsa-para-benchmark")}
+
+    def rodar(dados: str) -> dict:
+        saida = subprocess.run([sys.executable, "-c", SCRIPT_PARTIDA, str(raiz), str(fake), str(latencia_s),
+                                str(pausa_s)],
+                               env={**env, "ENSINA_FERIDAS_DADOS": dados}, capture_output=True, text=True,
+                               timeout=300)
+        try:
+            r = json.loads(saida.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            raise RuntimeError(f"partida falhou: {saida.stderr[-2000:]}") from None
+        if r.pop("erro"):
+            raise RuntimeError(f"app.py falhou na partida: {r}")
+        return r
+
+    def mediana(execucoes: list[dict]) -> dict:
+        return {k: round(statistics.median(e[k] for e in execucoes), 1) for k in execucoes[0]}
+
+    # "sem dados": primeiro deploy; "com dados": reinício com a pasta de dados preservada
+    sem, com = [], []
+    for _ in range(repeticoes):
+        dados = tempfile.mkdtemp(prefix="bench_partida_")
+        sem.append(rodar(dados))
+        time.sleep(0.5)  # deixa terminar o que ficou em segundo plano (ex.: lista de modelos)
+        com.append(rodar(dados))
+    return {"sem_dados": mediana(sem), "com_dados": mediana(com), "latencia_fake_s": latencia_s,
+            "pausa_s": pausa_s, "repeticoes": repeticoes}
+
+
+# =========================
+# Execução / comparação
+# =========================
+def ambiente() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {"quando": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "plataforma": platform.platform(), "processador": platform.processor() or platform.machine()}
+
+
+def metricas(dados, prefixo: str = "") -> dict[str, float]:
+    """Achata o resultado em {caminho: valor} só com tempos (ms/s) e memória (MiB)."""
+    saida: dict[str, float] = {}
+    if isinstance(dados, dict):
+        for k, v in dados.items():
+            saida.update(metricas(v, f"{prefixo}.{k}" if prefixo else k))
+    elif isinstance(dados, list):
+        for i, v in enumerate(dados):
+            saida.update(metricas(v, f"{prefixo}[{i}]"))
+    elif isinstance(dados, (int, float)) and prefixo.endswith(("_ms", "_s", "_mib")):
+        saida[prefixo] = float(dados)
+    return saida
+
+
+def comparar(base: dict, atual: dict) -> None:
+    m_base, m_atual = metricas(base["resultados"]), metricas(atual["resultados"])
+    print(f"{'métrica':<48} {'base':>12} {'atual':>12} {'razão':>7}", file=sys.stderr)
+    for chave, v in m_atual.items():
+        if chave in m_base and m_base[chave]:
+            print(f"{chave:<48} {m_base[chave]:>12.3f} {v:>12.3f} {v / m_base[chave]:>7.2f}", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    p = argparse.ArgumentParser(description="Benchmarks offline do Ensina Feridas.")
+    p.add_argument("--secoes", nargs="+", choices=SECOES, default=list(SECOES))
+    p.add_argument("--paginas", nargs="+", type=int, default=[1, 50, 500])
+    p.add_argument("--repeticoes", type=int, default=5)
+    p.add_argument("--latencia", type=float, default=0.0, help="latência do Gemini falso até o 1º pedaço (s)")
+    p.add_argument("--latencia-pedaco", type=float, default=0.0, help="latência entre pedaços do stream (s)")
+    p.add_argument("--tamanho-resposta", type=int, default=3000, help="caracteres por resposta do Gemini falso")
+    p.add_argument("--saida", help="grava o JSON neste arquivo (padrão: stdout)")
+    p.add_argument("--comparar", help="JSON de uma execução anterior para comparar")
+    p.add_argument("--raiz-partida", type=Path, default=RAIZ,
+                   help="árvore do app medida na seção partida (ex.: um worktree de outro commit)")
+    args = p.parse_args(argv)
+
+    # dados do app (caches, telemetria) numa pasta descartável; embeddings locais
+    os.environ.setdefault("ENSINA_FERIDAS_DADOS", tempfile.mkdtemp(prefix="bench_ensina_"))
+    os.environ.setdefault("ENSINA_FERIDAS_EMBEDDER", "hash")
+    restaurar = gemini_fake.instalar(latencia_s=args.latencia, latencia_pedaco_s=args.latencia_pedaco,
+                                     tamanho_resposta=args.tamanho_resposta)
+    resultados: dict = {}
+    try:
+        # os avisos do Streamlit fora de `streamlit run` não interessam aqui
+        with redirect_stderr(io.StringIO()):
+            if "wrap" in args.secoes:
+                resultados["wrap_text"] = bench_wrap(args.repeticoes)
+            if "pdf" in args.secoes:
+                resultados["gerar_pdf_a4"] = bench_pdf(args.paginas, max(1, args.repeticoes // 2))
+            if "relatorio" in args.secoes:
+                resultados["relatorio_pdf"] = bench_relatorio(args.repeticoes)
+            if "conhecimento" in args.secoes:
+                resultados["conhecimento"] = bench_conhecimento(args.repeticoes)
+            if "esboco" in args.secoes:
+                resultados["decidir_esboco"] = bench_esboco(args.repeticoes)
+            if "app" in args.secoes:
+                resultados["app"] = bench_app(args.repeticoes, args.latencia)
+            if "partida" in args.secoes:
+                resultados["partida"] = bench_partida(max(1, args.repeticoes // 2), args.latencia,
+                                                      args.raiz_partida.resolve())
+    finally:
+        restaurar()
+
+    relatorio = {"ambiente": ambiente(), "parametros": vars(args), "resultados": resultados}
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2, default=str)
+    if args.saida:
+        Path(args.saida).write_text(texto + "\n", encoding="utf-8")
+    else:
+        print(texto)
+    if args.comparar:
+        comparar(json.loads(Path(args.comparar).read_text(encoding="utf-8")), relatorio)
+    return relatorio
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Teste de carga: N sessões simuladas do app (`AppTest`) contra o Gemini falso por HTTP.
+
+Uso (na raiz do repositório):
+    python benchmarks/carga.py --sessoes 1 5 10 20 --perguntas 3 --saida carga.json
+    python benchmarks/carga.py --sessoes 10 40 --taxa-429 0.1 --ttft-mediana 1.5 --ttft-sigma 0.6
+    python benchmarks/carga.py --distintas 3        # turma mandando o mesmo caso
+    python benchmarks/carga.py --mock http://127.0.0.1:8765   # Gemini falso já rodando
+
+O app roda neste processo (cada sessão é um `AppTest` numa thread) e usa o
+SDK de verdade, via REST, contra `benchmarks/gemini_mock.py` num processo à
+parte (`ENSINA_FERIDAS_GEMINI_URL`). Cada nível de `--sessoes` roda N
+sessões ao mesmo tempo; cada uma faz `--perguntas` perguntas, com uma pausa
+aleatória ("tempo de leitura") entre elas. As perguntas saem de um conjunto
+de `--distintas` textos: com poucos, aparecem hits de cache e pedidos
+coalescidos, como numa turma.
+
+Por nível: vazão (respostas/min), latência ponta a ponta p50/p95/p99
+(clique → página pronta), erros por tipo, origem das respostas, memória
+(RSS) do processo do app, threads por pool, fila dos executores, estado do
+limitador/disjuntor e os contadores do Gemini falso.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+TEMAS = ["lesão por pressão sacral estágio 3", "pé diabético com osteomielite", "úlcera venosa com exsudato",
+         "queimadura de segundo grau", "deiscência de ferida operatória", "biofilme em ferida crônica"]
+
+
+def percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def rss_mib() -> float:
+    """Memória residente atual do processo (Linux); fora dele, o pico (`ru_maxrss`)."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# =========================
+# Gemini falso
+# =========================
+def iniciar_mock(args) -> tuple[str, subprocess.Popen | None]:
+    if args.mock:
+        return args.mock.rstrip("/"), None
+    cmd = [sys.executable, str(RAIZ / "benchmarks" / "gemini_mock.py"), "--porta", "0",
+           "--ttft-mediana", str(args.ttft_mediana), "--ttft-sigma", str(args.ttft_sigma),
+           "--pedaco", str(args.pedaco), "--tamanho-resposta", str(args.tamanho_resposta),
+           "--taxa-429", str(args.taxa_429), "--taxa-erro", str(args.taxa_erro),
+           "--taxa-queda", str(args.taxa_queda), "--rpm", str(args.rpm_mock), "--semente", str(args.semente)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    url = proc.stdout.readline().strip()
+    if not url.startswith("http"):
+        proc.kill()
+        sys.exit("O Gemini falso não subiu.")
+    return url, proc
+
+
+def estado_mock(url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{url}/_estado", timeout=5) as r:
+            return json.loads(r.read())
+    except OSError:
+        return {}
+
+
+# =========================
+# Amostragem do processo do app
+# =========================
+class Monitor:
+    """Amostra memória, threads e filas dos executores do app a cada `intervalo_s`."""
+
+    def __init__(self, intervalo_s: float = 0.25):
+        self.intervalo_s = intervalo_s
+        self._parar = threading.Event()
+        self._executores: list = []
+        self.amostras: list[dict] = []
+
+    def _achar_executores(self) -> list:
+        # os pools são criados pelo app (cache_resource): acha pelo prefixo das threads
+        return [o for o in gc.get_objects()
+                if isinstance(o, ThreadPoolExecutor) and o._thread_name_prefix.startswith("ensina-")]
+
+    def amostrar(self) -> dict:
+        if len(self.amostras) % 20 == 0:  # pools criados sob demanda aparecem ao longo do nível
+            self._executores = self._achar_executores()
+        pools: dict[str, int] = {}
+        for t in threading.enumerate():
+            prefixo = t.name.rsplit("_", 1)[0] if t.name.startswith("ensina-") else "outras"
+            pools[prefixo] = pools.get(prefixo, 0) + 1
+        return {
+            "t": time.monotonic(),
+            "rss_mib": rss_mib(),
+            "threads": threading.active_count(),
+            "pools": pools,
+            "filas": {e._thread_name_prefix: e._work_queue.qsize() for e in self._executores},
+            "ocupados": {e._thread_name_prefix: len(e._threads) for e in self._executores},
+        }
+
+    def _loop(self) -> None:
+        while not self._parar.wait(self.intervalo_s):
+            self.amostras.append(self.amostrar())
+
+    def __enter__(self) -> "Monitor":
+        self.amostras = [self.amostrar()]
+        self._thread = threading.Thread(target=self._loop, name="carga-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._parar.set()
+        self._thread.join()
+        self.amostras.append(self.amostrar())
+
+    def resumo(self) -> dict:
+        a = self.amostras
+        chaves = lambda campo: sorted({k for x in a for k in x[campo]})  # noqa: E731
+        return {
+            "memoria_mib": {"inicio": round(a[0]["rss_mib"], 1), "pico": round(max(x["rss_mib"] for x in a), 1),
+                            "fim": round(a[-1]["rss_mib"], 1)},
+            "threads_pico": max(x["threads"] for x in a),
+            "threads_por_pool_pico": {k: max(x["pools"].get(k, 0) for x in a) for k in chaves("pools")},
+            "fila_executores_pico": {k: max(x["filas"].get(k, 0) for x in a) for k in chaves("filas")},
+            "workers_executores_pico": {k: max(x["ocupados"].get(k, 0) for x in a) for k in chaves("ocupados")},
+        }
+
+
+def estado_guarda() -> dict:
+    from resiliencia import GuardaGemini
+
+    guardas = [o for o in gc.get_objects() if isinstance(o, GuardaGemini)]
+    return guardas[0].estado() if guardas else {}
+
+
+# =========================
+# Sessões
+# =========================
+def classificar(at) -> tuple[str | None, str]:
+    """(erro, origem) da página depois de uma pergunta."""
+    if at.exception:
+        return "excecao", "-"
+    avisos = [w.value for w in at.warning]
+    if at.error:
+        return "erro_gemini", "-"
+    if any("Muita demanda" in w for w in avisos):
+        return "limite", "-"
+    legendas = " ".join(c.value for c in at.caption)
+    origem = ("cache" if "⚡ Cache" in legendas else "semantico" if "🧠" in legendas
+              else "coalescido" if "🔗" in legendas else "gemini")
+    if any("caiu no meio" in w for w in avisos):
+        return "stream_cortado", origem
+    return None, origem
+
+
+def sessao(i: int, nivel: int, args, resultados: list, lock: threading.Lock) -> None:
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(f"{args.semente}-{nivel}-{i}")
+    at = AppTest.from_file(str(RAIZ / "app.py"), default_timeout=args.timeout)
+    try:
+        at.run()
+    except Exception as e:  # a sessão nem abriu: conta as perguntas que ela faria como falhas
+        with lock:
+            resultados.extend({"sessao": i, "ms": 0.0, "erro": f"abertura:{type(e).__name__}", "origem": "-"}
+                              for _ in range(args.perguntas))
+        return
+    for n in range(args.perguntas):
+        k = rng.randrange(args.distintas)
+        pergunta = f"Caso {k}: paciente com {TEMAS[k % len(TEMAS)]}. Como avaliar e conduzir?"
+        t0 = time.perf_counter()
+        try:
+            if not any(t.label.startswith("Pergunta") for t in at.text_area):
+                at.run()  # o AppTest concorrente às vezes devolve a página vazia; uma nova execução a recupera
+            # por rótulo: com várias sessões no mesmo processo, o AppTest às vezes perde a `key` do widget
+            next(t for t in at.text_area if t.label.startswith("Pergunta")).input(pergunta)
+            next(b for b in at.button if b.label.startswith("🚀")).click()
+            at.run()
+            erro, origem = classificar(at)
+        except Exception as e:  # ex.: o AppTest estourou o timeout
+            if isinstance(e, StopIteration):
+                erro = "pagina_vazia"
+            else:
+                erro = "timeout" if "timed out" in str(e) else type(e).__name__
+            origem = "-"
+        with lock:
+            resultados.append({"sessao": i, "ms": (time.perf_counter() - t0) * 1000, "erro": erro, "origem": origem})
+        if args.pensar_s and n < args.perguntas - 1:
+            time.sleep(rng.expovariate(1 / args.pensar_s))
+
+
+def nivel_carga(n: int, args, url_mock: str) -> dict:
+    resultados: list[dict] = []
+    lock = threading.Lock()
+    antes = estado_mock(url_mock)
+    with Monitor() as monitor:
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=sessao, args=(i, n, args, resultados, lock), name=f"carga-sessao_{i}")
+                   for i in range(n)]
+        for t in threads:
+            t.start()
+            time.sleep(args.rampa_s / max(n, 1))  # chegada espalhada, não todo mundo no mesmo ms
+        for t in threads:
+            t.join()
+        duracao = time.perf_counter() - t0
+    depois = estado_mock(url_mock)
+
+    ok = [r["ms"] for r in resultados if r["erro"] is None]
+    erros: dict[str, int] = {}
+    origens: dict[str, int] = {}
+    for r in resultados:
+        if r["erro"]:
+            erros[r["erro"]] = erros.get(r["erro"], 0) + 1
+        origens[r["origem"]] = origens.get(r["origem"], 0) + 1
+    return {
+        "sessoes": n,
+        "perguntas": len(resultados),
+        "ok": len(ok),
+        "erros": erros,
+        "origem": origens,
+        "duracao_s": round(duracao, 3),
+        "vazao_por_min": round(len(ok) / duracao * 60, 2) if duracao else 0.0,
+        "latencia_ms": {"p50": round(percentil(ok, 50), 1), "p95": round(percentil(ok, 95), 1),
+                        "p99": round(percentil(ok, 99), 1), "max": round(max(ok, default=0.0), 1)},
+        **monitor.resumo(),
+        "guarda": estado_guarda(),
+        "gemini_mock": {k: v - antes.get(k, 0) if not k.startswith(("pico", "em_")) else v
+                        for k, v in depois.items()},
+    }
+
+
+def main(argv: list[str] | None = None) -> dict:
+    p = argparse.ArgumentParser(description="Teste de carga do Ensina Feridas com o Gemini falso por HTTP.")
+    p.add_argument("--sessoes", nargs="+", type=int, default=[1, 5, 10, 20], help="níveis de concorrência")
+    p.add_argument("--perguntas", type=int, default=3, help="perguntas por sessão")
+    p.add_argument("--distintas", type=int, default=1000, help="textos de pergunta diferentes no sorteio")
+    p.add_argument("--pensar-s", type=float, default=1.0, help="pausa média entre perguntas da sessão (s)")
+    p.add_argument("--rampa-s", type=float, default=2.0, help="intervalo em que as sessões de um nível entram (s)")
+    p.add_argument("--pausa-s", type=float, default=2.0, help="pausa entre níveis (s)")
+    p.add_argument("--timeout", type=float, default=120, help="limite de uma execução da página (s)")
+    p.add_argument("--embedder", choices=["gemini", "hash"], default="gemini",
+                   help="embeddings do cache semântico: pelo Gemini falso ou locais")
+    p.add_argument("--mock", help="URL de um Gemini falso já rodando (senão sobe um)")
+    p.add_argument("--ttft-mediana", type=float, default=0.5)
+    p.add_argument("--ttft-sigma", type=float, default=0.4)
+    p.add_argument("--pedaco", type=float, default=0.02)
+    p.add_argument("--tamanho-resposta", type=int, default=3000)
+    p.add_argument("--taxa-429", type=float, default=0.0)
+    p.add_argument("--taxa-erro", type=float, default=0.0)
+    p.add_argument("--taxa-queda", type=float, default=0.0)
+    p.add_argument("--rpm-mock", type=float, default=0, help="quota simulada do Gemini falso (pedidos/min)")
+    p.add_argument("--semente", type=int, default=1)
+    p.add_argument("--saida", help="grava o JSON neste arquivo (padrão: stdout)")
+    args = p.parse_args(argv)
+
+    url, proc = iniciar_mock(args)
+    # antes do app ser importado: o SDK e os dados leem estas variáveis uma vez
+    os.environ["ENSINA_FERIDAS_GEMINI_URL"] = url
+    os.environ.setdefault("GOOGLE_API_KEY", "carga")
+    os.environ.setdefault("ENSINA_FERIDAS_DADOS", tempfile.mkdtemp(prefix="carga_ensina_"))
+    os.environ.setdefault("ENSINA_FERIDAS_EMBEDDER", args.embedder)
+
+    import io
+    import logging
+    from contextlib import redirect_stderr
+
+    from benchmarks.bench_suite import ambiente
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    niveis = []
+    try:
+        for n in args.sessoes:
+            with redirect_stderr(io.StringIO()):
+                r = nivel_carga(n, args, url)
+            niveis.append(r)
+            print(f"[{n} sessões] {r['ok']}/{r['perguntas']} ok, {r['vazao_por_min']}/min, "
+                  f"p50 {r['latencia_ms']['p50']:.0f} ms, p95 {r['latencia_ms']['p95']:.0f} ms, "
+                  f"p99 {r['latencia_ms']['p99']:.0f} ms, erros {r['erros'] or 0}, "
+                  f"RSS pico {r['memoria_mib']['pico']} MiB, threads pico {r['threads_pico']}", file=sys.stderr)
+            time.sleep(args.pausa_s)
+    finally:
+        if proc is not None:
+            proc.terminate()
+
+    relatorio = {"ambiente": ambiente(), "parametros": vars(args), "niveis": niveis}
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2, default=str)
+    if args.saida:
+        Path(args.saida).write_text(texto + "\n", encoding="utf-8")
+    else:
+        print(texto)
+    return relatorio
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Backend falso e determinístico do `google.generativeai` para os benchmarks.
+
+`instalar()` troca `GenerativeModel`, `list_models` e `embed_content` do
+SDK por versões locais: nenhuma chamada sai para a rede. A latência (até
+o primeiro pedaço e entre pedaços) e o tamanho das respostas são
+configuráveis; o mesmo prompt gera sempre o mesmo texto.
+
+    from benchmarks import gemini_fake
+    restaurar = gemini_fake.instalar(latencia_s=0.2, tamanho_resposta=4000)
+    ...
+    restaurar()
+
+`instalar_ao_importar()` faz o mesmo só quando o app importar o SDK, para
+medir a partida a frio sem pagar o import do `google.generativeai` antes.
+"""
+import hashlib
+import importlib.abc
+import importlib.util
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from nucleo import INSTRUCAO_DECISOR, MARCADOR_ESBOCO
+
+SDK = "google.generativeai"
+
+PARAGRAFO = (
+    "A avaliação da ferida segue o acrônimo **TIME**: tecido, infecção/inflamação, "
+    "umidade e bordas. Registre dimensões, leito, exsudato e pele perilesional."
+)
+
+
+def texto_resposta(semente: str, tamanho: int) -> str:
+    """Markdown com ~`tamanho` caracteres (títulos, listas e parágrafos), estável por `semente`."""
+    h = hashlib.sha256(semente.encode("utf-8")).hexdigest()[:8]
+    partes = [f"# Resposta simulada {h}\n"]
+    n = 0
+    while sum(map(len, partes)) < tamanho:
+        n += 1
+        if n % 5 == 1:
+            partes.append(f"## Seção {n // 5 + 1}\n")
+        partes.append(f"- item {n}: {PARAGRAFO}\n" if n % 2 else f"{PARAGRAFO}\n")
+    return "\n".join(partes)[:max(tamanho, 1)]
+
+
+class _Pedaco:
+    def __init__(self, texto: str):
+        self.text = texto
+
+
+class RespostaFake:
+    """Imita `GenerateContentResponse`: `.text`, iteração por pedaços, feedback e uso de tokens."""
+
+    def __init__(self, texto: str, prompt: str, latencia_pedaco_s: float, tamanho_pedaco: int):
+        self._texto = texto
+        self._latencia_pedaco_s = latencia_pedaco_s
+        self._tamanho_pedaco = tamanho_pedaco
+        self.prompt_feedback = SimpleNamespace(block_reason=None)
+        self.candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name="STOP"))]
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4, candidates_token_count=len(texto) // 4
+        )
+
+    @property
+    def text(self) -> str:
+        return self._texto
+
+    def __iter__(self):
+        for i in range(0, len(self._texto), self._tamanho_pedaco):
+            if i and self._latencia_pedaco_s:
+                time.sleep(self._latencia_pedaco_s)
+            yield _Pedaco(self._texto[i:i + self._tamanho_pedaco])
+
+
+def instalar(latencia_s: float = 0.0, latencia_pedaco_s: float = 0.0, tamanho_resposta: int = 3000,
+             tamanho_pedaco: int = 200, decisao: dict | None = None):
+    """
+    Substitui o backend do SDK. Retorna uma função que restaura o original.
+
+    - `latencia_s`: espera antes do primeiro pedaço (ou da resposta inteira);
+    - `latencia_pedaco_s`: espera entre pedaços no streaming;
+    - `decisao`: JSON do decisor de esboço (sozinho ou no fim da resposta, após o marcador).
+    """
+    import google.generativeai as genai
+
+    decisao = decisao or {"need_sketch": True, "reason": "simulado", "sketch_prompt": "esquema do leito da ferida"}
+
+    class ModeloFake:
+        def __init__(self, model_name: str = "models/fake", system_instruction=None, **kwargs):
+            self.model_name = model_name
+            self.system_instruction = str(system_instruction or "")
+
+        def generate_content(self, contents, generation_config=None, stream: bool = False, **kwargs):
+            prompt = str(contents)
+            if latencia_s:
+                time.sleep(latencia_s)
+            if self.system_instruction == INSTRUCAO_DECISOR:
+                texto = json.dumps(decisao, ensure_ascii=False)
+            else:
+                texto = texto_resposta(self.model_name + prompt, tamanho_resposta)
+                if MARCADOR_ESBOCO in self.system_instruction:
+                    texto += f"\n\n{MARCADOR_ESBOCO}\n{json.dumps(decisao, ensure_ascii=False)}"
+            return RespostaFake(texto, self.system_instruction + prompt, latencia_pedaco_s if stream else 0.0,
+                                tamanho_pedaco)
+
+    def list_models():
+        if latencia_s:
+            time.sleep(latencia_s)
+        for nome in ("models/gemini-2.0-flash", "models/gemini-1.5-pro"):
+            yield SimpleNamespace(name=nome, supported_generation_methods=["generateContent"])
+
+    def embed_content(model: str, content: str, **kwargs):
+        h = hashlib.sha256(str(content).encode("utf-8")).digest()
+        return {"embedding": [b / 255 - 0.5 for b in h * 24]}
+
+    originais = {
+        (genai, "GenerativeModel"): genai.GenerativeModel,
+        (genai, "list_models"): genai.list_models,
+        (genai, "embed_content"): genai.embed_content,
+    }
+    genai.GenerativeModel = ModeloFake
+    genai.list_models = list_models
+    genai.embed_content = embed_content
+
+    def restaurar() -> None:
+        for (modulo, nome), valor in originais.items():
+            setattr(modulo, nome, valor)
+
+    return restaurar
+
+
+class _ImportarSDK(importlib.abc.MetaPathFinder):
+    """Instala o backend falso logo depois que o SDK termina de ser importado."""
+
+    def __init__(self, kwargs: dict):
+        self.kwargs = kwargs
+
+    def find_spec(self, nome, caminho, alvo=None):
+        if nome != SDK:
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(nome)
+        executar = spec.loader.exec_module
+
+        def exec_module(modulo):
+            executar(modulo)
+            instalar(**self.kwargs)
+
+        spec.loader.exec_module = exec_module
+        return spec
+
+
+def instalar_ao_importar(**kwargs) -> None:
+    """Como `instalar`, mas adiado até o primeiro `import google.generativeai` (sem restaurar)."""
+    if SDK in sys.modules:
+        instalar(**kwargs)
+    else:
+        sys.meta_path.insert(0, _ImportarSDK(kwargs))
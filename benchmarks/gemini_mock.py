@@ -0,0 +1,278 @@
+"""
+Gemini falso por HTTP, para os testes de carga (`benchmarks/carga.py`).
+
+Diferente do `gemini_fake` (que troca o SDK dentro do processo), aqui o app
+usa o SDK de verdade, pelo transporte REST, contra um servidor local — o
+caminho de rede, o parse do stream e os erros HTTP são os reais:
+
+    python benchmarks/gemini_mock.py --porta 8765 --ttft-mediana 0.8 --taxa-429 0.05
+    ENSINA_FERIDAS_GEMINI_URL=http://127.0.0.1:8765 streamlit run app.py
+
+Rotas (API v1beta): listar modelos, generateContent, streamGenerateContent
+(array JSON enviado aos pedaços, como a API faz), embedContent e
+batchEmbedContents; `GET /_estado` devolve os contadores do servidor.
+
+Latência até o primeiro pedaço: log-normal (mediana e sigma); entre pedaços,
+fixa. Falhas injetadas: 429 (uma fração dos pedidos e/ou acima de um limite
+de pedidos por minuto), 500/503 e stream que cai no meio.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.gemini_fake import texto_resposta  # noqa: E402
+from nucleo import INSTRUCAO_DECISOR, MARCADOR_ESBOCO  # noqa: E402
+
+MODELOS = [
+    ("models/gemini-2.0-flash", ["generateContent", "countTokens"]),
+    ("models/gemini-2.0-flash-lite", ["generateContent", "countTokens"]),
+    ("models/gemini-1.5-pro", ["generateContent", "countTokens"]),
+    ("models/text-embedding-004", ["embedContent"]),
+]
+DECISAO = {"need_sketch": True, "reason": "simulado", "sketch_prompt": "esquema do leito da ferida"}
+ERROS = {
+    429: ("RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota)."),
+    500: ("INTERNAL", "An internal error has occurred."),
+    503: ("UNAVAILABLE", "The model is overloaded. Please try again later."),
+}
+
+
+def _textos(parte) -> list[str]:
+    """Todos os "text" de um conteúdo REST (dict, lista ou string)."""
+    if isinstance(parte, str):
+        return [parte]
+    if isinstance(parte, list):
+        return [t for p in parte for t in _textos(p)]
+    if isinstance(parte, dict):
+        if "text" in parte:
+            return [parte["text"]]
+        # imagens (base64) não são texto do prompt
+        return [t for k, p in parte.items() if k not in ("inline_data", "inlineData") for t in _textos(p)]
+    return []
+
+
+def _vetor(texto: str) -> list[float]:
+    h = hashlib.sha256(texto.encode("utf-8")).digest()
+    return [b / 255 - 0.5 for b in h * 24]
+
+
+class GeminiMock:
+    """Servidor HTTP (uma thread por conexão) com latência e falhas configuráveis."""
+
+    def __init__(self, porta: int = 0, ttft_mediana_s: float = 0.5, ttft_sigma: float = 0.4,
+                 pedaco_s: float = 0.02, tamanho_resposta: int = 3000, tamanho_pedaco: int = 200,
+                 taxa_429: float = 0.0, taxa_erro: float = 0.0, taxa_queda: float = 0.0, rpm: float = 0,
+                 semente: int | None = None):
+        self.ttft_mediana_s = ttft_mediana_s
+        self.ttft_sigma = ttft_sigma
+        self.pedaco_s = pedaco_s
+        self.tamanho_resposta = tamanho_resposta
+        self.tamanho_pedaco = tamanho_pedaco
+        self.taxa_429 = taxa_429
+        self.taxa_erro = taxa_erro
+        self.taxa_queda = taxa_queda
+        self.rpm = rpm
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self._janela: deque[float] = deque()
+        self._contadores = {"pedidos": 0, "stream": 0, "geracao": 0, "embedding": 0, "modelos": 0,
+                            "erro_429": 0, "erro_5xx": 0, "quedas": 0, "em_andamento": 0, "pico_em_andamento": 0}
+        handler = type("Handler", (_Handler,), {"mock": self})
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", porta), handler)
+        self.servidor.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, porta = self.servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self) -> str:
+        threading.Thread(target=self.servidor.serve_forever, name="gemini-mock", daemon=True).start()
+        return self.url
+
+    def parar(self) -> None:
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def estado(self) -> dict:
+        with self._lock:
+            return dict(self._contadores)
+
+    # ---- sorteios ----
+    def contar(self, campo: str, n: int = 1) -> None:
+        with self._lock:
+            self._contadores[campo] += n
+            if campo == "em_andamento":
+                self._contadores["pico_em_andamento"] = max(self._contadores["pico_em_andamento"],
+                                                           self._contadores["em_andamento"])
+
+    def sortear_falha(self) -> int | str | None:
+        """429/500/503, "queda" (stream corta no meio) ou None."""
+        agora = time.monotonic()
+        with self._lock:
+            sorteio, erro_5xx = self._rng.random(), self._rng.choice((500, 503))
+            if self.rpm:
+                while self._janela and agora - self._janela[0] > 60:
+                    self._janela.popleft()
+                if len(self._janela) >= self.rpm:
+                    return 429
+                self._janela.append(agora)
+        if sorteio < self.taxa_429:
+            return 429
+        if sorteio < self.taxa_429 + self.taxa_erro:
+            return erro_5xx
+        if sorteio < self.taxa_429 + self.taxa_erro + self.taxa_queda:
+            return "queda"
+        return None
+
+    def ttft_s(self) -> float:
+        with self._lock:
+            return self.ttft_mediana_s * math.exp(self._rng.gauss(0, self.ttft_sigma)) if self.ttft_sigma \
+                else self.ttft_mediana_s
+
+    def texto(self, modelo: str, instrucao: str, prompt: str) -> str:
+        if instrucao == INSTRUCAO_DECISOR:
+            return json.dumps(DECISAO, ensure_ascii=False)
+        texto = texto_resposta(modelo + prompt, self.tamanho_resposta)
+        if MARCADOR_ESBOCO in instrucao:
+            texto += f"\n\n{MARCADOR_ESBOCO}\n{json.dumps(DECISAO, ensure_ascii=False)}"
+        return texto
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock: GeminiMock
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _json(self, codigo: int, dados: dict) -> None:
+        corpo = json.dumps(dados).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _erro(self, codigo: int) -> None:
+        status, mensagem = ERROS[codigo]
+        self.mock.contar("erro_429" if codigo == 429 else "erro_5xx")
+        self._json(codigo, {"error": {"code": codigo, "message": f"{mensagem} (mock)", "status": status}})
+
+    def do_GET(self) -> None:
+        caminho = urlsplit(self.path).path
+        if caminho == "/_estado":
+            return self._json(200, self.mock.estado())
+        self.mock.contar("modelos")
+        modelos = [{"name": nome, "baseModelId": nome.split("/")[-1], "version": "001",
+                    "displayName": nome.split("/")[-1], "description": "mock", "inputTokenLimit": 1_048_576,
+                    "outputTokenLimit": 8192, "supportedGenerationMethods": metodos}
+                   for nome, metodos in MODELOS]
+        if caminho.rstrip("/").endswith("/models"):
+            return self._json(200, {"models": modelos})
+        for m in modelos:
+            if caminho.endswith(m["name"]):
+                return self._json(200, m)
+        self._json(404, {"error": {"code": 404, "message": "not found (mock)", "status": "NOT_FOUND"}})
+
+    def do_POST(self) -> None:
+        caminho = urlsplit(self.path).path
+        corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        modelo, _, metodo = caminho.rpartition(":")
+        modelo = modelo.split("/v1beta/")[-1]
+        self.mock.contar("pedidos")
+
+        if metodo in ("embedContent", "batchEmbedContents"):
+            self.mock.contar("embedding")
+            if metodo == "embedContent":
+                return self._json(200, {"embedding": {"values": _vetor(" ".join(_textos(corpo.get("content"))))}})
+            return self._json(200, {"embeddings": [{"values": _vetor(" ".join(_textos(r.get("content"))))}
+                                                   for r in corpo.get("requests", [])]})
+        if metodo not in ("generateContent", "streamGenerateContent"):
+            return self._json(404, {"error": {"code": 404, "message": "not found (mock)", "status": "NOT_FOUND"}})
+
+        falha = self.mock.sortear_falha()
+        if isinstance(falha, int):
+            if falha != 429:
+                time.sleep(self.mock.ttft_s() / 2)  # 5xx costuma vir depois de algum processamento
+            return self._erro(falha)
+
+        self.mock.contar("em_andamento")
+        try:
+            instrucao = " ".join(_textos(corpo.get("systemInstruction") or corpo.get("system_instruction")))
+            prompt = " ".join(_textos(corpo.get("contents")))
+            texto = self.mock.texto(modelo, instrucao, prompt)
+            uso = {"promptTokenCount": (len(instrucao) + len(prompt)) // 4, "candidatesTokenCount": len(texto) // 4,
+                   "totalTokenCount": (len(instrucao) + len(prompt) + len(texto)) // 4}
+            time.sleep(self.mock.ttft_s())
+            if metodo == "generateContent":
+                self.mock.contar("geracao")
+                return self._json(200, {"candidates": [{"content": {"parts": [{"text": texto}], "role": "model"},
+                                                        "finishReason": "STOP", "index": 0}], "usageMetadata": uso})
+            self.mock.contar("stream")
+            self._stream(texto, uso, falha == "queda")
+        finally:
+            self.mock.contar("em_andamento", -1)
+
+    def _stream(self, texto: str, uso: dict, cair: bool) -> None:
+        """Array JSON enviado aos pedaços (sem Content-Length: a conexão fecha no fim)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.end_headers()
+        tam = self.mock.tamanho_pedaco
+        pedacos = [texto[i:i + tam] for i in range(0, len(texto), tam)] or [""]
+        self.wfile.write(b"[")
+        for n, pedaco in enumerate(pedacos):
+            if n:
+                time.sleep(self.mock.pedaco_s)
+                self.wfile.write(b",\r\n")
+            if cair and n >= len(pedacos) // 2:
+                self.mock.contar("quedas")
+                self.wfile.flush()
+                self.close_connection = True
+                return  # array sem "]": o SDK acusa stream incompleto
+            item = {"candidates": [{"content": {"parts": [{"text": pedaco}], "role": "model"}, "index": 0}]}
+            if n == len(pedacos) - 1:
+                item["candidates"][0]["finishReason"] = "STOP"
+                item["usageMetadata"] = uso
+            self.wfile.write(json.dumps(item).encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"]")
+
+
+def main(argv: list[str] | None = None) -> None:
+    p = argparse.ArgumentParser(description="Gemini falso por HTTP (API REST v1beta) para testes de carga.")
+    p.add_argument("--porta", type=int, default=8765, help="0 = porta livre qualquer")
+    p.add_argument("--ttft-mediana", type=float, default=0.5, help="mediana do tempo até o 1º pedaço (s)")
+    p.add_argument("--ttft-sigma", type=float, default=0.4, help="dispersão log-normal do tempo até o 1º pedaço")
+    p.add_argument("--pedaco", type=float, default=0.02, help="intervalo entre pedaços do stream (s)")
+    p.add_argument("--tamanho-resposta", type=int, default=3000, help="caracteres por resposta")
+    p.add_argument("--taxa-429", type=float, default=0.0, help="fração dos pedidos recusados com 429")
+    p.add_argument("--taxa-erro", type=float, default=0.0, help="fração dos pedidos com 500/503")
+    p.add_argument("--taxa-queda", type=float, default=0.0, help="fração dos streams que caem no meio")
+    p.add_argument("--rpm", type=float, default=0, help="acima deste ritmo (pedidos/min), 429; 0 = sem limite")
+    p.add_argument("--semente", type=int, default=None)
+    args = p.parse_args(argv)
+
+    mock = GeminiMock(args.porta, args.ttft_mediana, args.ttft_sigma, args.pedaco, args.tamanho_resposta,
+                      taxa_429=args.taxa_429, taxa_erro=args.taxa_erro, taxa_queda=args.taxa_queda, rpm=args.rpm,
+                      semente=args.semente)
+    print(mock.url, flush=True)  # 1ª linha: o `carga.py` lê a porta daqui
+    try:
+        mock.servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Cache persistente de respostas do Gemini (SQLite em modo WAL).
+
+Compartilhado entre todas as sessões do Streamlit e entre reinícios do
+processo. A chave é o hash de (prompt montado e normalizado, modo, modelo,
+temperatura); na mesma linha fica guardada a decisão de esboço.
+Entradas expiram por TTL e, quando o banco passa do tamanho máximo, as
+menos acessadas recentemente saem primeiro (LRU).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+# Pasta para dados locais do app (cache, índices, histórico)
+DIR_DADOS = Path(os.getenv("ENSINA_FERIDAS_DADOS") or Path(__file__).parent / "dados")
+
+MAX_BYTES_PADRAO = 64 * 1024 * 1024
+TTL_PADRAO_S = 7 * 24 * 3600
+
+
+def normalizar_prompt(texto: str) -> str:
+    """Normaliza Unicode, caixa e espaços para que variações triviais batam na mesma chave."""
+    texto = unicodedata.normalize("NFKC", texto or "").casefold()
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def chave_cache(prompt_montado: str, modo: str, modelo: str, temperatura: float) -> str:
+    bruto = json.dumps(
+        [normalizar_prompt(prompt_montado), modo, modelo, round(float(temperatura), 2)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+class CacheRespostas:
+    """Cache chave → resposta (+ decisão de esboço). Seguro para uso entre threads."""
+
+    def __init__(self, caminho: Path, max_bytes: int = MAX_BYTES_PADRAO, ttl_s: float = TTL_PADRAO_S):
+        self.caminho = Path(caminho)
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.caminho), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave    TEXT PRIMARY KEY,
+                resposta TEXT NOT NULL,
+                esboco   TEXT,
+                modelo   TEXT,
+                modo     TEXT,
+                criado   REAL NOT NULL,
+                acesso   REAL NOT NULL,
+                tamanho  INTEGER NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas(acesso)")
+
+    # ---- resposta ----
+    def obter(self, chave: str) -> str | None:
+        linha = self._ler(chave)
+        if linha is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return linha[0]
+
+    def guardar(self, chave: str, resposta: str, modelo: str = "", modo: str = "") -> None:
+        agora = time.time()
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT INTO respostas (chave, resposta, esboco, modelo, modo, criado, acesso, tamanho)
+                VALUES (?, ?, NULL, ?, ?, ?, ?, ?)
+                ON CONFLICT(chave) DO UPDATE SET
+                    resposta = excluded.resposta,
+                    esboco   = NULL,
+                    criado   = excluded.criado,
+                    acesso   = excluded.acesso,
+                    tamanho  = excluded.tamanho
+                """,
+                (chave, resposta, modelo, modo, agora, agora, len(resposta.encode("utf-8"))),
+            )
+            self._despejar()
+
+    # ---- decisão de esboço ----
+    def obter_esboco(self, chave: str) -> dict | None:
+        linha = self._ler(chave)
+        if linha is None or not linha[1]:
+            return None
+        try:
+            return json.loads(linha[1])
+        except ValueError:
+            return None
+
+    def guardar_esboco(self, chave: str, decisao: dict) -> None:
+        bruto = json.dumps(decisao, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "UPDATE respostas SET esboco = ?, tamanho = tamanho + ? WHERE chave = ?",
+                (bruto, len(bruto.encode("utf-8")), chave),
+            )
+
+    # ---- manutenção ----
+    def estatisticas(self) -> dict:
+        with self._lock:
+            n, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()
+        return {"entradas": n, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def _ler(self, chave: str):
+        agora = time.time()
+        with self._lock:
+            linha = self._db.execute(
+                "SELECT resposta, esboco, criado FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                return None
+            if agora - linha[2] > self.ttl_s:
+                self._db.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                return None
+            self._db.execute("UPDATE respostas SET acesso = ? WHERE chave = ?", (agora, chave))
+        return linha
+
+    def _despejar(self) -> None:
+        """Remove expirados e, se ainda passar do limite, os menos usados (chamar com o lock)."""
+        self._db.execute("DELETE FROM respostas WHERE criado < ?", (time.time() - self.ttl_s,))
+        (total,) = self._db.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()
+        if total <= self.max_bytes:
+            return
+        excesso = total - self.max_bytes
+        remover: list[str] = []
+        for chave, tamanho in self._db.execute("SELECT chave, tamanho FROM respostas ORDER BY acesso ASC"):
+            remover.append(chave)
+            excesso -= tamanho
+            if excesso <= 0:
+                break
+        self._db.executemany("DELETE FROM respostas WHERE chave = ?", [(c,) for c in remover])
@@ -0,0 +1,301 @@
+"""
+Cache semântico: reaproveita respostas de perguntas *parecidas* (paráfrases).
+
+Cada pergunta respondida vira um vetor (embedding do Gemini ou, offline,
+um vetorizador por hashing) numa matriz float32 mapeada em disco
+(`np.memmap`). A busca é um produto escalar vetorizado contra todas as
+linhas (vetores já normalizados → similaridade do cosseno) com top-k por
+`argpartition`. Novas perguntas ocupam linhas liberadas ou vão para o fim
+da matriz, que cresce dobrando de capacidade — nada é reconstruído.
+
+Como no cache exato, uma resposta só vale para o mesmo modo, modelo,
+temperatura e versão da base de conhecimento; entradas expiram por TTL e,
+passado o tamanho máximo, as menos acessadas saem primeiro. Pergunta e
+resposta ficam no SQLite; em memória ficam só o contexto e a data de cada
+linha da matriz.
+
+Arquivos (em `DIR_DADOS`):
+  semantico-<embedder>.f32      matriz (capacidade × dim)
+  semantico-<embedder>.sqlite3  uma linha por vetor (contexto, pergunta, resposta…)
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+from cache_respostas import MAX_BYTES_PADRAO, TTL_PADRAO_S
+from nucleo import MODO_CLINICO, MODO_ENSINO
+from resiliencia import estimar_tokens
+
+CAPACIDADE_INICIAL = 1024
+
+# Similaridade mínima para reaproveitar uma resposta, por embedder e modo (como
+# `base_conhecimento.LIMIAR_DENSO`). Embedder fora da tabela não reaproveita: o
+# vetorizador por hashing só mede palavras em comum e dá 0,91 entre "pé diabético
+# infectado" e "não infectado", 0,93 entre lesão por pressão estágio 2 e estágio 4.
+LIMIAR_PADRAO = {
+    "text-embedding-004": {MODO_ENSINO: 0.90, MODO_CLINICO: 0.94},
+}
+
+
+# =========================
+# Embedders
+# =========================
+class EmbedderHashing:
+    """Vetorizador local (sem rede): palavras + trigramas de caracteres num espaço de `dim` posições."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.nome = f"hash{dim}"
+
+    def _tokens(self, texto: str) -> list[tuple[str, float]]:
+        texto = unicodedata.normalize("NFKD", texto or "").casefold()
+        texto = "".join(ch for ch in texto if not unicodedata.combining(ch))
+        palavras = re.findall(r"\w+", texto)
+        toks = [(p, 1.0) for p in palavras]
+        for p in palavras:
+            p = f"#{p}#"
+            toks.extend((p[i:i + 3], 0.5) for i in range(len(p) - 2))
+        return toks
+
+    def embed(self, texto: str) -> np.ndarray:
+        v = np.zeros(self.dim, dtype=np.float32)
+        for tok, peso in self._tokens(texto):
+            h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.dim] += peso if (h >> 63) else -peso
+        return v
+
+
+class EmbedderGemini:
+    """Embeddings do Gemini (`genai.embed_content`), pelo limitador/disjuntor quando há `guarda`."""
+
+    def __init__(self, modelo: str = "models/text-embedding-004", guarda=None):
+        self.modelo = modelo
+        self.nome = modelo.split("/")[-1]
+        self.guarda = guarda
+
+    def _embed_content(self, conteudo, tokens: int, essencial: bool, timeout_fila_s: float = 30.0):
+        import google.generativeai as genai
+
+        def chamada():
+            return genai.embed_content(model=self.modelo, content=conteudo, task_type="semantic_similarity")
+
+        if self.guarda is None:
+            return chamada()
+        return self.guarda.executar(chamada, tokens=tokens, essencial=essencial, timeout_fila_s=timeout_fila_s)
+
+    def embed(self, texto: str) -> np.ndarray:
+        # a busca é um atalho: sem vaga no limitador em 1 s (ou com o disjuntor degradado), segue sem ela
+        r = self._embed_content(texto, estimar_tokens(texto, saida=0), essencial=False, timeout_fila_s=1.0)
+        return np.asarray(r["embedding"], dtype=np.float32)
+
+    def embed_lote(self, textos: list[str], tamanho: int = 100) -> np.ndarray:
+        """Vários textos por chamada (indexação da base de conhecimento, em segundo plano: espera e repete)."""
+        vetores = []
+        for i in range(0, len(textos), tamanho):
+            lote = textos[i:i + tamanho]
+            r = self._embed_content(lote, sum(estimar_tokens(t, saida=0) for t in lote), essencial=True)
+            vetores.extend(r["embedding"])
+        return np.asarray(vetores, dtype=np.float32)
+
+
+# =========================
+# Índice
+# =========================
+def chave_contexto(modo: str, modelo: str, temperatura: float, versao: str = "") -> str:
+    """O que, além da pergunta, decide a resposta (como em `chave_cache`): só reaproveita no mesmo contexto."""
+    bruto = json.dumps([modo, modelo, round(float(temperatura), 2), versao or ""], ensure_ascii=False)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+class CacheSemantico:
+    """Vizinhos mais próximos por contexto, com TTL e limite de bytes. Seguro para uso entre threads."""
+
+    def __init__(self, pasta: Path, embedder, limiares: dict | None = None, max_bytes: int = MAX_BYTES_PADRAO,
+                 ttl_s: float = TTL_PADRAO_S):
+        self.embedder = embedder
+        self.limiares = dict(LIMIAR_PADRAO.get(embedder.nome, {}), **(limiares or {}))
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+
+        pasta = Path(pasta)
+        pasta.mkdir(parents=True, exist_ok=True)
+        self._arq_matriz = pasta / f"semantico-{embedder.nome}.f32"
+
+        self._db = sqlite3.connect(str(pasta / f"semantico-{embedder.nome}.sqlite3"), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entradas (
+                linha    INTEGER PRIMARY KEY,  -- linha da matriz
+                contexto TEXT NOT NULL,
+                dim      INTEGER NOT NULL,
+                modo     TEXT,
+                modelo   TEXT,
+                pergunta TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                criado   REAL NOT NULL,
+                acesso   REAL NOT NULL,
+                tamanho  INTEGER NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_entradas_acesso ON entradas(acesso)")
+
+        # por linha da matriz: id do contexto (-1 = livre) e quando foi gravada
+        self._contextos_ids: dict[str, int] = {}
+        self._contextos = np.full(0, -1, dtype=np.int32)
+        self._criado = np.zeros(0, dtype=np.float64)
+        self._n = 0  # linhas em uso ou liberadas; além disso, a matriz está vazia
+        self.dim = None
+        self._matriz = None
+        linhas = self._db.execute("SELECT linha, contexto, criado, dim FROM entradas").fetchall()
+        if linhas and not self._arq_matriz.exists():
+            self._db.execute("DELETE FROM entradas")  # matriz apagada: os metadados não servem mais
+            linhas = []
+        if linhas:
+            self.dim = int(linhas[0][3])
+            cap = self._arq_matriz.stat().st_size // (4 * self.dim)
+            self._matriz = np.memmap(self._arq_matriz, dtype=np.float32, mode="r+", shape=(cap, self.dim))
+            self._redimensionar(cap)
+            for linha, contexto, criado, _ in linhas:
+                self._contextos[linha] = self._id_contexto(contexto)
+                self._criado[linha] = criado
+            self._n = max(l[0] for l in linhas) + 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._contextos[:self._n] >= 0))
+
+    def _id_contexto(self, contexto: str) -> int:
+        return self._contextos_ids.setdefault(contexto, len(self._contextos_ids))
+
+    @staticmethod
+    def _normalizar(v: np.ndarray) -> np.ndarray:
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def vetor(self, pergunta: str) -> np.ndarray:
+        return self._normalizar(self.embedder.embed(pergunta))
+
+    def buscar(self, vetor: np.ndarray, modo: str, modelo: str, temperatura: float, versao: str = "",
+               k: int = 3) -> list[tuple[float, dict]]:
+        """Top-k (similaridade, metadados) entre as perguntas do mesmo contexto ainda dentro do TTL."""
+        with self._lock:
+            id_contexto = self._contextos_ids.get(chave_contexto(modo, modelo, temperatura, versao))
+            n = self._n
+            if not n or self._matriz is None or id_contexto is None:
+                return []
+            sims = self._matriz[:n] @ vetor
+            validas = (self._contextos[:n] == id_contexto) & (self._criado[:n] >= time.time() - self.ttl_s)
+            sims[~validas] = -1.0
+            k = min(k, n)
+            idx = np.argpartition(-sims, k - 1)[:k]
+            idx = [int(i) for i in idx[np.argsort(-sims[idx])] if sims[i] > -1.0]
+            metas = {}
+            if idx:
+                cur = self._db.execute(
+                    f"SELECT linha, modo, modelo, pergunta, resposta, criado FROM entradas "
+                    f"WHERE linha IN ({','.join('?' * len(idx))})", idx,
+                )
+                metas = {l[0]: dict(zip(("linha", "modo", "modelo", "pergunta", "resposta", "criado"), l))
+                         for l in cur}
+            achados = [(float(sims[i]), metas[i]) for i in idx if i in metas]
+        return achados
+
+    def reaproveita(self, modo: str) -> bool:
+        """Há limiar para este embedder e modo (sem ele, nem vale calcular o vetor da pergunta)."""
+        return modo in self.limiares
+
+    def procurar_resposta(self, vetor: np.ndarray, modo: str, modelo: str, temperatura: float,
+                          versao: str = "") -> tuple[float, dict] | None:
+        """Melhor vizinho do mesmo contexto acima do limiar do modo, ou None."""
+        if not self.reaproveita(modo):
+            return None
+        achados = self.buscar(vetor, modo, modelo, temperatura, versao, k=1)
+        if not achados or achados[0][0] < self.limiares[modo]:
+            return None
+        with self._lock:
+            self._db.execute("UPDATE entradas SET acesso = ? WHERE linha = ?", (time.time(), achados[0][1]["linha"]))
+        return achados[0]
+
+    def adicionar(self, vetor: np.ndarray, modo: str, modelo: str, temperatura: float, versao: str,
+                  pergunta: str, resposta: str) -> None:
+        contexto = chave_contexto(modo, modelo, temperatura, versao)
+        agora = time.time()
+        with self._lock:
+            if self._matriz is None:
+                self.dim = int(vetor.shape[0])
+                self._crescer(CAPACIDADE_INICIAL)
+            livres = np.flatnonzero(self._contextos[:self._n] < 0)
+            if len(livres):
+                linha = int(livres[0])
+            else:
+                linha = self._n
+                if linha >= self._matriz.shape[0]:
+                    self._crescer(self._matriz.shape[0] * 2)
+                self._n += 1
+            self._matriz[linha] = vetor
+            self._matriz.flush()
+
+            tamanho = len(pergunta.encode("utf-8")) + len(resposta.encode("utf-8")) + 4 * self.dim
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO entradas (linha, contexto, dim, modo, modelo, pergunta, resposta, criado,
+                                                 acesso, tamanho)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (linha, contexto, self.dim, modo, modelo, pergunta, resposta, agora, agora, tamanho),
+            )
+            self._contextos[linha] = self._id_contexto(contexto)
+            self._criado[linha] = agora
+            self._despejar()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            n, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM entradas").fetchone()
+            return {"entradas": n, "bytes": total, "linhas_matriz": self._n}
+
+    def _despejar(self) -> None:
+        """Libera as linhas expiradas e, se ainda passar do limite, as menos usadas (chamar com o lock)."""
+        limite = time.time() - self.ttl_s
+        remover = [l for (l,) in self._db.execute("SELECT linha FROM entradas WHERE criado < ?", (limite,))]
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(tamanho), 0) FROM entradas WHERE criado >= ?", (limite,)
+        ).fetchone()
+        if total > self.max_bytes:
+            excesso = total - self.max_bytes
+            for linha, tamanho in self._db.execute(
+                "SELECT linha, tamanho FROM entradas WHERE criado >= ? ORDER BY acesso ASC", (limite,)
+            ):
+                remover.append(linha)
+                excesso -= tamanho
+                if excesso <= 0:
+                    break
+        if remover:
+            self._db.executemany("DELETE FROM entradas WHERE linha = ?", [(l,) for l in remover])
+            self._contextos[remover] = -1
+
+    def _redimensionar(self, capacidade: int) -> None:
+        extra = capacidade - len(self._contextos)
+        self._contextos = np.concatenate([self._contextos, np.full(extra, -1, dtype=np.int32)])
+        self._criado = np.concatenate([self._criado, np.zeros(extra, dtype=np.float64)])
+
+    def _crescer(self, capacidade: int) -> None:
+        """Aumenta o arquivo da matriz (sem copiar os dados) e remapeia."""
+        if self._matriz is not None:
+            self._matriz.flush()
+            del self._matriz
+        with open(self._arq_matriz, "ab") as f:
+            f.truncate(capacidade * self.dim * 4)
+        self._matriz = np.memmap(self._arq_matriz, dtype=np.float32, mode="r+", shape=(capacidade, self.dim))
+        self._redimensionar(capacidade)
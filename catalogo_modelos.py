@@ -0,0 +1,108 @@
+"""
+Lista de modelos do Gemini salva em disco e servida "stale-while-revalidate".
+
+A página nunca espera o `list_models()`: usa a lista salva (ou a padrão, no
+primeiro deploy) e, quando ela passou do TTL, atualiza numa thread em
+segundo plano — a lista nova vale para as próximas sessões. O arquivo fica
+na pasta de dados, então sobrevive ao reinício do contêiner.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+MODELOS_PADRAO = [
+    "models/gemini-2.0-flash",
+    "models/gemini-2.0-flash-lite",
+    "models/gemini-2.0-pro",
+    "models/gemini-1.5-flash",
+    "models/gemini-1.5-pro",
+]
+
+
+def impressao_chave(api_key: str) -> str:
+    """Identifica a chave da API sem gravá-la (contas diferentes veem modelos diferentes)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class CatalogoModelos:
+    """
+    `listar()` faz a chamada de rede e devolve os nomes; falhas mantêm a
+    lista atual e só voltam a ser tentadas depois de `espera_falha_s`.
+    """
+
+    def __init__(self, arquivo: Path, listar, ttl_s: float = 3600, chave: str = "",
+                 espera_falha_s: float = 300):
+        self.arquivo = Path(arquivo)
+        self.ttl_s = ttl_s
+        self.chave = chave
+        self.espera_falha_s = espera_falha_s
+        self.atualizacoes = 0
+        self.falhas = 0
+        self._listar = listar
+        self._lock = threading.Lock()
+        self._atualizando = False
+        self._proxima_s = 0.0
+        self._modelos, self._ts = self._ler()
+
+    def _ler(self) -> tuple[list[str] | None, float]:
+        try:
+            dados = json.loads(self.arquivo.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None, 0.0
+        if dados.get("chave") != self.chave or not dados.get("modelos"):
+            return None, 0.0
+        return [str(m) for m in dados["modelos"]], float(dados.get("ts", 0))
+
+    def _gravar(self, modelos: list[str], ts: float) -> None:
+        self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.arquivo.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"ts": ts, "chave": self.chave, "modelos": modelos}), encoding="utf-8")
+        os.replace(tmp, self.arquivo)
+
+    def modelos(self) -> list[str]:
+        """Lista atual, sem bloquear; dispara a atualização se ela estiver vencida."""
+        agora = time.time()
+        with self._lock:
+            modelos = self._modelos
+            vencida = agora - self._ts > self.ttl_s and agora >= self._proxima_s and not self._atualizando
+            if vencida:
+                self._atualizando = True
+        if vencida:
+            threading.Thread(target=self._atualizar, name="ensina-modelos", daemon=True).start()
+        return list(modelos or MODELOS_PADRAO)
+
+    def _atualizar(self) -> None:
+        try:
+            self.atualizar()
+        finally:
+            with self._lock:
+                self._atualizando = False
+
+    def atualizar(self) -> bool:
+        """Consulta a API agora (bloqueia). True se a lista foi trocada."""
+        try:
+            modelos = list(self._listar())
+        except Exception:
+            modelos = []
+        agora = time.time()
+        with self._lock:
+            if not modelos:
+                self.falhas += 1
+                self._proxima_s = agora + self.espera_falha_s
+                return False
+            self._modelos, self._ts = modelos, agora
+            self.atualizacoes += 1
+        try:
+            self._gravar(modelos, agora)
+        except OSError:
+            pass  # disco só de leitura: a lista fica só na memória do processo
+        return True
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {"modelos": len(self._modelos or MODELOS_PADRAO), "salva": self._modelos is not None,
+                    "idade_s": round(time.time() - self._ts, 1) if self._ts else None,
+                    "atualizacoes": self.atualizacoes, "falhas": self.falhas}
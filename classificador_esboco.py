@@ -0,0 +1,269 @@
+"""
+Pré-classificador local da decisão de esboço.
+
+Decide em microssegundos, sem rede, entre "nao" (claramente não precisa de
+figura), "sim" (claramente precisa) e "modelo" (incerto). Só o "nao" dispensa
+o Gemini; no "sim" a chamada ainda é feita, porque é ela que escreve o prompt
+do esboço.
+Usa palavras-chave sobre a pergunta e a resposta e, quando houver pesos
+treinados, uma regressão logística (NumPy) sobre essas palavras-chave e
+palavras com hashing.
+
+Sem pesos, só as regras valem, e só para o "não" óbvio (nenhum indício de
+conteúdo visual). Cada decisão do Gemini (embutida na resposta ou da
+chamada separada) é registrada em `decisoes_esboco.jsonl` junto com a
+decisão local; daí saem os dados de treino e a concordância.
+
+Treino e relatório (na raiz do repositório):
+    python classificador_esboco.py treinar [--alvo 0.97]
+    python classificador_esboco.py relatorio
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+NAO, SIM, MODELO = "nao", "sim", "modelo"
+
+DIM_HASH = 512
+LIMIAR_NAO_PADRAO = 0.08
+LIMIAR_SIM_PADRAO = 0.95
+MAX_CHARS_RESPOSTA = 1200  # o mesmo trecho que o decisor do Gemini recebe
+
+# Indícios de que uma figura ajuda: posição, anatomia, localização, passo a passo, calçado/órtese,
+# enfaixamento, fluxograma. Palavras que aparecem em qualquer resposta sobre feridas (curativo,
+# cobertura, leito, bordas, medida, técnica, região, classificação) ficam de fora: pulariam pouco
+_VISUAL = re.compile(
+    r"\b(posicion\w*|decubito|anatomi\w*|camadas? da pele|epiderme|derme|calcad\w*|sapato\w*|palmilh\w*|"
+    r"orteses?|bota de unna|enfaix\w*|bandage\w*|compressa\w*|compressiv\w*|passo a passo|como (aplicar|"
+    r"fazer|medir|trocar|colocar|posicionar)|regua|fluxograma|esquema|desenh\w*|figura|imagem|ilustra\w*|"
+    r"estagio|localiza\w*|sacr\w*|calcanhar|proeminencia\w*|tunel\w*|descolamento)\b"
+)
+# Indícios de resposta puramente textual (conceito, prazo, conduta medicamentosa, sim/não)
+_TEXTUAL = re.compile(
+    r"\b(o que (e|significa)|defini\w*|conceito|quanto tempo|prazo|dias?|semanas?|pode(m|ria)?|posso|"
+    r"e normal|dose\w*|antibiotic\w*|medicament\w*|remedio\w*|dieta|alimenta\w*|proteina\w*|glicemia|"
+    r"exame\w*|resultado|sintoma\w*|dor|febre|diferenca|vantage\w*|evidencia\w*|artigo\w*|referencia\w*)\b"
+)
+_PALAVRA = re.compile(r"\w+")
+_LISTA_NUMERADA = re.compile(r"^\s*\d+[.)]\s", flags=re.MULTILINE)
+
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas sem acentos (o que não é ASCII depois do NFKD cai fora)."""
+    return unicodedata.normalize("NFKD", texto or "").casefold().encode("ascii", "ignore").decode()
+
+
+# =========================
+# Atributos
+# =========================
+N_FIXOS = 7  # viés + atributos de regras (antes do hashing)
+
+
+def _indicios(q: str, r: str) -> tuple[int, int, int]:
+    return len(_VISUAL.findall(q)), len(_VISUAL.findall(r)), len(_TEXTUAL.findall(q))
+
+
+def indicios(pergunta: str, resposta: str) -> tuple[int, int, int]:
+    """(visuais na pergunta, visuais na resposta, textuais na pergunta)."""
+    return _indicios(_normalizar(pergunta), _normalizar(resposta[:MAX_CHARS_RESPOSTA]))
+
+
+def atributos(pergunta: str, resposta: str, dim: int = DIM_HASH) -> np.ndarray:
+    resposta = resposta[:MAX_CHARS_RESPOSTA]
+    q, r = _normalizar(pergunta), _normalizar(resposta)
+    vis_q, vis_r, txt_q = _indicios(q, r)
+    fixos = (1.0, math.log1p(vis_q), math.log1p(vis_r), math.log1p(txt_q),
+             math.log1p(len(_LISTA_NUMERADA.findall(resposta))), math.log1p(len(pergunta)) / 5,
+             float(vis_q + vis_r == 0))
+    idx = [zlib.crc32(b"q:" + p.encode()) % dim for p in _PALAVRA.findall(q)]
+    idx += [zlib.crc32(b"r:" + p.encode()) % dim for p in _PALAVRA.findall(r)]
+    return np.concatenate((np.array(fixos, dtype=np.float32),
+                           np.log1p(np.bincount(idx, minlength=dim)).astype(np.float32)))
+
+
+# =========================
+# Classificador
+# =========================
+class PreClassificador:
+    def __init__(self, pesos: np.ndarray | None = None, limiar_nao: float = LIMIAR_NAO_PADRAO,
+                 limiar_sim: float = LIMIAR_SIM_PADRAO):
+        self.pesos = pesos
+        self.limiar_nao = limiar_nao
+        self.limiar_sim = limiar_sim
+
+    @classmethod
+    def carregar(cls, caminho: Path) -> "PreClassificador":
+        """Pesos de `treinar` (.npz); sem arquivo, só as regras."""
+        try:
+            with np.load(caminho) as z:
+                return cls(z["pesos"], float(z["limiar_nao"]), float(z["limiar_sim"]))
+        except (OSError, KeyError, ValueError):
+            return cls()
+
+    def salvar(self, caminho: Path) -> None:
+        np.savez(caminho, pesos=self.pesos, limiar_nao=self.limiar_nao, limiar_sim=self.limiar_sim)
+
+    def probabilidade(self, pergunta: str, resposta: str) -> float | None:
+        if self.pesos is None:
+            return None
+        z = float(atributos(pergunta, resposta, len(self.pesos) - N_FIXOS) @ self.pesos)
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def decidir(self, pergunta: str, resposta: str) -> tuple[str, float | None]:
+        """("nao" | "sim" | "modelo", probabilidade do modelo local ou None)."""
+        p = self.probabilidade(pergunta, resposta)
+        if p is None:
+            vis_q, vis_r, _ = indicios(pergunta, resposta)
+            return (NAO if vis_q + vis_r == 0 else MODELO), None
+        if p < self.limiar_nao:
+            return NAO, p
+        if p > self.limiar_sim:
+            return SIM, p
+        return MODELO, p
+
+
+def decisao_local(classe: str) -> dict | None:
+    """Decisão no formato de `decidir_esboco` quando o Gemini não precisa ser chamado (só no "nao")."""
+    if classe == NAO:
+        return {"need_sketch": False, "reason": "", "sketch_prompt": ""}
+    return None
+
+
+# =========================
+# Registro de decisões (dados de treino e concordância)
+# =========================
+class RegistroDecisoes:
+    def __init__(self, arquivo: Path):
+        self.arquivo = Path(arquivo)
+        self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def registrar(self, pergunta: str, resposta: str, need_sketch: bool, fonte: str,
+                  local: str, prob: float | None) -> None:
+        r = {"ts": round(time.time(), 3), "pergunta": pergunta, "resposta": resposta[:MAX_CHARS_RESPOSTA],
+             "need_sketch": bool(need_sketch), "fonte": fonte, "local": local,
+             "prob": None if prob is None else round(prob, 4)}
+        with self._lock, self.arquivo.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    def ler(self) -> list[dict]:
+        if not self.arquivo.exists():
+            return []
+        registros = []
+        with self.arquivo.open(encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registros.append(json.loads(linha))
+                except ValueError:
+                    continue
+        return registros
+
+
+def concordancia(registros: list[dict]) -> dict:
+    """Taxa de pulos (decisões "nao" locais) e concordância delas com as do Gemini já registradas."""
+    pulados = [r for r in registros if r.get("local") == NAO]
+    sim = [r for r in registros if r.get("local") == SIM]
+    return {
+        "n": len(registros),
+        "taxa_pulos": round(len(pulados) / len(registros), 4) if registros else 0.0,
+        "concordancia": round(sum(not r["need_sketch"] for r in pulados) / len(pulados), 4) if pulados else None,
+        "concordancia_sim": round(sum(r["need_sketch"] for r in sim) / len(sim), 4) if sim else None,
+        "positivos": sum(r["need_sketch"] for r in registros),
+    }
+
+
+# =========================
+# Treino
+# =========================
+def treinar(registros: list[dict], dim: int = DIM_HASH, epocas: int = 400, taxa: float = 0.5,
+            l2: float = 1e-3) -> np.ndarray:
+    """Regressão logística (descida de gradiente em lote, classes balanceadas)."""
+    X = np.stack([atributos(r["pergunta"], r["resposta"], dim) for r in registros])
+    y = np.array([r["need_sketch"] for r in registros], dtype=np.float32)
+    pos = max(1.0, float(y.sum()))
+    neg = max(1.0, float(len(y) - y.sum()))
+    peso_amostra = np.where(y == 1, len(y) / (2 * pos), len(y) / (2 * neg)).astype(np.float32)
+    w = np.zeros(X.shape[1], dtype=np.float32)
+    for _ in range(epocas):
+        p = 1.0 / (1.0 + np.exp(-np.clip(X @ w, -30, 30)))
+        grad = X.T @ ((p - y) * peso_amostra) / len(y) + l2 * w
+        w -= taxa * grad
+    return w
+
+
+def escolher_limiares(probs: np.ndarray, y: np.ndarray, alvo: float) -> tuple[float, float]:
+    """Limiares mais largos em que os pulos ainda concordam com o Gemini em pelo menos `alvo`."""
+    ordem = np.argsort(probs)
+    p, yy = probs[ordem], y[ordem]
+    limiar_nao = 0.0
+    acertos_nao = np.cumsum(yy == 0) / np.arange(1, len(p) + 1)
+    ok = np.nonzero(acertos_nao >= alvo)[0]
+    if len(ok):
+        limiar_nao = float(p[ok[-1]]) + 1e-6
+    limiar_sim = 1.0
+    acertos_sim = (np.cumsum((yy == 1)[::-1]) / np.arange(1, len(p) + 1))[::-1]
+    ok = np.nonzero(acertos_sim >= alvo)[0]
+    if len(ok):
+        limiar_sim = max(limiar_nao, float(p[ok[0]]) - 1e-6)
+    return min(limiar_nao, 0.5), max(limiar_sim, 0.5)
+
+
+def avaliar(clf: PreClassificador, registros: list[dict]) -> dict:
+    locais = []
+    t0 = time.perf_counter()
+    for r in registros:
+        classe, _ = clf.decidir(r["pergunta"], r["resposta"])
+        locais.append({**r, "local": classe})
+    us = (time.perf_counter() - t0) * 1e6 / max(1, len(registros))
+    return {**concordancia(locais), "us_por_decisao": round(us, 1)}
+
+
+def main(argv: list[str] | None = None) -> None:
+    from cache_respostas import DIR_DADOS
+
+    p = argparse.ArgumentParser(description="Treina/avalia o pré-classificador da decisão de esboço.")
+    p.add_argument("acao", choices=["treinar", "relatorio"])
+    p.add_argument("--dados", default=str(DIR_DADOS / "decisoes_esboco.jsonl"))
+    p.add_argument("--pesos", default=str(DIR_DADOS / "classificador_esboco.npz"))
+    p.add_argument("--alvo", type=float, default=0.97, help="concordância mínima dos pulos com o Gemini")
+    p.add_argument("--validacao", type=float, default=0.2, help="fração separada para medir")
+    args = p.parse_args(argv)
+
+    registros = RegistroDecisoes(Path(args.dados)).ler()
+    if args.acao == "relatorio":
+        print(json.dumps({"producao": concordancia(registros),
+                          "atual": avaliar(PreClassificador.carregar(Path(args.pesos)), registros)},
+                         ensure_ascii=False, indent=2))
+        return
+
+    if len(registros) < 20 or len({r["need_sketch"] for r in registros}) < 2:
+        raise SystemExit(f"Poucos dados para treinar ({len(registros)} decisões; são precisas as duas classes).")
+    rng = np.random.default_rng(0)
+    idx = rng.permutation(len(registros))
+    n_val = max(1, int(len(registros) * args.validacao))
+    val = [registros[i] for i in idx[:n_val]]
+    treino = [registros[i] for i in idx[n_val:]]
+
+    pesos = treinar(treino)
+    clf = PreClassificador(pesos)
+    probs = np.array([clf.probabilidade(r["pergunta"], r["resposta"]) for r in treino])
+    clf.limiar_nao, clf.limiar_sim = escolher_limiares(
+        probs, np.array([r["need_sketch"] for r in treino], dtype=np.int8), args.alvo
+    )
+    relatorio = {"treino": len(treino), "validacao": avaliar(clf, val), "regras": avaliar(PreClassificador(), val),
+                 "limiar_nao": round(clf.limiar_nao, 4), "limiar_sim": round(clf.limiar_sim, 4)}
+    clf.pesos = treinar(registros)  # pesos finais com todos os dados, mesmos limiares
+    clf.salvar(Path(args.pesos))
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
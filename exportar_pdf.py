@@ -0,0 +1,406 @@
+"""
+Exportação PDF A4: banner no cabeçalho, rodapé fixo e numeração "Página N de T".
+"""
+import io
+import re
+import threading
+from collections.abc import Sequence
+from contextlib import contextmanager
+from functools import lru_cache
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+
+import recursos
+
+FOOTER_TEXT = "PET G10 UFPel - Telemonitoramento de Feridas Crônicas"
+ALTURA_FOTO_PDF_CM = 6.0
+
+
+# =========================
+# Configuração do ReportLab durante a montagem
+# =========================
+# Toda montagem de PDF do processo passa por aqui (`gerar_pdf_a4`, `relatorio_pdf`)
+_reportlab_lock = threading.RLock()
+
+
+@contextmanager
+def sem_ascii85():
+    """
+    Streams binários (zlib) em vez de zlib + ASCII85 enquanto um PDF nosso é
+    montado: sem o acelerador em C do ReportLab, o ASCII85 em Python puro
+    levava ~0,7 s por PDF só no banner. O ReportLab não tem essa opção por
+    canvas: `rl_config.useA85` é global e lido ao desenhar e ao salvar. Por
+    isso a montagem inteira roda com o lock (um PDF por vez no processo; são
+    CPU puro, o GIL já os serializava) e o valor original volta no fim.
+    """
+    with _reportlab_lock:
+        original = rl_config.useA85
+        rl_config.useA85 = 0
+        try:
+            yield
+        finally:
+            rl_config.useA85 = original
+
+
+# =========================
+# Layout de texto (medidas reais da fonte)
+# =========================
+FONTE = "Helvetica"
+FONTE_NEGRITO = "Helvetica-Bold"
+TAMANHO = 10
+ENTRELINHA = 1.275  # 10 pt → 0.45 cm, o espaçamento de sempre
+MARGEM = 2 * cm
+LARGURA_UTIL = A4[0] - 2 * MARGEM
+TOPO = A4[1] - MARGEM
+LIMITE = MARGEM + 1.6 * cm  # reserva espaço pro rodapé
+Y_RODAPE = 1.2 * cm
+
+_TITULO = re.compile(r"^(#{1,6})\s+(.*)$")
+_ITEM = re.compile(r"^(\s*)([-*+•]|\d+[.)])\s+(.*)$")
+_NEGRITO = re.compile(r"\*\*|__")
+_ENFASE = re.compile(r"(?<![\w*])\*(?!\*)|(?<!\*)\*(?![\w*])|`")
+_ESPACOS = re.compile(r"(\s+)")
+
+
+@lru_cache(maxsize=65536)
+def largura_palavra(palavra: str, fonte: str, tamanho: float) -> float:
+    """`stringWidth` memoizado: cada palavra é medida uma vez por fonte/tamanho."""
+    return pdfmetrics.stringWidth(palavra, fonte, tamanho)
+
+
+def quebrar_linhas(larguras: list[float], largura_max: float, espaco: float) -> list[tuple[int, int]]:
+    """
+    Quebra gulosa por largura acumulada: devolve (início, fim) das palavras de cada linha.
+    Nenhuma string é montada aqui; palavra maior que a linha fica sozinha.
+    """
+    linhas: list[tuple[int, int]] = []
+    ini = 0
+    atual = 0.0
+    for i, w in enumerate(larguras):
+        if i == ini:
+            atual = w
+        elif atual + espaco + w > largura_max:
+            linhas.append((ini, i))
+            ini = i
+            atual = w
+        else:
+            atual += espaco + w
+    if ini < len(larguras):
+        linhas.append((ini, len(larguras)))
+    return linhas
+
+
+def wrap_text(text: str, largura_max: float = LARGURA_UTIL, fonte: str = FONTE, tamanho: float = TAMANHO) -> list[str]:
+    """Quebra texto simples em linhas que cabem em `largura_max` (pt) na fonte dada."""
+    espaco = largura_palavra(" ", fonte, tamanho)
+    lines: list[str] = []
+    for para in (text or "").splitlines():
+        words = para.split()
+        if not words:
+            lines.append("")
+            continue
+        larguras = [largura_palavra(w, fonte, tamanho) for w in words]
+        lines.extend(" ".join(words[i:j]) for i, j in quebrar_linhas(larguras, largura_max, espaco))
+    return lines
+
+
+def _palavras(texto: str, markdown: bool = True) -> list[list[tuple[str, bool]]]:
+    """Separa em palavras; cada palavra é uma lista de fragmentos (texto, negrito)."""
+    if not markdown:
+        return [[(w, False)] for w in texto.split()]
+    texto = _ENFASE.sub("", texto)
+    palavras: list[list[tuple[str, bool]]] = []
+    atual: list[tuple[str, bool]] = []
+    for n, seg in enumerate(_NEGRITO.split(texto)):
+        negrito = n % 2 == 1
+        for peca in _ESPACOS.split(seg):
+            if not peca:
+                continue
+            if peca.isspace():
+                if atual:
+                    palavras.append(atual)
+                    atual = []
+            else:
+                atual.append((peca, negrito))
+    if atual:
+        palavras.append(atual)
+    return palavras
+
+
+class Bloco:
+    """Bloco estilizado (título, parágrafo, item de lista ou espaço): um flowable mínimo."""
+
+    __slots__ = ("palavras", "fonte", "fonte_negrito", "tamanho", "recuo", "marcador", "espaco_antes")
+
+    def __init__(self, palavras, fonte=FONTE, fonte_negrito=FONTE_NEGRITO, tamanho=TAMANHO,
+                 recuo=0.0, marcador="", espaco_antes=0.0):
+        self.palavras = palavras
+        self.fonte = fonte
+        self.fonte_negrito = fonte_negrito
+        self.tamanho = tamanho
+        self.recuo = recuo
+        self.marcador = marcador
+        self.espaco_antes = espaco_antes
+
+    @property
+    def altura_linha(self) -> float:
+        return self.tamanho * ENTRELINHA
+
+    def wrap(self, largura_max: float) -> list[list[tuple[str, bool]]]:
+        """Linhas prontas para desenhar: cada uma é uma lista de trechos (texto, negrito)."""
+        fontes = (self.fonte, self.fonte_negrito)
+        larguras = [
+            sum(largura_palavra(t, fontes[b], self.tamanho) for t, b in palavra)
+            for palavra in self.palavras
+        ]
+        espaco = largura_palavra(" ", self.fonte, self.tamanho)
+        linhas = []
+        for i, j in quebrar_linhas(larguras, largura_max - self.recuo, espaco):
+            trechos: list[tuple[str, bool]] = []
+            partes: list[str] = []
+            estilo = None
+            for k in range(i, j):
+                for n, (t, b) in enumerate(self.palavras[k]):
+                    if b != estilo and partes:
+                        trechos.append(("".join(partes), estilo))
+                        partes = []
+                    estilo = b
+                    if n == 0 and k > i:
+                        partes.append(" ")
+                    partes.append(t)
+            if partes:
+                trechos.append(("".join(partes), estilo))
+            linhas.append(trechos)
+        return linhas
+
+
+def blocos_texto(texto: str) -> list[Bloco]:
+    """Texto simples (ex.: a pergunta): uma linha de entrada = um parágrafo."""
+    return [Bloco(_palavras(linha, markdown=False)) for linha in (texto or "").splitlines()]
+
+
+def blocos_markdown(texto: str) -> list[Bloco]:
+    """Converte o Markdown que o modelo devolve (títulos, listas, negrito) em blocos."""
+    blocos: list[Bloco] = []
+    for linha in (texto or "").splitlines():
+        s = linha.rstrip()
+        if not s.strip() or s.strip() in ("---", "***", "___"):
+            blocos.append(Bloco([]))
+            continue
+        m = _TITULO.match(s.strip())
+        if m:
+            tamanho = {1: 14, 2: 13, 3: 12}.get(len(m.group(1)), 11)
+            blocos.append(Bloco(_palavras(m.group(2)), fonte=FONTE_NEGRITO, tamanho=tamanho,
+                                espaco_antes=0.25 * cm))
+            continue
+        m = _ITEM.match(s)
+        if m:
+            nivel = len(m.group(1).expandtabs(4)) // 2
+            marcador = "•" if m.group(2) in "-*+•" else m.group(2)
+            blocos.append(Bloco(_palavras(m.group(3)), recuo=0.6 * cm * (nivel + 1), marcador=marcador))
+            continue
+        blocos.append(Bloco(_palavras(s.strip())))
+    return blocos
+
+
+class NumberedCanvas(canvas.Canvas):
+    """
+    Canvas com rodapé e "Página N de T".
+
+    O texto fixo do rodapé é um form XObject definido na primeira página e
+    desenhado por referência nas demais. O total T só é conhecido no fim,
+    então cada página referencia outro form com o total, definido uma única
+    vez em `save()`. Nenhum estado do canvas é copiado por página: a memória
+    não cresce com o número de páginas além do próprio conteúdo do PDF.
+    """
+
+    _FORM_TOTAL = "ensina_total_paginas"
+    _FORM_RODAPE = "ensina_rodape"
+    _FONTE_RODAPE = ("Helvetica", 9)
+
+    def __init__(self, *args, footer_text: str = "", **kwargs):
+        super().__init__(*args, **kwargs)
+        self._footer_text = footer_text
+        self._num_paginas = 0
+
+    def showPage(self):
+        self._num_paginas += 1
+        self._draw_footer(self._num_paginas)
+        super().showPage()
+
+    def save(self):
+        if len(self._code):
+            self.showPage()
+        # agora o total é conhecido: define o form usado por todas as páginas
+        self.beginForm(self._FORM_TOTAL)
+        self.setFont(*self._FONTE_RODAPE)
+        self.drawString(0, 0, str(self._num_paginas))
+        self.endForm()
+        super().save()
+
+    def _draw_footer(self, page_num: int):
+        width, _ = self._pagesize
+        margin = MARGEM
+        y = Y_RODAPE
+
+        if page_num == 1:
+            self.beginForm(self._FORM_RODAPE)
+            self.setFont(*self._FONTE_RODAPE)
+            self.drawString(margin, y, self._footer_text)
+            self.endForm()
+        self.saveState()
+        self.doForm(self._FORM_RODAPE)
+        self.setFont(*self._FONTE_RODAPE)
+        # "Página N de " alinhado de modo que até "9999 de 9999" caiba na margem
+        x = width - margin - pdfmetrics.stringWidth("Página 9999 de 9999", *self._FONTE_RODAPE)
+        rotulo = f"Página {page_num} de "
+        self.drawString(x, y, rotulo)
+        self.translate(x + pdfmetrics.stringWidth(rotulo, *self._FONTE_RODAPE), y)
+        self.doForm(self._FORM_TOTAL)
+        self.restoreState()
+
+
+# =========================
+# Diagramação (texto descendo a página, com quebra de página)
+# =========================
+class Diagramador:
+    """
+    Desenha blocos, títulos e fotos de cima para baixo num canvas, virando a
+    página quando a próxima linha não cabe acima do rodapé. É o layout de
+    `gerar_pdf_a4`, também usado pelo relatório (`relatorio_pdf`).
+    `ao_abrir_pagina`, se dado, roda logo depois de cada página nova (ex.:
+    desenhar o cabeçalho); `y` é a posição atual.
+    """
+
+    def __init__(self, c: canvas.Canvas, topo: float = TOPO, limite: float = LIMITE, margem: float = MARGEM,
+                 largura: float = LARGURA_UTIL, ao_abrir_pagina=None):
+        self.c = c
+        self.topo = topo
+        self.limite = limite
+        self.margem = margem
+        self.largura = largura
+        self.ao_abrir_pagina = ao_abrir_pagina
+        self.y = topo
+
+    def nova_pagina(self) -> None:
+        self.c.showPage()
+        self.y = self.topo
+        if self.ao_abrir_pagina is not None:
+            self.ao_abrir_pagina()
+
+    def espaco(self, altura: float) -> None:
+        self.y -= altura
+
+    def titulo(self, texto: str, tamanho: float = 12) -> None:
+        if self.y < self.limite:
+            self.nova_pagina()
+        self.c.setFont(FONTE_NEGRITO, tamanho)
+        self.c.drawString(self.margem, self.y, texto)
+        self.y -= 0.6 * cm
+
+    def desenhar(self, blocos: list[Bloco]) -> None:
+        c = self.c
+        for b in blocos:
+            if not b.palavras:
+                self.y -= b.altura_linha * 0.5
+                continue
+            self.y -= b.espaco_antes
+            fontes = (b.fonte, b.fonte_negrito)
+            for n, trechos in enumerate(b.wrap(self.largura)):
+                if self.y < self.limite:
+                    self.nova_pagina()
+                x = self.margem + b.recuo
+                if n == 0 and b.marcador:
+                    c.setFont(b.fonte, b.tamanho)
+                    c.drawRightString(x - 0.15 * cm, self.y, b.marcador)
+                t = c.beginText(x, self.y)
+                for texto, negrito in trechos:
+                    t.setFont(fontes[negrito], b.tamanho)
+                    t.textOut(texto)
+                c.drawText(t)
+                self.y -= b.altura_linha
+
+    def desenhar_fotos(self, miniaturas: Sequence[bytes]) -> None:
+        """Miniaturas lado a lado. JPEG via `ImageReader`: o ReportLab embute os bytes, sem decodificar."""
+        from reportlab.lib.utils import ImageReader
+
+        imagens = [ImageReader(io.BytesIO(m)) for m in miniaturas]
+        espaco = 0.4 * cm
+        larg_max = (self.largura - espaco * (len(imagens) - 1)) / len(imagens)
+        medidas = []
+        for img in imagens:
+            iw, ih = img.getSize()
+            escala = min(larg_max / iw, ALTURA_FOTO_PDF_CM * cm / ih)
+            medidas.append((iw * escala, ih * escala))
+        h = max(a for _, a in medidas)
+        self.y -= 0.3 * cm
+        if self.y - h < self.limite:
+            self.nova_pagina()
+        x = self.margem
+        for img, (w, a) in zip(imagens, medidas):
+            self.c.drawImage(img, x, self.y - a, width=w, height=a)
+            x += w + espaco
+        self.y -= h + 0.2 * cm
+
+    def pergunta_resposta(self, pergunta: str, resposta: str, titulo_pergunta: str | None = "Pergunta",
+                          titulo_resposta: str = "Resposta do Sistema", fotos: Sequence[bytes] = (),
+                          espaco_entre: float = 0.4 * cm) -> None:
+        """Um par pergunta/resposta: título (opcional), pergunta, fotos, título e resposta em Markdown."""
+        if titulo_pergunta:
+            self.titulo(titulo_pergunta)
+        self.desenhar(blocos_texto(pergunta))
+        if fotos:
+            self.desenhar_fotos(fotos)
+        self.espaco(espaco_entre)
+        self.titulo(titulo_resposta)
+        self.desenhar(blocos_markdown(resposta))
+
+
+def desenhar_banner(c: canvas.Canvas, y: float, altura_max: float = recursos.MAX_ALTURA_BANNER_PDF_CM * cm) -> float:
+    """Banner centralizado com o topo em `y`, proporcional, no máximo `altura_max`. Devolve a altura usada."""
+    img = recursos.banner_pdf()  # já reduzido e decodificado (cache do processo)
+    if img is None:
+        c.setFont(FONTE_NEGRITO, 10)
+        c.drawString(MARGEM, y, f"Banner não encontrado: {recursos.BANNER}")
+        return 0.0
+    iw, ih = img.getSize()
+    # escala para caber na largura; se ficou alto demais, limita pela altura (mantém proporção)
+    w, h = LARGURA_UTIL, ih * LARGURA_UTIL / float(iw)
+    if h > altura_max:
+        w, h = iw * altura_max / float(ih), altura_max
+    # centraliza horizontalmente se sobrou espaço (quando limitou pela altura)
+    c.drawImage(img, MARGEM + (LARGURA_UTIL - w) / 2.0, y - h, width=w, height=h, preserveAspectRatio=True,
+                mask="auto")
+    return h
+
+
+def gerar_pdf_a4(pergunta: str, resposta: str, historico: Sequence[tuple[str, str]] = (),
+                 fotos: Sequence[bytes] = ()) -> bytes:
+    """
+    Gera PDF A4 com banner no cabeçalho, rodapé fixo e numeração.
+    Com `historico` (pares pergunta/resposta anteriores), exporta a conversa
+    inteira, terminando em `pergunta`/`resposta`. `fotos` são as miniaturas JPEG
+    (`fotos.Foto.miniatura`) da última pergunta, desenhadas logo depois dela.
+    """
+    buffer = io.BytesIO()
+    with sem_ascii85():
+        c = NumberedCanvas(buffer, pagesize=A4, footer_text=FOOTER_TEXT)
+        d = Diagramador(c)
+
+        # --- Banner no topo, só na primeira página ---
+        d.espaco(desenhar_banner(c, d.y) + 0.8 * cm)
+
+        if not historico:
+            d.pergunta_resposta(pergunta, resposta, titulo_pergunta=None, fotos=fotos, espaco_entre=0.8 * cm)
+        else:
+            for n, (p, r) in enumerate([*historico, (pergunta, resposta)], start=1):
+                if n > 1:
+                    d.espaco(0.8 * cm)
+                d.pergunta_resposta(p, r, f"Pergunta {n}", f"Resposta {n}",
+                                    fotos=fotos if n == len(historico) + 1 else ())
+        c.save()
+    return buffer.getvalue()
@@ -0,0 +1,158 @@
+"""
+Fotos da ferida: redução e limpeza antes de irem ao Gemini.
+
+A foto enviada (upload ou câmera) é decodificada uma única vez, já reduzida
+(no JPEG, `draft` decodifica direto em 1/2, 1/4 ou 1/8 da resolução). Depois
+ela é girada conforme a orientação do EXIF e regravada sem metadados (sem GPS,
+aparelho ou data), com o maior lado limitado a `LADO_MAX`. Isso limita os bytes
+da requisição e os tokens de imagem. Do mesmo decode sai a miniatura JPEG do
+PDF, que o ReportLab embute como está, sem decodificar de novo.
+
+O resultado fica num cache em memória, pelo hash do conteúdo: reruns do
+Streamlit e a mesma foto enviada por várias sessões não reprocessam nada.
+Fotos de pacientes não são gravadas em disco.
+"""
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Maior lado (px) da foto enviada ao Gemini e formato/qualidade da regravação
+LADO_MAX = int(os.getenv("ENSINA_FERIDAS_FOTO_LADO", "1024"))
+FORMATO = os.getenv("ENSINA_FERIDAS_FOTO_FORMATO", "JPEG").upper()  # JPEG ou WEBP
+QUALIDADE = int(os.getenv("ENSINA_FERIDAS_FOTO_QUALIDADE", "85"))
+LADO_MINIATURA = 480  # px — no PDF a foto ocupa no máximo 6 cm (~200 dpi)
+
+EXTENSOES = ["jpg", "jpeg", "png", "webp"]
+MIMES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+MAX_FOTOS = 3
+MAX_BYTES_FOTO = 20 * 1024 * 1024
+MAX_PIXELS = 50_000_000  # acima disso a foto é recusada antes de decodificar
+MAX_BYTES_CACHE = 64 * 1024 * 1024
+
+
+class FotoInvalida(ValueError):
+    pass
+
+
+def tokens_imagem(largura: int, altura: int) -> int:
+    """Tokens de entrada de uma imagem no Gemini (aprox.): 258 até 384 px; acima, 258 por bloco de 768 × 768."""
+    if largura <= 384 and altura <= 384:
+        return 258
+    return 258 * math.ceil(largura / 768) * math.ceil(altura / 768)
+
+
+class Foto:
+    """Foto já processada: `dados` vão ao Gemini, `miniatura` (JPEG) vai ao PDF."""
+
+    def __init__(self, chave: str, dados: bytes, mime: str, largura: int, altura: int, miniatura: bytes,
+                 bytes_original: int, tamanho_original: tuple[int, int]):
+        self.chave = chave
+        self.dados = dados
+        self.mime = mime
+        self.largura = largura
+        self.altura = altura
+        self.miniatura = miniatura
+        self.bytes_original = bytes_original
+        self.tamanho_original = tamanho_original
+
+    @property
+    def tokens(self) -> int:
+        return tokens_imagem(self.largura, self.altura)
+
+    @property
+    def bytes_memoria(self) -> int:
+        return len(self.dados) + len(self.miniatura)
+
+    def parte(self) -> dict:
+        """Parte inline do `generate_content`."""
+        return {"mime_type": self.mime, "data": self.dados}
+
+
+class ProcessadorFotos:
+    def __init__(self, lado_max: int = LADO_MAX, formato: str = FORMATO, qualidade: int = QUALIDADE,
+                 lado_miniatura: int = LADO_MINIATURA, max_bytes_cache: int = MAX_BYTES_CACHE):
+        if formato not in MIMES:
+            raise ValueError(f"Formato de foto não suportado: {formato} (use {' ou '.join(MIMES)})")
+        self.lado_max = lado_max
+        self.formato = formato
+        self.qualidade = qualidade
+        self.lado_miniatura = lado_miniatura
+        self.max_bytes_cache = max_bytes_cache
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, Foto] = OrderedDict()
+        self._bytes_cache = 0
+        self._lock = threading.Lock()
+
+    def processar(self, dados: bytes) -> Foto:
+        """Foto reduzida e sem metadados (do cache, se o mesmo arquivo já passou por aqui)."""
+        if len(dados) > MAX_BYTES_FOTO:
+            raise FotoInvalida(f"Foto grande demais ({len(dados) / 2**20:.0f} MiB; máximo "
+                               f"{MAX_BYTES_FOTO // 2**20} MiB).")
+        chave = hashlib.sha256(dados).hexdigest()
+        with self._lock:
+            foto = self._cache.get(chave)
+            if foto is not None:
+                self._cache.move_to_end(chave)
+                self.hits += 1
+                return foto
+
+        foto = self._reduzir(dados, chave)
+        with self._lock:
+            self.misses += 1
+            if chave not in self._cache:
+                self._cache[chave] = foto
+                self._bytes_cache += foto.bytes_memoria
+            while self._bytes_cache > self.max_bytes_cache and len(self._cache) > 1:
+                _, antiga = self._cache.popitem(last=False)
+                self._bytes_cache -= antiga.bytes_memoria
+        return foto
+
+    def _reduzir(self, dados: bytes, chave: str) -> Foto:
+        try:
+            img = Image.open(io.BytesIO(dados))
+        except (UnidentifiedImageError, OSError) as e:
+            raise FotoInvalida("O arquivo enviado não é uma imagem reconhecida.") from e
+        with img:
+            tamanho_original = img.size
+            if img.width * img.height > MAX_PIXELS:
+                raise FotoInvalida(f"Foto com resolução alta demais ({img.width} × {img.height}).")
+            try:
+                # quadrado: a orientação do EXIF ainda pode trocar largura e altura
+                img.draft("RGB", (self.lado_max, self.lado_max))
+                img = ImageOps.exif_transpose(img)
+            except (OSError, SyntaxError) as e:  # arquivo truncado ou corrompido
+                raise FotoInvalida("Não foi possível ler a foto (arquivo corrompido?).") from e
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.info.clear()  # EXIF/ICC/XMP do original não vão para a regravação
+        img.thumbnail((self.lado_max, self.lado_max), Image.LANCZOS)
+
+        out = io.BytesIO()
+        if self.formato == "WEBP":
+            img.save(out, format="WEBP", quality=self.qualidade, method=4)
+        else:
+            img.save(out, format="JPEG", quality=self.qualidade, optimize=True)
+        reduzida = out.getvalue()
+
+        if self.formato == "JPEG" and max(img.size) <= self.lado_miniatura:
+            miniatura = reduzida
+        else:
+            mini = img.copy()
+            mini.thumbnail((self.lado_miniatura, self.lado_miniatura), Image.LANCZOS)
+            out = io.BytesIO()
+            mini.save(out, format="JPEG", quality=80, optimize=True)
+            miniatura = out.getvalue()
+
+        return Foto(chave, reduzida, MIMES[self.formato], img.width, img.height, miniatura, len(dados),
+                    tamanho_original)
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {"fotos_em_cache": len(self._cache), "mib_em_cache": round(self._bytes_cache / 2**20, 1),
+                    "hits": self.hits, "misses": self.misses, "lado_max": self.lado_max, "formato": self.formato}
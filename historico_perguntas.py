@@ -0,0 +1,197 @@
+"""
+Histórico persistente de perguntas e respostas (SQLite em modo WAL + FTS5).
+
+Cada troca fica registrada com sessão, conversa, modo, modelo, origem da
+resposta (cache, semântico, coalescida, Gemini), tempo até a resposta e a
+decisão de esboço. A busca usa um índice FTS5 sobre pergunta e resposta, por
+palavras inteiras, sem acentos nem caixa. Prefixos ficaram de fora: num termo
+comum, um prefixo obriga o FTS5 a ler a lista inteira de ocorrências. A sessão
+também é uma coluna do índice, então a busca dentro de uma sessão cruza duas
+listas em vez de filtrar todas as ocorrências. As páginas são por cursor
+(`id < último visto`), não por OFFSET: a décima milésima página custa o mesmo
+que a primeira.
+
+O texto vem inteiro do banco, então reexportar o PDF de uma troca antiga não
+chama o Gemini. As fotos não são guardadas, só quantas eram.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+POR_PAGINA = 20
+TAMANHO_TRECHO = 240  # caracteres da resposta na listagem (o texto inteiro só em `obter`)
+
+_COLUNAS = "id, criado, sessao, conversa, modo, modelo, origem, duracao_ms, fotos, esboco, pergunta"
+
+
+def consulta_fts(texto: str, sessao: str | None = None) -> str:
+    """Busca do usuário → consulta FTS5 segura: cada palavra entre aspas, todas obrigatórias."""
+    palavras = " ".join(f'"{p}"' for p in re.findall(r"\w+", texto or ""))
+    if not palavras:
+        return ""
+    consulta = f"{{pergunta resposta}} : ({palavras})"
+    if sessao is not None:
+        consulta += ' AND sessao : "{}"'.format(sessao.replace('"', '""'))
+    return consulta
+
+
+class HistoricoPerguntas:
+    """Trocas pergunta/resposta de todas as sessões. Seguro para uso entre threads."""
+
+    def __init__(self, caminho: Path):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.caminho), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS trocas (
+                id         INTEGER PRIMARY KEY,
+                criado     REAL NOT NULL,
+                sessao     TEXT NOT NULL,
+                conversa   TEXT,
+                modo       TEXT,
+                modelo     TEXT,
+                origem     TEXT,
+                duracao_ms REAL,
+                fotos      INTEGER NOT NULL DEFAULT 0,
+                esboco     TEXT,
+                pergunta   TEXT NOT NULL,
+                resposta   TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_trocas_sessao ON trocas(sessao, id);
+            CREATE INDEX IF NOT EXISTS idx_trocas_conversa ON trocas(conversa, id);
+
+            -- índice externo: o texto fica só em `trocas`; os gatilhos mantêm o FTS em dia
+            CREATE VIRTUAL TABLE IF NOT EXISTS trocas_fts USING fts5(
+                pergunta, resposta, sessao, content='trocas', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS trocas_ai AFTER INSERT ON trocas BEGIN
+                INSERT INTO trocas_fts(rowid, pergunta, resposta, sessao)
+                VALUES (new.id, new.pergunta, new.resposta, new.sessao);
+            END;
+            CREATE TRIGGER IF NOT EXISTS trocas_ad AFTER DELETE ON trocas BEGIN
+                INSERT INTO trocas_fts(trocas_fts, rowid, pergunta, resposta, sessao)
+                VALUES ('delete', old.id, old.pergunta, old.resposta, old.sessao);
+            END;
+            CREATE TRIGGER IF NOT EXISTS trocas_au AFTER UPDATE OF pergunta, resposta, sessao ON trocas BEGIN
+                INSERT INTO trocas_fts(trocas_fts, rowid, pergunta, resposta, sessao)
+                VALUES ('delete', old.id, old.pergunta, old.resposta, old.sessao);
+                INSERT INTO trocas_fts(rowid, pergunta, resposta, sessao)
+                VALUES (new.id, new.pergunta, new.resposta, new.sessao);
+            END;
+            """
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM trocas").fetchone()
+        return n
+
+    # ---- escrita ----
+    def registrar(self, sessao: str, pergunta: str, resposta: str, modo: str = "", modelo: str = "",
+                  origem: str = "", duracao_ms: float | None = None, conversa: str | None = None,
+                  esboco: dict | None = None, fotos: int = 0) -> int:
+        """Guarda uma troca e devolve o id dela."""
+        with self._lock:
+            cur = self._db.execute(
+                """
+                INSERT INTO trocas (criado, sessao, conversa, modo, modelo, origem, duracao_ms, fotos, esboco,
+                                    pergunta, resposta)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (time.time(), sessao, conversa, modo, modelo, origem,
+                 None if duracao_ms is None else round(duracao_ms, 1), fotos,
+                 None if esboco is None else json.dumps(esboco, ensure_ascii=False), pergunta, resposta),
+            )
+        return cur.lastrowid
+
+    def atualizar_esboco(self, id_troca: int, esboco: dict) -> None:
+        """A decisão de esboço que chegou depois (em segundo plano)."""
+        with self._lock:
+            self._db.execute("UPDATE trocas SET esboco = ? WHERE id = ?",
+                             (json.dumps(esboco, ensure_ascii=False), id_troca))
+
+    # ---- leitura ----
+    def pagina(self, sessao: str | None = None, busca: str = "", antes_de: int | None = None,
+               limite: int = POR_PAGINA) -> tuple[list[dict], int | None]:
+        """
+        Trocas mais recentes primeiro (de uma `sessao` ou de todas), opcionalmente
+        filtradas por `busca`. Devolve (linhas, cursor): passe o cursor em
+        `antes_de` para a página seguinte; None quando acabou.
+        """
+        filtros, args = [], []
+        consulta = consulta_fts(busca, sessao)
+        if consulta:
+            sql = (f"SELECT {', '.join('t.' + c for c in _COLUNAS.split(', '))}, "
+                   f"snippet(trocas_fts, 1, '**', '**', '…', 32) AS trecho "
+                   "FROM trocas_fts JOIN trocas t ON t.id = trocas_fts.rowid")
+            filtros.append("trocas_fts MATCH ?")
+            args.append(consulta)
+            coluna_id = "trocas_fts.rowid"
+        else:
+            sql = f"SELECT {_COLUNAS}, substr(resposta, 1, {TAMANHO_TRECHO}) AS trecho FROM trocas t"
+            coluna_id = "t.id"
+        if sessao is not None and not consulta:  # com busca, a sessão já vai na consulta FTS
+            filtros.append("t.sessao = ?")
+            args.append(sessao)
+        if antes_de is not None:
+            filtros.append(f"{coluna_id} < ?")
+            args.append(antes_de)
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        sql += f" ORDER BY {coluna_id} DESC LIMIT ?"
+        args.append(limite + 1)  # uma a mais: diz se existe página seguinte sem contar tudo
+
+        with self._lock:
+            try:
+                linhas = [self._dict(l) for l in self._db.execute(sql, args)]
+            except sqlite3.OperationalError:
+                linhas = []  # consulta que o FTS5 não aceita: nenhum resultado
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            return linhas, linhas[-1]["id"]
+        return linhas, None
+
+    def obter(self, id_troca: int) -> dict | None:
+        with self._lock:
+            linha = self._db.execute(f"SELECT {_COLUNAS}, resposta FROM trocas WHERE id = ?",
+                                     (id_troca,)).fetchone()
+        return None if linha is None else self._dict(linha)
+
+    def turnos_anteriores(self, id_troca: int) -> list[tuple[str, str]]:
+        """Pares (pergunta, resposta) da mesma conversa antes desta troca, em ordem (para o PDF)."""
+        with self._lock:
+            return [tuple(l) for l in self._db.execute(
+                """
+                SELECT a.pergunta, a.resposta FROM trocas a
+                JOIN trocas t ON t.id = ? AND a.conversa = t.conversa
+                WHERE a.id < t.id ORDER BY a.id
+                """,
+                (id_troca,),
+            )]
+
+    @staticmethod
+    def _dict(linha: sqlite3.Row) -> dict:
+        d = dict(linha)
+        if d.get("esboco"):
+            try:
+                d["esboco"] = json.loads(d["esboco"])
+            except ValueError:
+                d["esboco"] = None
+        return d
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            n, sessoes = self._db.execute(
+                "SELECT COALESCE(MAX(id), 0), (SELECT COUNT(DISTINCT sessao) FROM trocas) FROM trocas"
+            ).fetchone()
+        return {"trocas": n, "sessoes": sessoes, "bytes": self.caminho.stat().st_size if self.caminho.exists() else 0}
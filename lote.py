@@ -0,0 +1,271 @@
+"""
+Modo lote: gera respostas (e PDFs) para uma lista de casos clínicos, sem UI.
+
+Uso:
+    python lote.py casos.jsonl --saida saida_lote --modo ensino --workers 4 --esboco --pdf
+    python lote.py casos.csv --cliente fake          # offline, para testar o fluxo
+    python lote.py casos.jsonl --relatorio           # + um PDF único com sumário
+    python lote.py casos.jsonl --documentos documentos  # trechos dos protocolos no prompt
+
+Entrada:
+  - JSONL: um objeto por linha com "pergunta" (ou "caso"/"texto") e, opcionalmente, "id".
+  - CSV: cabeçalho com coluna "pergunta" (ou "caso"/"texto") e, opcionalmente, "id".
+  Sem "id", usa o número da linha.
+
+Saída (em --saida):
+  - respostas.jsonl  um registro por caso; também é o checkpoint: ao rodar de
+                     novo, casos com status "ok" são pulados
+  - pdf/<id>.pdf     um PDF por caso (com --pdf)
+  - relatorio.pdf    todos os casos respondidos num PDF só, com sumário (com --relatorio)
+  - resumo.json      vazão e latências da execução
+"""
+import argparse
+import csv
+import hashlib
+import importlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from nucleo import (
+    MODO_CLINICO,
+    MODO_DECISOR,
+    MODO_ENSINO,
+    ClienteGemini,
+    build_prompt,
+    configurar_sdk,
+    decidir_esboco,
+)
+from resiliencia import Disjuntor, GuardaGemini, Limitador
+
+CAMPOS_PERGUNTA = ("pergunta", "caso", "texto")
+
+
+# =========================
+# Clientes
+# =========================
+class ClienteFake:
+    """Cliente offline e determinístico (mesmo prompt → mesma resposta), com latência simulada."""
+
+    def __init__(self, latencia_s: float = 0.05):
+        self.latencia_s = latencia_s
+
+    def gerar(self, prompt: str, modelo: str, temperatura: float, modo: str | None = None) -> str:
+        time.sleep(self.latencia_s)
+        h = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if modo == MODO_DECISOR:
+            return json.dumps({"need_sketch": int(h, 16) % 4 == 0, "reason": "simulado", "sketch_prompt": ""})
+        return f"## Resposta simulada ({modelo}, t={temperatura})\n\n- hash: {h[:12]}\n- tamanho do prompt: {len(prompt)}\n"
+
+
+def carregar_cliente(nome: str, latencia_fake_s: float, rpm: float = 60, tpm: float = 1_000_000):
+    """"gemini", "fake" ou "modulo:Classe" (classe com `gerar(prompt, modelo, temperatura, modo)`)."""
+    if nome == "gemini":
+        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            sys.exit("Faltou a chave da API. Defina GOOGLE_API_KEY ou GEMINI_API_KEY (ou use --cliente fake).")
+        configurar_sdk(api_key)
+        return ClienteGemini(GuardaGemini(Limitador(rpm, tpm), Disjuntor()))
+    if nome == "fake":
+        return ClienteFake(latencia_fake_s)
+    modulo, _, classe = nome.partition(":")
+    return getattr(importlib.import_module(modulo), classe)()
+
+
+# =========================
+# Entrada / checkpoint
+# =========================
+def _pergunta(registro: dict) -> str:
+    for campo in CAMPOS_PERGUNTA:
+        if registro.get(campo):
+            return str(registro[campo]).strip()
+    return ""
+
+
+def ler_casos(caminho: Path) -> list[dict]:
+    casos: list[dict] = []
+    if caminho.suffix.lower() == ".csv":
+        with caminho.open(encoding="utf-8-sig", newline="") as f:
+            linhas = list(csv.DictReader(f))
+    else:
+        with caminho.open(encoding="utf-8") as f:
+            linhas = [json.loads(l) for l in f if l.strip()]
+    for n, registro in enumerate(linhas, start=1):
+        pergunta = _pergunta(registro)
+        if pergunta:
+            casos.append({"id": str(registro.get("id") or n), "pergunta": pergunta})
+    return casos
+
+
+def ids_concluidos(arquivo: Path) -> set[str]:
+    feitos: set[str] = set()
+    if arquivo.exists():
+        with arquivo.open(encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    r = json.loads(linha)
+                except ValueError:
+                    continue  # linha truncada por interrupção
+                if r.get("status") == "ok":
+                    feitos.add(r["id"])
+    return feitos
+
+
+def _nome_arquivo(caso_id: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", caso_id)[:80] or "caso"
+
+
+# =========================
+# Execução
+# =========================
+def processar(caso: dict, args, cliente, dir_pdf: Path, base=None) -> dict:
+    t0 = time.perf_counter()
+    registro = {"id": caso["id"], "pergunta": caso["pergunta"], "modo": args.modo, "modelo": args.modelo}
+    try:
+        trechos = base.buscar(caso["pergunta"], orcamento_ms=2000) if base is not None else []
+        if trechos:
+            registro["trechos"] = [t["rotulo"] for t in trechos]
+        resposta = cliente.gerar(
+            build_prompt(caso["pergunta"], args.modo, trechos), args.modelo, args.temperatura, modo=args.modo
+        )
+        registro["resposta"] = resposta
+        if args.esboco:
+            registro["esboco"] = decidir_esboco(caso["pergunta"], resposta, args.modelo, cliente=cliente)
+        if args.pdf:
+            from exportar_pdf import gerar_pdf_a4
+
+            arquivo = dir_pdf / f"{_nome_arquivo(caso['id'])}.pdf"
+            arquivo.write_bytes(gerar_pdf_a4(caso["pergunta"], resposta))
+            registro["pdf"] = str(arquivo)
+        registro["status"] = "ok"
+    except Exception as e:
+        registro["status"] = "erro"
+        registro["erro"] = f"{type(e).__name__}: {e}"
+    registro["latencia_s"] = round(time.perf_counter() - t0, 4)
+    return registro
+
+
+def escrever_relatorio_lote(casos: list[dict], arq_respostas: Path, destino: Path) -> int:
+    """Relatório com os casos já respondidos (ordem da entrada), gravado direto em `destino`."""
+    from relatorio_pdf import escrever_relatorio
+
+    respostas: dict[str, str] = {}
+    with arq_respostas.open(encoding="utf-8") as f:
+        for linha in f:
+            try:
+                r = json.loads(linha)
+            except ValueError:
+                continue
+            if r.get("status") == "ok" and r.get("resposta"):
+                respostas[r["id"]] = r["resposta"]
+    entradas = [(c["pergunta"], respostas[c["id"]]) for c in casos if c["id"] in respostas]
+    tmp = destino.with_suffix(".pdf.tmp")
+    with tmp.open("wb") as f:
+        paginas = escrever_relatorio(entradas, f, titulo="Ensina Feridas — relatório do lote")
+    tmp.replace(destino)
+    return paginas
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def executar(args) -> dict:
+    saida = Path(args.saida)
+    dir_pdf = saida / "pdf"
+    dir_pdf.mkdir(parents=True, exist_ok=True)
+    arq_respostas = saida / "respostas.jsonl"
+
+    casos = ler_casos(Path(args.entrada))
+    feitos = ids_concluidos(arq_respostas)
+    pendentes = [c for c in casos if c["id"] not in feitos]
+    print(f"{len(casos)} casos; {len(casos) - len(pendentes)} já concluídos; {len(pendentes)} a processar.")
+
+    cliente = carregar_cliente(args.cliente, args.latencia_fake, args.rpm, args.tpm)
+    base = None
+    if args.documentos:
+        from base_conhecimento import BaseConhecimento
+        from cache_semantico import EmbedderGemini, EmbedderHashing
+
+        # cliente fake: embeddings locais, para o fluxo todo rodar offline; com o Gemini, a
+        # indexação usa o mesmo limitador/disjuntor das respostas
+        embedder = (EmbedderHashing() if args.cliente == "fake"
+                    else EmbedderGemini(guarda=getattr(cliente, "guarda", None)))
+        base = BaseConhecimento(Path(args.documentos), saida / "conhecimento", embedder)
+        indexacao = base.atualizar()
+        print(f"Base de conhecimento: {indexacao['trechos']} trechos de {indexacao['documentos']} documentos.")
+    lock = threading.Lock()
+    latencias: list[float] = []
+    erros = 0
+    t0 = time.perf_counter()
+    with arq_respostas.open("a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futuros = [pool.submit(processar, c, args, cliente, dir_pdf, base) for c in pendentes]
+        for n, fut in enumerate(as_completed(futuros), start=1):
+            r = fut.result()
+            with lock:
+                out.write(json.dumps(r, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())  # checkpoint durável: interrupção não perde casos prontos
+            if r["status"] == "ok":
+                latencias.append(r["latencia_s"])
+            else:
+                erros += 1
+            print(f"[{n}/{len(pendentes)}] {r['id']}: {r['status']} ({r['latencia_s']:.2f} s)")
+    duracao = time.perf_counter() - t0
+
+    resumo = {
+        "casos": len(casos),
+        "pulados": len(casos) - len(pendentes),
+        "processados": len(pendentes),
+        "erros": erros,
+        "workers": args.workers,
+        "duracao_s": round(duracao, 3),
+        "vazao_casos_min": round(len(pendentes) / duracao * 60, 2) if duracao else 0.0,
+        "latencia_p50_s": round(_percentil(latencias, 50), 3),
+        "latencia_p95_s": round(_percentil(latencias, 95), 3),
+        "latencia_max_s": round(max(latencias, default=0.0), 3),
+    }
+    if args.relatorio:
+        t_rel = time.perf_counter()
+        resumo["relatorio_paginas"] = escrever_relatorio_lote(casos, arq_respostas, saida / "relatorio.pdf")
+        resumo["relatorio_s"] = round(time.perf_counter() - t_rel, 3)
+    (saida / "resumo.json").write_text(json.dumps(resumo, ensure_ascii=False, indent=2), encoding="utf-8")
+    return resumo
+
+
+def main(argv: list[str] | None = None) -> None:
+    p = argparse.ArgumentParser(description="Gera respostas do Ensina Feridas para uma lista de casos.")
+    p.add_argument("entrada", help="arquivo .jsonl ou .csv com os casos")
+    p.add_argument("--saida", default="saida_lote", help="pasta de saída (também guarda o checkpoint)")
+    p.add_argument("--modo", choices=["ensino", "clinico"], default="ensino")
+    p.add_argument("--modelo", default="models/gemini-2.0-flash")
+    p.add_argument("--temperatura", type=float, default=None, help="padrão: 0.25 (ensino) / 0.3 (clínico)")
+    p.add_argument("--workers", type=int, default=4, help="chamadas simultâneas ao Gemini")
+    p.add_argument("--esboco", action="store_true", help="também roda a decisão de esboço")
+    p.add_argument("--pdf", action="store_true", help="gera um PDF A4 por caso")
+    p.add_argument("--relatorio", action="store_true", help="gera um relatório único com sumário (relatorio.pdf)")
+    p.add_argument("--documentos", help="pasta de protocolos/material (PDF, MD, TXT) para pôr trechos no prompt")
+    p.add_argument("--rpm", type=float, default=60, help="limite de requisições/min ao Gemini")
+    p.add_argument("--tpm", type=float, default=1_000_000, help="limite de tokens/min ao Gemini")
+    p.add_argument("--cliente", default="gemini", help='"gemini", "fake" ou "modulo:Classe"')
+    p.add_argument("--latencia-fake", type=float, default=0.05, help="latência simulada do cliente fake (s)")
+    args = p.parse_args(argv)
+
+    args.modo = MODO_ENSINO if args.modo == "ensino" else MODO_CLINICO
+    if args.temperatura is None:
+        args.temperatura = 0.25 if args.modo == MODO_ENSINO else 0.3
+
+    resumo = executar(args)
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
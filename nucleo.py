@@ -0,0 +1,445 @@
+"""
+Núcleo sem UI do Ensina Feridas: prompts do "GEM", montagem do prompt e
+decisão de esboço. Usado pelo app Streamlit e pelo modo lote (`lote.py`).
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections.abc import Sequence
+
+# `google.generativeai` é importado só dentro das funções que chamam o Gemini:
+# o import custa ~1 s e a página do app abre sem precisar dele
+from resiliencia import estimar_tokens
+from telemetria import uso_tokens
+
+MODO_ENSINO = "Ensino (tutor)"
+MODO_CLINICO = "Clínico (objetivo)"
+MODOS = [MODO_ENSINO, MODO_CLINICO]
+
+
+# =========================
+# Prompts do "GEM"
+# =========================
+CLINICAL_HINT = (
+    "Você é um especialista em feridas crônicas e protocolos de cuidado (TIME/TIMERS). "
+    "Responda com orientação clínica segura e prática. "
+    "Se faltarem dados, faça perguntas objetivas. "
+    "Evite prescrever doses/condutas de alto risco sem contexto clínico. "
+    "Quando houver sinais de alarme (ex.: infecção sistêmica, isquemia grave, dor desproporcional), "
+    "recomende avaliação presencial."
+)
+
+EDU_HINT = (
+    "Você é um especialista em ensino & aprendizagem no ensino superior (tutor). "
+    "Seu objetivo é ensinar, não só responder. "
+    "Use explicação progressiva (do básico ao avançado), exemplos, analogias e perguntas diagnósticas. "
+    "Aplique metodologias ativas (PBL): formule hipóteses, peça dados que faltam e estimule raciocínio. "
+    "Sempre que possível, devolva um mini-roteiro de estudo + um exercício curto com gabarito comentado. "
+    "Mantenha o foco em feridas crônicas e protocolos TIME/TIMERS, com segurança clínica."
+)
+
+
+def system_hint(mode: str) -> str:
+    return EDU_HINT if mode == MODO_ENSINO else CLINICAL_HINT
+
+
+REGRAS_GERAIS = """REGRAS GERAIS:
+- Seja prático e didático.
+- Se houver risco (ex.: sinais de infecção sistêmica, isquemia grave, dor desproporcional), recomende avaliação presencial.
+"""
+
+REGRAS_ENSINO = (
+    "\nFORMATO (modo ensino):"
+    "\n1) Resposta curta (2–5 linhas) para situar."
+    "\n2) Explicação em passos (bullet points)."
+    "\n3) Perguntas diagnósticas (3–5)."
+    "\n4) Exercício rápido + gabarito comentado."
+    "\n5) Alertas de segurança (se aplicável).\n"
+)
+
+# Modo interno usado só pela decisão de esboço
+MODO_DECISOR = "decisor de esboço"
+
+REGRAS_ESBOCO = """Regras:
+- need_sketch = true quando uma figura melhoraria MUITO a compreensão (ex.: anatomia, posicionamento, escolha de calçado/órtese, passo-a-passo de curativo, fluxogramas, comparação visual, layout de equipamento).
+- need_sketch = false quando for pura explicação textual, listas simples, ou quando um desenho pode induzir erro clínico.
+- Se need_sketch = false, deixe sketch_prompt como string vazia "".
+- Se need_sketch = true, crie um prompt curto, bem específico, para gerar uma imagem didática, sem conteúdo chocante. Evite sangue explícito.
+"""
+
+INSTRUCAO_DECISOR = f"""Você é um assistente que decide se um ESBOÇO/FIGURA simples ajudaria a resposta.
+Contexto: o app é sobre feridas crônicas (TIME/TIMERS), mas a pergunta pode ser geral.
+
+Responda SOMENTE em JSON válido, SEM markdown, SEM texto extra, no formato:
+{{"need_sketch": true/false, "reason": "...", "sketch_prompt": "..."}}
+
+{REGRAS_ESBOCO}"""
+
+# Resposta + decisão de esboço numa chamada só: a resposta vem em streaming e,
+# no fim, um bloco JSON depois do marcador (retido pelo app, não exibido)
+MARCADOR_ESBOCO = "<<<ESBOCO_JSON>>>"
+
+INSTRUCAO_ESBOCO_EMBUTIDO = f"""
+ESBOÇO (ao final de TODA resposta):
+Depois de terminar a resposta, decida se um ESBOÇO/FIGURA simples ajudaria. Escreva, numa linha sozinha,
+{MARCADOR_ESBOCO}
+e em seguida SOMENTE um JSON válido, sem markdown, no formato:
+{{"need_sketch": true/false, "reason": "...", "sketch_prompt": "..."}}
+Não escreva nada depois do JSON e não mencione o marcador na resposta.
+
+{REGRAS_ESBOCO}"""
+
+# Modo interno usado só para resumir conversas longas
+MODO_RESUMIDOR = "resumidor de conversa"
+
+INSTRUCAO_RESUMIDOR = """Você mantém o resumo de uma conversa de tutoria sobre feridas crônicas (TIME/TIMERS).
+Recebe o resumo atual e os turnos mais antigos da conversa, e devolve o resumo atualizado.
+
+Regras:
+- Guarde o que o tutor precisa para continuar: dados do caso (paciente, ferida, exames, condutas já tentadas),
+  dúvidas do aluno, o que já foi explicado, exercícios propostos e respostas do aluno.
+- Não invente dados. Não repita explicações inteiras; registre só o essencial.
+- Texto corrido ou tópicos curtos, em português, sem markdown pesado.
+"""
+
+
+def instrucao_sistema(mode: str, esboco: bool = False) -> str:
+    """
+    Parte fixa do prompt de cada modo; vai como `system_instruction`, não a cada pergunta.
+    Com `esboco`, o modelo também devolve a decisão de esboço no fim (ver `separar_esboco`).
+    """
+    if mode == MODO_DECISOR:
+        return INSTRUCAO_DECISOR
+    if mode == MODO_RESUMIDOR:
+        return INSTRUCAO_RESUMIDOR
+    teaching_rules = REGRAS_ENSINO if mode == MODO_ENSINO else ""
+    sketch_rules = INSTRUCAO_ESBOCO_EMBUTIDO if esboco else ""
+    return f"""INSTRUÇÕES (contexto):
+{system_hint(mode)}
+
+{REGRAS_GERAIS}{teaching_rules}{sketch_rules}"""
+
+
+def build_prompt(user_text: str, mode: str, trechos: Sequence[dict] = (), fotos: int = 0) -> str:
+    """
+    Parte variável do prompt (a instrução fixa do `mode` vai em `instrucao_sistema`).
+    `trechos` (da base de conhecimento local, com "rotulo" e "texto") entram
+    numerados antes da pergunta, para o modelo citar como [n]. `fotos` é quantas
+    fotos da ferida vão anexadas (ver `anexar_imagens`).
+    """
+    contexto = ""
+    if trechos:
+        itens = "\n\n".join(f"[{i}] {t['rotulo']}\n{t['texto']}" for i, t in enumerate(trechos, start=1))
+        contexto = f"""TRECHOS DOS PROTOCOLOS E DO MATERIAL DO CURSO (use o que for pertinente e cite como [n]; \
+não atribua a eles o que não está escrito):
+{itens}
+
+"""
+    if fotos:
+        contexto += f"""FOTOS DA FERIDA: {fotos} em anexo. Descreva só o que é visível (leito, bordas, pele ao redor, \
+exsudato) e diga o que a foto não permite avaliar; não feche diagnóstico só pela imagem.
+
+"""
+    return f"""{contexto}SOLICITAÇÃO DO USUÁRIO:
+{user_text}
+"""
+
+
+def anexar_imagens(conteudos: list[dict] | str, partes: Sequence[dict]) -> list[dict] | str:
+    """Põe as imagens (partes inline, antes do texto) na última mensagem do usuário de `conteudos`."""
+    if not partes:
+        return conteudos
+    if isinstance(conteudos, str):
+        return [{"role": "user", "parts": [*partes, conteudos]}]
+    *anteriores, ultima = conteudos
+    return [*anteriores, {**ultima, "parts": [*partes, *ultima["parts"]]}]
+
+
+# =========================
+# Modelos (um por modelo × modo)
+# =========================
+# Endpoint alternativo da API (REST), ex.: o Gemini falso de `benchmarks/gemini_mock.py`
+# nos testes de carga; vazio = API do Google
+URL_GEMINI = os.getenv("ENSINA_FERIDAS_GEMINI_URL", "")
+
+
+def configurar_sdk(api_key: str) -> None:
+    """`genai.configure`, apontando para `URL_GEMINI` quando ela estiver definida."""
+    import google.generativeai as genai
+
+    if URL_GEMINI:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": URL_GEMINI})
+    else:
+        genai.configure(api_key=api_key)
+
+
+def criar_modelo(modelo: str, mode: str | None = None, esboco: bool = False):
+    """
+    `GenerativeModel` com a instrução fixa do modo em `system_instruction`
+    (com `esboco`, inclui o pedido da decisão de esboço no fim da resposta).
+    """
+    import google.generativeai as genai
+
+    if mode is None:
+        return genai.GenerativeModel(model_name=modelo)
+    return genai.GenerativeModel(model_name=modelo, system_instruction=instrucao_sistema(mode, esboco))
+
+
+# =========================
+# Cliente Gemini (texto completo, sem streaming)
+# =========================
+class ClienteGemini:
+    """
+    Chamada simples ao Gemini. O modo lote aceita qualquer objeto com o mesmo `gerar`.
+    Com `guarda` (`resiliencia.GuardaGemini`), passa pelo limitador, retry e disjuntor;
+    `essencial=False` marca chamadas que o disjuntor pode cortar primeiro.
+    `fabrica(modelo, modo)` devolve o `GenerativeModel` — o app passa a sua, com
+    `st.cache_resource`; sem ela, o cliente guarda as instâncias que cria.
+    Com `telemetria`, cada chamada registra latência e tokens ("gemini.gerar").
+    """
+
+    def __init__(self, guarda=None, essencial: bool = True, fabrica=None, telemetria=None):
+        self.guarda = guarda
+        self.essencial = essencial
+        self.telemetria = telemetria
+        self._fabrica = fabrica
+        self._modelos: dict = {}
+        self._lock = threading.Lock()
+
+    def modelo(self, modelo: str, modo: str | None = None):
+        if self._fabrica is not None:
+            return self._fabrica(modelo, modo)
+        with self._lock:
+            if (modelo, modo) not in self._modelos:
+                self._modelos[(modelo, modo)] = criar_modelo(modelo, modo)
+            return self._modelos[(modelo, modo)]
+
+    def gerar(self, prompt: str, modelo: str, temperatura: float, modo: str | None = None) -> str:
+        def chamar() -> str:
+            t0 = time.perf_counter()
+            resp = self.modelo(modelo, modo).generate_content(
+                prompt,
+                generation_config={"temperature": temperatura},
+            )
+            if self.telemetria is not None:
+                self.telemetria.registrar(
+                    "gemini.gerar", (time.perf_counter() - t0) * 1000, modelo=modelo, modo=modo, **uso_tokens(resp)
+                )
+            return getattr(resp, "text", None) or ""
+
+        if self.guarda is None:
+            return chamar()
+        return self.guarda.executar(chamar, tokens=estimar_tokens(prompt), essencial=self.essencial)
+
+
+# =========================
+# Decisão: precisa de esboço?
+# =========================
+MSG_FALHA_ESBOCO = "Falha ao decidir esboço."
+
+
+def decidir_esboco(pergunta: str, resposta: str, modelo_decisor: str, cliente=None) -> dict:
+    """
+    Usa o próprio Gemini para decidir se um esboço/figura ajuda, e propõe um prompt de imagem.
+    `cliente` é qualquer objeto com `gerar(prompt, modelo, temperatura, modo) -> str`
+    (padrão: `ClienteGemini`). Retorna dict com:
+      - need_sketch: bool
+      - reason: str
+      - sketch_prompt: str
+    """
+    try:
+        cliente = cliente or ClienteGemini()
+
+        decisor_prompt = f"""PERGUNTA:
+{pergunta}
+
+RESPOSTA (resumo):
+{resposta[:1200]}
+"""
+        raw = cliente.gerar(decisor_prompt, modelo_decisor, 0.1, modo=MODO_DECISOR).strip()
+
+        # tenta JSON direto; se vier “com sujeira”, extrai o primeiro {...}
+        try:
+            data = json.loads(raw)
+        except Exception:
+            m = re.search(r"\{.*\}", raw, flags=re.DOTALL)
+            data = json.loads(m.group(0)) if m else {"need_sketch": False, "reason": "Não consegui interpretar a decisão.", "sketch_prompt": ""}
+
+        return normalizar_decisao(data)
+    except Exception:
+        return {"need_sketch": False, "reason": MSG_FALHA_ESBOCO, "sketch_prompt": ""}
+
+
+def normalizar_decisao(data: dict) -> dict:
+    return {
+        "need_sketch": bool(data.get("need_sketch", False)),
+        "reason": str(data.get("reason", "")).strip(),
+        "sketch_prompt": str(data.get("sketch_prompt", "")).strip(),
+    }
+
+
+# =========================
+# Decisão de esboço embutida na resposta
+# =========================
+def separar_esboco(texto: str) -> tuple[str, dict | None]:
+    """
+    Separa a resposta do bloco JSON pedido por `INSTRUCAO_ESBOCO_EMBUTIDO`.
+    Retorna (resposta, decisão) — decisão None se o marcador não veio ou o
+    JSON não é válido (o app cai na chamada separada de `decidir_esboco`).
+    """
+    resposta, achou, bloco = texto.partition(MARCADOR_ESBOCO)
+    if not achou:
+        return texto.rstrip(), None
+    m = re.search(r"\{.*\}", bloco, flags=re.DOTALL)
+    try:
+        data = json.loads(m.group(0)) if m else None
+    except ValueError:
+        data = None
+    return resposta.rstrip(), normalizar_decisao(data) if isinstance(data, dict) else None
+
+
+def filtrar_marcador(pedacos):
+    """
+    Repassa os pedaços do stream até o marcador do esboço; o bloco JSON não é
+    exibido. Segura só o fim de cada pedaço que ainda pode ser o começo do
+    marcador (e os espaços antes dele). Consome o iterador até o fim (quem
+    acumula o texto recebe tudo).
+    """
+    cauda = ""
+    for pedaco in pedacos:
+        texto = cauda + pedaco
+        i = texto.find(MARCADOR_ESBOCO)
+        if i >= 0:
+            if texto[:i].rstrip():
+                yield texto[:i].rstrip()
+            for _ in pedacos:
+                pass
+            return
+        k = next((k for k in range(min(len(texto), len(MARCADOR_ESBOCO) - 1), 0, -1)
+                  if MARCADOR_ESBOCO.startswith(texto[-k:])), 0)
+        texto, cauda = (texto[:-k], texto[-k:]) if k else (texto, "")
+        sem_espacos = texto.rstrip()
+        texto, cauda = sem_espacos, texto[len(sem_espacos):] + cauda
+        if texto:
+            yield texto
+    if cauda:
+        yield cauda
+
+
+# =========================
+# Conversa (várias perguntas com contexto limitado)
+# =========================
+# Tokens de histórico (resumo + turnos recentes) enviados a cada pergunta
+ORCAMENTO_HISTORICO_TOKENS = 3000
+# Ao compactar, os turnos mantidos na íntegra ficam abaixo desta fração do orçamento
+# (folga para a conversa crescer alguns turnos antes do próximo resumo)
+FRACAO_TURNOS_RECENTES = 0.6
+
+
+class Conversa:
+    """
+    Histórico de uma conversa de tutoria com orçamento de tokens.
+
+    Os turnos recentes vão na íntegra; quando o histórico passa de
+    `orcamento_tokens`, os mais antigos são enrolados num resumo corrente
+    (pelo próprio Gemini, modo `MODO_RESUMIDOR`). Assim o prompt de cada
+    pergunta fica do mesmo tamanho, por mais longa que seja a conversa.
+    `turnos` guarda a conversa inteira (para o PDF); só o que está em
+    `recentes` + `resumo` vai para o modelo.
+    """
+
+    def __init__(self, orcamento_tokens: int = ORCAMENTO_HISTORICO_TOKENS):
+        self.id = uuid.uuid4().hex  # liga os turnos no histórico persistente
+        self.orcamento_tokens = orcamento_tokens
+        self.turnos: list[tuple[str, str]] = []
+        self.resumo = ""
+        self._inicio_recentes = 0  # turnos[_inicio_recentes:] ainda não entraram no resumo
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.turnos)
+
+    @property
+    def recentes(self) -> list[tuple[str, str]]:
+        return self.turnos[self._inicio_recentes:]
+
+    @staticmethod
+    def _tokens_turno(turno: tuple[str, str]) -> int:
+        return estimar_tokens(turno[0] + turno[1], saida=0)
+
+    def tokens_historico(self) -> int:
+        with self._lock:
+            return estimar_tokens(self.resumo, saida=0) + sum(map(self._tokens_turno, self.recentes))
+
+    def conteudos(self, prompt: str, modo: str) -> list[dict] | str:
+        """`contents` do `generate_content`: resumo, turnos recentes e a pergunta nova (`prompt` já montado)."""
+        with self._lock:
+            if not self.resumo and not self.recentes:
+                return prompt
+            conteudos = []
+            if self.resumo:
+                conteudos += [
+                    {"role": "user", "parts": [f"RESUMO DA CONVERSA ATÉ AQUI:\n{self.resumo}"]},
+                    {"role": "model", "parts": ["Entendido. Vou continuar a partir desse contexto."]},
+                ]
+            for pergunta, resposta in self.recentes:
+                conteudos += [
+                    {"role": "user", "parts": [build_prompt(pergunta, modo)]},
+                    {"role": "model", "parts": [resposta]},
+                ]
+            conteudos.append({"role": "user", "parts": [prompt]})
+            return conteudos
+
+    def adicionar(self, pergunta: str, resposta: str) -> None:
+        with self._lock:
+            self.turnos.append((pergunta, resposta))
+
+    def precisa_compactar(self) -> bool:
+        return self.tokens_historico() > self.orcamento_tokens
+
+    def compactar(self, modelo: str, cliente=None) -> bool:
+        """
+        Enrola os turnos mais antigos no resumo até o histórico caber no orçamento.
+        Se o Gemini falhar, o resumo vira uma lista curta das perguntas (o limite vale mesmo assim).
+        Retorna True se resumiu pelo Gemini.
+        """
+        with self._lock:
+            recentes = self.recentes
+            limite_recentes = self.orcamento_tokens * FRACAO_TURNOS_RECENTES
+            total = sum(map(self._tokens_turno, recentes))
+            n = 0
+            while n < len(recentes) and total > limite_recentes:
+                total -= self._tokens_turno(recentes[n])
+                n += 1
+            if not n:
+                return False
+            resumo_atual, antigos = self.resumo, recentes[:n]
+
+        max_chars = int(self.orcamento_tokens * (1 - FRACAO_TURNOS_RECENTES)) * 4
+        texto_turnos = "\n\n".join(f"ALUNO: {p}\nTUTOR: {r[:4000]}" for p, r in antigos)
+        prompt = f"""RESUMO ATUAL:
+{resumo_atual or "(vazio)"}
+
+TURNOS A INCORPORAR:
+{texto_turnos}
+
+Devolva o resumo atualizado com no máximo {max_chars // 6} palavras.
+"""
+        try:
+            novo = (cliente or ClienteGemini()).gerar(prompt, modelo, 0.2, modo=MODO_RESUMIDOR).strip()
+            pelo_gemini = bool(novo)
+        except Exception:
+            novo, pelo_gemini = "", False
+        if not novo:
+            perguntas = "\n".join(f"- O aluno perguntou: {p[:200]}" for p, _ in antigos)
+            novo = f"{resumo_atual}\n{perguntas}".strip()
+        if len(novo) > max_chars:
+            novo = "…" + novo[-max_chars:]  # o mais recente importa mais
+
+        with self._lock:
+            self.resumo = novo
+            self._inicio_recentes += n
+        return pelo_gemini
@@ -0,0 +1,128 @@
+"""
+Painel admin (oculto): latências por etapa, tokens e estado do Gemini.
+
+Aberto pelo app com `?admin=<ENSINA_FERIDAS_ADMIN_TOKEN>`; não aparece para
+quem não tem o token.
+"""
+import json
+
+import streamlit as st
+
+import painel_historico
+from classificador_esboco import concordancia
+
+JANELAS = {
+    "Últimos 15 min": 15 * 60,
+    "Última hora": 60 * 60,
+    "Últimas 24 h": 24 * 60 * 60,
+    "Tudo (janela em memória)": None,
+}
+
+
+def mostrar(telemetria, guarda, decisoes: list[dict] | None = None, base=None, voos=None, fotos=None,
+            historico=None) -> None:
+    st.title("Ensina Feridas — painel admin")
+
+    janela = st.selectbox("Período", list(JANELAS), index=1)
+    if st.button("Atualizar"):
+        st.rerun()
+
+    st.subheader("Latência por etapa (ms)")
+    linhas = telemetria.percentis(JANELAS[janela])
+    if linhas:
+        st.dataframe(linhas, use_container_width=True, hide_index=True)
+    else:
+        st.caption("Nenhum registro no período.")
+
+    st.subheader("Tokens (acumulado)")
+    tokens = telemetria.tokens()
+    if tokens:
+        st.dataframe(tokens, use_container_width=True, hide_index=True)
+    else:
+        st.caption("O Gemini ainda não informou uso de tokens.")
+
+    st.subheader("Pré-classificador de esboço")
+    # só as decisões que o pré-classificador tomou de fato (sem a decisão embutida na resposta)
+    classes = telemetria.contagem("esboco.pre", "classe", JANELAS[janela])
+    total = sum(classes.values())
+    pulos = classes.get("nao", 0)  # no "sim" o Gemini ainda escreve o prompt do esboço
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Decisões no período", total)
+    col2.metric("Taxa de pulos (sem chamada ao Gemini)", f"{pulos / total:.0%}" if total else "—")
+    aval = concordancia(decisoes or [])
+    col3.metric("Concordância com o Gemini", f"{aval['concordancia']:.1%}" if aval["concordancia"] is not None else "—",
+                help="Dos \"não\" locais, quantos o Gemini também disse não (embutida ou auditoria).")
+    st.caption(f"Por classe: {classes or '—'} • decisões do Gemini registradas: {aval['n']} "
+               f"({aval['positivos']} com esboço). Retreine com `python classificador_esboco.py treinar`.")
+
+    st.subheader("Plano B (hedge)")
+    disparos = telemetria.contagem("gemini.hedge", "disparou", JANELAS[janela])
+    vencedores = telemetria.contagem("gemini.hedge", "vencedor", JANELAS[janela])
+    total, n_disparos = sum(disparos.values()), disparos.get(True, 0)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Chamadas com plano B ligado", total)
+    col2.metric("Taxa de hedge", f"{n_disparos / total:.0%}" if total else "—",
+                help="Chamadas em que o modelo escolhido passou do atraso e o reserva também foi chamado.")
+    col3.metric("Vitórias do reserva", f"{vencedores.get('reserva', 0) / n_disparos:.0%}" if n_disparos else "—",
+                help="Entre os hedges, quantas vezes o modelo reserva respondeu primeiro.")
+
+    if voos is not None:
+        st.subheader("Pedidos idênticos simultâneos (singleflight)")
+        coalescidos = telemetria.contagem("gemini.coalescido", "tipo", JANELAS[janela])
+        estado = voos.estado()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Chamadas economizadas no período", sum(coalescidos.values()),
+                    help="Sessões que esperaram a chamada de outra com a mesma pergunta, em vez de chamar o Gemini.")
+        col2.metric("Economizadas desde o início", estado["economizadas"])
+        col3.metric("Em andamento agora", estado["em_andamento"])
+        st.caption(f"Por tipo: {coalescidos or '—'} • chamadas líderes desde o início: {estado['lideres']}")
+
+    if base is not None:
+        st.subheader("Base de conhecimento")
+        estado = base.estado()
+        fontes = telemetria.contagem("rag.buscar", "fonte", JANELAS[janela])
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Documentos / trechos", f"{estado['documentos']} / {estado['trechos']}")
+        col2.metric("Buscas no período", sum(fontes.values()))
+        col3.metric("Só por palavras (BM25)", f"{fontes.get('bm25', 0) / sum(fontes.values()):.0%}" if fontes else "—",
+                    help="Buscas em que o embedding da pergunta não saiu dentro do orçamento de latência.")
+        st.caption(f"Versão {estado['versao'] or '—'} • por fonte: {fontes or '—'}"
+                   + f" • embeddings pulados (workers ocupados): {estado['embeddings_pulados']}"
+                   + (" • indexando agora" if estado["indexando"] else "")
+                   + (f" • erro: {estado['erro']}" if estado["erro"] else ""))
+
+    if fotos is not None:
+        st.subheader("Fotos da ferida")
+        estado = fotos.estado()
+        original = telemetria.soma("fotos.processar", "bytes_original", JANELAS[janela])
+        enviado = telemetria.soma("fotos.processar", "bytes_enviados", JANELAS[janela])
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Perguntas com foto no período",
+                    sum(telemetria.contagem("fotos.processar", "fotos", JANELAS[janela]).values()))
+        col2.metric("Bytes enviados / recebidos", f"{enviado / original:.0%}" if original else "—",
+                    help="Tamanho das fotos que foram ao Gemini em relação aos arquivos enviados pelos usuários.")
+        col3.metric("Cache (hits / total)", f"{estado['hits']} / {estado['hits'] + estado['misses']}")
+        st.caption(f"Maior lado {estado['lado_max']} px, {estado['formato']} • {estado['fotos_em_cache']} fotos "
+                   f"({estado['mib_em_cache']} MiB) em memória")
+
+    if historico is not None:
+        st.subheader("Histórico de perguntas (todas as sessões)")
+        estado = historico.estatisticas()
+        st.caption(f"{estado['trocas']} trocas de {estado['sessoes']} sessões • "
+                   f"{estado['bytes'] / 2**20:.1f} MiB em `{historico.caminho}`")
+        st.fragment(painel_historico.mostrar)(historico, None, "admin_historico")
+
+    st.subheader("Limitador e disjuntor")
+    st.json(guarda.estado())
+
+    st.subheader("Exposição Prometheus")
+    texto = telemetria.prometheus()
+    st.caption(f"Também gravada em `{telemetria.pasta / 'metrics.prom'}` para o textfile collector.")
+    st.code(texto, language="text")
+    st.download_button("Baixar metrics.prom", data=texto, file_name="metrics.prom", mime="text/plain")
+    st.download_button(
+        "Baixar resumo (JSON)",
+        data=json.dumps({"latencias": linhas, "tokens": tokens, "gemini": guarda.estado()}, ensure_ascii=False, indent=2),
+        file_name="telemetria.json",
+        mime="application/json",
+    )
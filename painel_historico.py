@@ -0,0 +1,78 @@
+"""
+Painel de histórico: perguntas anteriores com busca, páginas por cursor e PDF.
+
+Usado pelo app (só a sessão do usuário) e pelo painel admin (todas as
+sessões). O PDF de uma troca antiga sai do texto guardado no histórico, sem
+chamar o Gemini.
+"""
+import time
+from functools import partial
+
+import streamlit as st
+
+from historico_perguntas import POR_PAGINA
+
+ORIGENS = {
+    "cache": "⚡ cache",
+    "semantico": "🧠 semântico",
+    "coalescido": "🔗 compartilhada",
+    "gemini": "🌐 Gemini",
+}
+
+
+def pdf_da_troca(historico, id_troca: int) -> bytes:
+    """PDF A4 de uma troca guardada (com os turnos anteriores da mesma conversa)."""
+    from exportar_pdf import gerar_pdf_a4
+
+    r = historico.obter(id_troca)
+    return gerar_pdf_a4(r["pergunta"], r["resposta"], historico.turnos_anteriores(id_troca))
+
+
+def mostrar(historico, sessao: str | None = None, chave: str = "historico") -> None:
+    """Uma página do histórico; `sessao=None` mostra todas as sessões (painel admin)."""
+    busca = st.text_input("Buscar nas perguntas e respostas", key=f"{chave}_busca",
+                          placeholder="palavras inteiras, ex.: hidrogel calcâneo")
+    # pilha de cursores: o topo é o `antes_de` da página atual; voltar é desempilhar
+    if st.session_state.get(f"{chave}_busca_anterior") != busca:
+        st.session_state[f"{chave}_busca_anterior"] = busca
+        st.session_state[f"{chave}_cursores"] = [None]
+    cursores = st.session_state.setdefault(f"{chave}_cursores", [None])
+
+    linhas, proximo = historico.pagina(sessao=sessao, busca=busca, antes_de=cursores[-1], limite=POR_PAGINA)
+    if not linhas:
+        st.caption("Nada encontrado." if busca else "Nenhuma pergunta registrada ainda.")
+
+    for r in linhas:
+        with st.container(border=True):
+            quando = time.strftime("%d/%m/%Y %H:%M", time.localtime(r["criado"]))
+            detalhes = [quando, r["modo"], r["modelo"], ORIGENS.get(r["origem"], r["origem"])]
+            if r["duracao_ms"] is not None:
+                ms = r["duracao_ms"]
+                detalhes.append(f"{ms / 1000:.1f} s" if ms >= 1000 else f"{ms:.0f} ms")
+            if r["fotos"]:
+                detalhes.append(f"📷 {r['fotos']}")
+            if r["esboco"] and r["esboco"].get("need_sketch"):
+                detalhes.append("✍️ esboço")
+            if sessao is None:
+                detalhes.append(f"sessão {r['sessao'][:8]}")
+            st.caption(" • ".join(d for d in detalhes if d))
+            st.markdown(f"**{r['pergunta'][:300]}**")
+            st.markdown(r["trecho"])
+            st.download_button(
+                "📥 PDF",
+                # só lê o registro e monta o PDF quando o usuário clica
+                data=partial(pdf_da_troca, historico, r["id"]),
+                file_name=f"ensina_feridas_{r['id']}.pdf",
+                mime="application/pdf",
+                key=f"{chave}_pdf_{r['id']}",
+                on_click="ignore",
+            )
+
+    col_rec, col_ant = st.columns(2)
+    with col_rec:
+        if len(cursores) > 1:
+            st.button("← Mais recentes", key=f"{chave}_recentes", on_click=cursores.pop, use_container_width=True)
+    with col_ant:
+        if proximo is not None:
+            st.button("Mais antigas →", key=f"{chave}_antigas", on_click=partial(cursores.append, proximo),
+                      use_container_width=True)
@@ -0,0 +1,111 @@
+"""
+Assets estáticos (banner e ícones) carregados uma única vez por processo.
+
+Tudo passa por `st.cache_resource` com o mtime do arquivo como parte da
+chave: reruns e exportações de PDF reaproveitam as versões já lidas,
+reduzidas e decodificadas; se o arquivo mudar no disco, a próxima chamada
+carrega a versão nova.
+"""
+import base64
+import io
+from pathlib import Path
+
+import streamlit as st
+from PIL import Image
+
+DIR_ASSETS = Path(__file__).parent / "assets"
+BANNER = DIR_ASSETS / "banner.pdf.a4.png"
+ICONES = {
+    "instagram": DIR_ASSETS / "instagram.png",
+    "enfermagem": DIR_ASSETS / "logo.enfermagem.png",
+}
+
+LARGURA_BANNER_WEB = 1200  # px — coluna "centered" (~730 px) em tela retina
+LADO_ICONE = 48  # px — ícones são exibidos com 24 px
+DPI_BANNER_PDF = 200
+
+# Caixa do banner no PDF (mesmas medidas de `gerar_pdf_a4`), em cm
+LARGURA_UTIL_PDF_CM = 21.0 - 2 * 2.0
+MAX_ALTURA_BANNER_PDF_CM = 3.2
+
+
+def _mtime(caminho: Path) -> int:
+    try:
+        return caminho.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def versao_banner() -> int:
+    """Identifica a versão atual do banner (muda quando o arquivo muda)."""
+    return _mtime(BANNER)
+
+
+# =========================
+# UI
+# =========================
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _banner_web(caminho: str, mtime: int) -> bytes | None:
+    if not mtime:
+        return None
+    with Image.open(caminho) as img:
+        img = img.convert("RGB")
+        if img.width > LARGURA_BANNER_WEB:
+            img = img.resize(
+                (LARGURA_BANNER_WEB, round(img.height * LARGURA_BANNER_WEB / img.width)),
+                Image.LANCZOS,
+            )
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=88, optimize=True)
+    return out.getvalue()
+
+
+def banner_web() -> bytes | None:
+    """Banner da página já reduzido e comprimido (ou None se o arquivo não existe)."""
+    return _banner_web(str(BANNER), versao_banner())
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _icone_b64(caminho: str, mtime: int) -> str:
+    if not mtime:
+        return ""
+    with Image.open(caminho) as img:
+        img = img.convert("RGBA")
+        img.thumbnail((LADO_ICONE, LADO_ICONE), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+    return base64.b64encode(out.getvalue()).decode()
+
+
+def icone_b64(nome: str) -> str:
+    """Ícone em base64 (PNG) para `<img src="data:...">`; string vazia se faltar o arquivo."""
+    caminho = ICONES[nome]
+    return _icone_b64(str(caminho), _mtime(caminho))
+
+
+# =========================
+# PDF
+# =========================
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _banner_pdf(caminho: str, mtime: int):
+    if not mtime:
+        return None
+    from reportlab.lib.utils import ImageReader
+
+    with Image.open(caminho) as img:
+        img = img.convert("RGB")
+        # tamanho em que o banner é desenhado no PDF → pixels no DPI alvo
+        larg_cm = min(LARGURA_UTIL_PDF_CM, MAX_ALTURA_BANNER_PDF_CM * img.width / img.height)
+        larg_px = round(larg_cm / 2.54 * DPI_BANNER_PDF)
+        if img.width > larg_px:
+            img = img.resize((larg_px, round(img.height * larg_px / img.width)), Image.LANCZOS)
+        else:
+            img.load()
+    reader = ImageReader(img)
+    reader.getRGBData()  # decodifica agora; os PDFs só reaproveitam
+    return reader
+
+
+def banner_pdf():
+    """`ImageReader` do banner já reduzido para o PDF (ou None se o arquivo não existe)."""
+    return _banner_pdf(str(BANNER), versao_banner())
@@ -0,0 +1,249 @@
+"""
+Relatório PDF com várias perguntas/respostas (sessão ou lote) e sumário.
+
+Montado no mesmo canvas de `gerar_pdf_a4` (`NumberedCanvas`) e com o mesmo
+layout de texto (`Diagramador`):
+
+- cada seção (pergunta + resposta) começa numa página nova e vira um
+  marcador (outline) do PDF. Por isso o conteúdo dela não depende da posição
+  no relatório: os operadores de cada página são gerados uma vez e guardados
+  num cache por hash do conteúdo, e exportar de novo a sessão com uma
+  resposta a mais só diagrama a nova;
+- banner e rodapé são form XObjects definidos uma vez e desenhados por
+  referência em todas as páginas (a imagem entra uma única vez no arquivo);
+- o sumário vem primeiro, com links para as seções; o número da página de
+  cada seção só é conhecido depois, então cada um é um form definido no fim.
+"""
+import hashlib
+import io
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import BinaryIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+
+import recursos
+from exportar_pdf import (
+    ENTRELINHA,
+    FONTE,
+    FONTE_NEGRITO,
+    FOOTER_TEXT,
+    LARGURA_UTIL,
+    MARGEM,
+    Diagramador,
+    NumberedCanvas,
+    largura_palavra,
+    sem_ascii85,
+)
+
+TITULO_PADRAO = "Ensina Feridas — relatório"
+VERSAO_LAYOUT = "2"  # muda a chave do cache de seções quando o desenho mudar
+
+LARGURA, ALTURA = A4
+ALTURA_CABECALHO = 2.0 * cm
+TOPO = ALTURA - MARGEM - ALTURA_CABECALHO - 0.6 * cm
+ESPACO_TITULO_SECAO = 0.9 * cm
+
+FORM_CABECALHO = "ensina_cabecalho"
+TAMANHO_SUMARIO = 10
+LINHA_SUMARIO = TAMANHO_SUMARIO * ENTRELINHA + 2
+
+
+def _truncar(texto: str, largura_max: float, fonte: str, tamanho: float) -> str:
+    texto = " ".join((texto or "").split())
+    if largura_palavra(texto, fonte, tamanho) <= largura_max:
+        return texto
+    while texto and largura_palavra(texto + "…", fonte, tamanho) > largura_max:
+        texto = texto[:-1]
+    return texto.rstrip() + "…"
+
+
+def titulo_secao(pergunta: str) -> str:
+    """Primeira linha não vazia da pergunta (título no sumário e nos marcadores)."""
+    for linha in (pergunta or "").splitlines():
+        if linha.strip():
+            return " ".join(linha.split())
+    return "(sem pergunta)"
+
+
+def _registrar_fontes(c: canvas.Canvas) -> None:
+    """Fixa os nomes internos das fontes (/F1, /F2) na mesma ordem em todo canvas: os operadores em cache os citam."""
+    for fonte in (FONTE, FONTE_NEGRITO):
+        c._doc.getInternalFontName(fonte)
+
+
+# =========================
+# Cache de seções (operadores das páginas já diagramadas)
+# =========================
+class _Coletor(canvas.Canvas):
+    """Canvas de rascunho: cada `showPage` só guarda os operadores da página; nunca é salvo."""
+
+    def __init__(self):
+        super().__init__(io.BytesIO(), pagesize=A4)
+        _registrar_fontes(self)
+        self.paginas: list[str] = []
+
+    def showPage(self):
+        self.paginas.append("\n".join(self._code))
+        self._code = []
+
+
+def diagramar_secao(pergunta: str, resposta: str) -> tuple[str, ...]:
+    """Operadores de cada página da seção (sem cabeçalho, rodapé e título numerado)."""
+    c = _Coletor()
+    d = Diagramador(c, topo=TOPO)
+    d.espaco(ESPACO_TITULO_SECAO)
+    d.pergunta_resposta(pergunta, resposta)
+    c.showPage()
+    return tuple(c.paginas)
+
+
+class CacheSecoes:
+    """LRU por hash de (pergunta, resposta): guarda só os operadores das páginas de cada seção."""
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._itens: OrderedDict[bytes, tuple[str, ...]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(pergunta: str, resposta: str) -> bytes:
+        h = hashlib.sha256(VERSAO_LAYOUT.encode())
+        for parte in (pergunta, resposta):
+            dados = (parte or "").encode("utf-8")
+            h.update(len(dados).to_bytes(8, "big"))
+            h.update(dados)
+        return h.digest()
+
+    def paginas(self, pergunta: str, resposta: str) -> tuple[str, ...]:
+        chave = self.chave(pergunta, resposta)
+        with self._lock:
+            paginas = self._itens.get(chave)
+            if paginas is not None:
+                self._itens.move_to_end(chave)
+                self.hits += 1
+                return paginas
+            self.misses += 1
+        paginas = diagramar_secao(pergunta, resposta)
+        with self._lock:
+            if chave not in self._itens:
+                self._itens[chave] = paginas
+                self._bytes += sum(map(len, paginas))
+                while self._bytes > self.max_bytes and len(self._itens) > 1:
+                    _, velhas = self._itens.popitem(last=False)
+                    self._bytes -= sum(map(len, velhas))
+        return paginas
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {"secoes": len(self._itens), "kib": round(self._bytes / 1024, 1),
+                    "hits": self.hits, "misses": self.misses}
+
+
+cache_secoes = CacheSecoes()
+
+
+# =========================
+# Cabeçalho (form desenhado em todas as páginas)
+# =========================
+def _definir_cabecalho(c: NumberedCanvas) -> None:
+    """Banner reduzido à altura do cabeçalho; sem banner, o título padrão."""
+    c.beginForm(FORM_CABECALHO)
+    img = recursos.banner_pdf()  # já reduzido e decodificado (cache do processo)
+    if img is None:
+        c.setFont(FONTE_NEGRITO, 12)
+        c.drawString(MARGEM, ALTURA - MARGEM - 0.5 * cm, TITULO_PADRAO)
+    else:
+        iw, ih = img.getSize()
+        w = min(LARGURA_UTIL, iw * ALTURA_CABECALHO / ih)
+        h = ih * w / iw
+        c.drawImage(img, MARGEM + (LARGURA_UTIL - w) / 2, ALTURA - MARGEM - h, width=w, height=h, mask="auto")
+    c.endForm()
+
+
+# =========================
+# Montagem
+# =========================
+def escrever_relatorio(entradas: Sequence[tuple[str, str]], destino: str | BinaryIO,
+                       titulo: str = TITULO_PADRAO, cache: CacheSecoes | None = None) -> int:
+    """
+    Escreve em `destino` (caminho ou arquivo binário) o relatório com as
+    `entradas` (pares pergunta/resposta) na ordem dada. Retorna o número de
+    páginas.
+    """
+    cache = cache or cache_secoes
+    secoes = [cache.paginas(p, r) for p, r in entradas]
+    with sem_ascii85():
+        c = NumberedCanvas(destino, pagesize=A4, footer_text=FOOTER_TEXT)
+        _registrar_fontes(c)
+        c.setTitle(titulo)
+        c.setProducer("Ensina Feridas")
+        _definir_cabecalho(c)
+        d = Diagramador(c, topo=TOPO, ao_abrir_pagina=lambda: c.doForm(FORM_CABECALHO))
+        c.doForm(FORM_CABECALHO)
+
+        # --- sumário: o número da página de cada seção é um form preenchido no fim ---
+        c.setFont(FONTE_NEGRITO, 16)
+        c.drawString(MARGEM, d.y, titulo)
+        plural = "s" if len(entradas) != 1 else ""
+        c.setFont(FONTE, TAMANHO_SUMARIO)
+        c.drawString(MARGEM, d.y - 0.7 * cm,
+                     f"{len(entradas)} pergunta{plural} • gerado em {time.strftime('%d/%m/%Y %H:%M')}")
+        c.setFont(FONTE_NEGRITO, 12)
+        c.drawString(MARGEM, d.y - 1.6 * cm, "Sumário")
+        d.espaco(2.2 * cm)
+
+        titulos = [f"{n}. {titulo_secao(p)}" for n, (p, _) in enumerate(entradas, start=1)]
+        largura_rotulo = LARGURA_UTIL - largura_palavra("9999", FONTE, TAMANHO_SUMARIO) - 0.5 * cm
+        for n, texto in enumerate(titulos, start=1):
+            if d.y < d.limite:
+                d.nova_pagina()
+            c.setFont(FONTE, TAMANHO_SUMARIO)
+            c.drawString(MARGEM, d.y, _truncar(texto, largura_rotulo, FONTE, TAMANHO_SUMARIO))
+            c.saveState()
+            c.translate(LARGURA - MARGEM, d.y)
+            c.doForm(f"ensina_pagina_secao{n}")
+            c.restoreState()
+            c.linkRect("", f"secao{n}", (MARGEM, d.y - 3, LARGURA - MARGEM, d.y + TAMANHO_SUMARIO))
+            d.espaco(LINHA_SUMARIO)
+
+        # --- seções, cada uma numa página nova: os operadores vêm prontos do cache ---
+        paginas_secoes = []
+        for n, (paginas, texto) in enumerate(zip(secoes, titulos), start=1):
+            d.nova_pagina()
+            paginas_secoes.append(c.getPageNumber())
+            c.bookmarkPage(f"secao{n}")
+            c.addOutlineEntry(texto[:120], f"secao{n}", level=0)
+            c.setFont(FONTE_NEGRITO, 13)
+            c.drawString(MARGEM, d.y, _truncar(texto, LARGURA_UTIL, FONTE_NEGRITO, 13))
+            for k, operadores in enumerate(paginas):
+                if k:
+                    d.nova_pagina()
+                c._code.append(operadores)
+
+        for n, pagina in enumerate(paginas_secoes, start=1):
+            c.beginForm(f"ensina_pagina_secao{n}")
+            c.setFont(FONTE, TAMANHO_SUMARIO)
+            c.drawRightString(0, 0, str(pagina))
+            c.endForm()
+        if paginas_secoes:
+            c.showOutline()
+        total = c.getPageNumber()
+        c.save()
+    return total
+
+
+def gerar_relatorio_pdf(entradas: Sequence[tuple[str, str]], titulo: str = TITULO_PADRAO) -> bytes:
+    """Relatório em bytes (download do app): escrito num arquivo temporário e lido só no fim."""
+    with tempfile.TemporaryFile() as f:
+        escrever_relatorio(entradas, f, titulo)
+        f.seek(0)
+        return f.read()
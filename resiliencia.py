@@ -0,0 +1,465 @@
+"""
+Proteção das chamadas ao Gemini, compartilhada por todas as sessões do processo:
+
+- limitador de taxa (token bucket) por requisições/min e tokens/min;
+- retry com backoff exponencial e jitter para erros transitórios (429/5xx);
+- disjuntor (circuit breaker) que degrada em etapas: primeiro deixa de
+  fazer chamadas não essenciais (decisão de esboço); se as falhas
+  continuarem, abre e recusa tudo por um tempo antes de testar de novo;
+- hedge: se o modelo escolhido demora a começar a responder, a mesma
+  chamada vai também para um modelo reserva mais rápido (vence o primeiro);
+- singleflight: pedidos idênticos ao mesmo tempo (ex.: uma turma enviando o
+  caso projetado pelo professor) esperam uma chamada só e repartem o stream.
+
+`GuardaGemini.estado()` devolve um dict com o estado atual para monitoramento.
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, wait
+
+
+class LimiteExcedido(Exception):
+    """O limitador não liberou a chamada dentro do tempo de espera."""
+
+
+class CircuitoAberto(Exception):
+    """O disjuntor está recusando chamadas (ou só as não essenciais)."""
+
+
+# =========================
+# Limitador (token bucket)
+# =========================
+class TokenBucket:
+    def __init__(self, por_minuto: float):
+        self.capacidade = float(por_minuto)
+        self.taxa_s = float(por_minuto) / 60.0
+        self._saldo = float(por_minuto)
+        self._t = time.monotonic()
+
+    def _repor(self, agora: float) -> None:
+        self._saldo = min(self.capacidade, self._saldo + (agora - self._t) * self.taxa_s)
+        self._t = agora
+
+    def espera_para(self, n: float, agora: float) -> float:
+        """Segundos até haver `n` unidades (0 se já há). Pedidos maiores que a capacidade esperam encher."""
+        self._repor(agora)
+        n = min(n, self.capacidade)
+        return 0.0 if self._saldo >= n else (n - self._saldo) / self.taxa_s
+
+    def consumir(self, n: float) -> None:
+        self._saldo -= min(n, self.capacidade)
+
+
+class Limitador:
+    """Requisições/min + tokens/min; `adquirir` bloqueia até liberar ou até `timeout_s`."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.esperas = 0
+        self.recusas = 0
+        self._lock = threading.Lock()
+
+    def adquirir(self, tokens: int, timeout_s: float = 30.0) -> None:
+        limite = time.monotonic() + timeout_s
+        esperou = False
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                espera = max(self.rpm.espera_para(1, agora), self.tpm.espera_para(tokens, agora))
+                if espera <= 0:
+                    self.rpm.consumir(1)
+                    self.tpm.consumir(tokens)
+                    self.esperas += esperou
+                    return
+                if agora + espera > limite:
+                    self.recusas += 1
+                    raise LimiteExcedido(f"limite de taxa do Gemini: liberaria em {espera:.1f} s")
+            esperou = True
+            time.sleep(min(espera, 1.0))
+
+    def estado(self) -> dict:
+        with self._lock:
+            agora = time.monotonic()
+            self.rpm._repor(agora)
+            self.tpm._repor(agora)
+            return {
+                "rpm_limite": self.rpm.capacidade,
+                "rpm_disponivel": round(self.rpm._saldo, 2),
+                "tpm_limite": self.tpm.capacidade,
+                "tpm_disponivel": round(self.tpm._saldo),
+                "esperas": self.esperas,
+                "recusas": self.recusas,
+            }
+
+
+# =========================
+# Disjuntor
+# =========================
+class Disjuntor:
+    FECHADO = "fechado"
+    DEGRADADO = "degradado"  # só chamadas essenciais
+    ABERTO = "aberto"
+    MEIO_ABERTO = "meio-aberto"  # uma chamada de teste
+
+    def __init__(self, falhas_para_degradar: int = 2, falhas_para_abrir: int = 5, abertura_s: float = 30.0):
+        self.falhas_para_degradar = falhas_para_degradar
+        self.falhas_para_abrir = falhas_para_abrir
+        self.abertura_s = abertura_s
+        self.falhas_seguidas = 0
+        self.aberturas = 0
+        self.recusadas = 0
+        self._aberto_ate = 0.0
+        self._teste_em_curso = False
+        self._lock = threading.Lock()
+
+    def _estado(self, agora: float) -> str:
+        if self.falhas_seguidas >= self.falhas_para_abrir:
+            return self.ABERTO if agora < self._aberto_ate else self.MEIO_ABERTO
+        if self.falhas_seguidas >= self.falhas_para_degradar:
+            return self.DEGRADADO
+        return self.FECHADO
+
+    def permitir(self, essencial: bool = True) -> bool:
+        """
+        Levanta `CircuitoAberto` se a chamada não deve sair agora. Retorna True
+        quando ela é a chamada de teste do meio-aberto: quem a recebeu registra
+        `sucesso()`/`falha()` ou, se a chamada nem voltou, `liberar_teste()`.
+        """
+        with self._lock:
+            estado = self._estado(time.monotonic())
+            if estado == self.FECHADO:
+                return False
+            if essencial and estado == self.DEGRADADO:
+                return False
+            if essencial and estado == self.MEIO_ABERTO and not self._teste_em_curso:
+                self._teste_em_curso = True
+                return True
+            self.recusadas += 1
+            espera = max(0.0, self._aberto_ate - time.monotonic())
+        raise CircuitoAberto(f"Gemini instável ({estado}); tente de novo em {espera:.0f} s")
+
+    def liberar_teste(self) -> None:
+        """A chamada de teste não saiu (ex.: recusada pelo limitador): a próxima pode testar."""
+        with self._lock:
+            self._teste_em_curso = False
+
+    def sucesso(self) -> None:
+        with self._lock:
+            self.falhas_seguidas = 0
+            self._teste_em_curso = False
+
+    def falha(self) -> None:
+        with self._lock:
+            self.falhas_seguidas += 1
+            self._teste_em_curso = False
+            if self.falhas_seguidas >= self.falhas_para_abrir:
+                self._aberto_ate = time.monotonic() + self.abertura_s
+                self.aberturas += 1
+
+    def estado(self) -> dict:
+        with self._lock:
+            agora = time.monotonic()
+            return {
+                "estado": self._estado(agora),
+                "falhas_seguidas": self.falhas_seguidas,
+                "aberturas": self.aberturas,
+                "recusadas": self.recusadas,
+                "reabre_em_s": round(max(0.0, self._aberto_ate - agora), 1),
+            }
+
+
+# =========================
+# Retry + tudo junto
+# =========================
+def erro_retentavel(e: Exception) -> bool:
+    """429 (quota), 500/503/504 e timeouts valem nova tentativa; o resto não."""
+    codigo = getattr(e, "code", None)
+    codigo = getattr(codigo, "value", codigo)  # grpc.StatusCode → (num, nome)
+    if isinstance(codigo, tuple):
+        codigo = codigo[0]
+    if codigo in (429, 500, 502, 503, 504):
+        return True
+    nome = type(e).__name__
+    return nome in ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                    "DeadlineExceeded", "GatewayTimeout", "TimeoutError", "ConnectionError")
+
+
+def estimar_tokens(texto: str, saida: int = 800) -> int:
+    """Estimativa grosseira para o limitador: ~4 caracteres por token + saída esperada."""
+    return len(texto or "") // 4 + saida
+
+
+class GuardaGemini:
+    """Limitador + retry + disjuntor em volta de qualquer chamada ao Gemini."""
+
+    def __init__(self, limitador: Limitador, disjuntor: Disjuntor, tentativas: int = 4,
+                 backoff_base_s: float = 1.0, backoff_max_s: float = 20.0):
+        self.limitador = limitador
+        self.disjuntor = disjuntor
+        self.tentativas = tentativas
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.retries = 0
+
+    def executar(self, fn, tokens: int = 1000, essencial: bool = True, timeout_fila_s: float = 30.0):
+        for tentativa in range(self.tentativas):
+            teste = self.disjuntor.permitir(essencial)
+            registrado = False
+            try:
+                self.limitador.adquirir(tokens, timeout_fila_s if essencial else min(timeout_fila_s, 5.0))
+                try:
+                    resultado = fn()
+                except Exception as e:
+                    registrado = True
+                    if not erro_retentavel(e):
+                        self.disjuntor.sucesso()  # o serviço respondeu; o erro é da chamada
+                        raise
+                    self.disjuntor.falha()
+                    if tentativa == self.tentativas - 1 or not essencial:
+                        raise
+                    self.retries += 1
+                    # backoff exponencial com "full jitter"
+                    time.sleep(random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** tentativa)))
+                    continue
+                registrado = True
+                self.disjuntor.sucesso()
+                return resultado
+            finally:
+                # limitador recusou ou `fn` saiu por BaseException: sem desfecho, o teste não pode ficar preso
+                if teste and not registrado:
+                    self.disjuntor.liberar_teste()
+
+    def estado(self) -> dict:
+        return {"limitador": self.limitador.estado(), "disjuntor": self.disjuntor.estado(), "retries": self.retries}
+
+
+# =========================
+# Hedge (modelo reserva contra a cauda de latência)
+# =========================
+def modelo_reserva(modelos: list[str], atual: str) -> str | None:
+    """Modelo mais rápido da lista para o hedge (flash-lite > flash), diferente de `atual`."""
+    # variantes de imagem/áudio não servem para a resposta em texto
+    candidatos = [m for m in modelos if m != atual and not any(x in m for x in ("image", "tts", "audio", "live"))]
+    for marca in ("flash-lite", "flash"):
+        achados = [m for m in candidatos if marca in m]
+        if achados:
+            return achados[0]
+    return None
+
+
+def hedge(executor, principal, reserva, atraso_s: float, descartar=None) -> tuple[str, object, bool]:
+    """
+    Roda `principal()`; se não terminar bem em `atraso_s` (demorou ou já
+    falhou, ex.: 429/503 rápido), roda também `reserva()`.
+
+    Retorna (vencedor, resultado, disparou), com vencedor "principal" ou
+    "reserva": o primeiro a terminar sem erro. Se os dois falham, sobe o erro
+    do principal. O perdedor não tem como ser interrompido no meio; quando
+    terminar, o resultado dele vai para `descartar` (ex.: fechar o stream).
+    """
+    fut_p = executor.submit(principal)
+    wait([fut_p], timeout=atraso_s)
+    if fut_p.done() and fut_p.exception() is None:
+        return "principal", fut_p.result(), False
+
+    def _descartar(fut) -> None:
+        if descartar is not None and not fut.cancelled() and fut.exception() is None:
+            descartar(fut.result())
+
+    fut_r = executor.submit(reserva)
+    nomes = {fut_p: "principal", fut_r: "reserva"}
+    pendentes = set(nomes)
+    while pendentes:
+        feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+        for fut in feitos:
+            if fut.exception() is None:
+                for perdedor in pendentes:
+                    perdedor.cancel()
+                    perdedor.add_done_callback(_descartar)
+                return nomes[fut], fut.result(), True
+    raise fut_p.exception()
+
+
+# =========================
+# Singleflight (pedidos idênticos em andamento viram uma chamada só)
+# =========================
+class Transmissao:
+    """
+    Um stream do Gemini repartido entre sessões: uma thread lê o original e
+    guarda os pedaços; cada `leitor()` itera desde o começo, no ritmo dele.
+    `meta` leva o que as outras sessões precisam saber (ex.: o modelo que respondeu).
+    """
+
+    def __init__(self):
+        self.resp = None
+        self.meta: dict = {}
+        self._pedacos: list = []
+        self._fim = False
+        self._erro: BaseException | None = None
+        self._cond = threading.Condition()
+        self._iniciada = threading.Event()
+
+    def iniciar(self, resp, **meta) -> None:
+        self.resp, self.meta = resp, meta
+        threading.Thread(target=self._bombear, name="ensina-transmissao", daemon=True).start()
+        self._iniciada.set()
+
+    def falhar(self, erro: BaseException) -> None:
+        """A chamada nem começou: quem está esperando recebe o mesmo erro."""
+        with self._cond:
+            self._erro, self._fim = erro, True
+            self._cond.notify_all()
+        self._iniciada.set()
+
+    def _bombear(self) -> None:
+        try:
+            for pedaco in self.resp:
+                with self._cond:
+                    self._pedacos.append(pedaco)
+                    self._cond.notify_all()
+        except BaseException as e:
+            with self._cond:
+                self._erro = e
+        finally:
+            with self._cond:
+                self._fim = True
+                self._cond.notify_all()
+
+    def aguardar(self, timeout: float | None = None) -> dict:
+        """Espera a chamada começar; devolve `meta` ou sobe o erro dela."""
+        if not self._iniciada.wait(timeout):
+            raise TimeoutError("a mesma pergunta em outra sessão não começou a tempo")
+        if self.resp is None:
+            raise self._erro
+        return self.meta
+
+    def _pedacos_desde_o_inicio(self):
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self._pedacos) and not self._fim:
+                    self._cond.wait()
+                if i >= len(self._pedacos):
+                    if self._erro is not None:
+                        raise self._erro
+                    return
+                pedaco = self._pedacos[i]
+            i += 1
+            yield pedaco
+
+    def leitor(self) -> "RespostaCompartilhada":
+        return RespostaCompartilhada(self)
+
+
+class RespostaCompartilhada:
+    """Itera como o stream do SDK; os demais atributos (candidates, usage_metadata...) vêm do original."""
+
+    def __init__(self, transmissao: Transmissao):
+        self._transmissao = transmissao
+
+    def __iter__(self):
+        return self._transmissao._pedacos_desde_o_inicio()
+
+    def __getattr__(self, nome: str):
+        return getattr(self._transmissao.resp, nome)
+
+
+class Singleflight:
+    """
+    Registro, por processo, das chamadas em andamento por chave. O primeiro
+    pedido de uma chave é o líder (faz a chamada); os seguintes recebem o
+    mesmo objeto e só esperam. `economizadas` conta as chamadas evitadas.
+    """
+
+    def __init__(self):
+        self.lideres = 0
+        self.economizadas = 0
+        self._voos: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def entrar(self, chave: str, criar) -> tuple[object, bool]:
+        """(voo, lider): o voo em andamento para `chave` ou um novo, de `criar()`."""
+        with self._lock:
+            voo = self._voos.get(chave)
+            if voo is not None:
+                self.economizadas += 1
+                return voo, False
+            voo = self._voos[chave] = criar()
+            self.lideres += 1
+            return voo, True
+
+    def sair(self, chave: str, voo) -> None:
+        """O líder terminou (e já gravou no cache): pedidos novos não entram mais neste voo."""
+        with self._lock:
+            if self._voos.get(chave) is voo:
+                del self._voos[chave]
+
+    def submeter(self, chave: str, executor, fn, *args) -> tuple[Future, bool]:
+        """
+        `executor.submit(fn, *args)` coalescido: pedidos iguais esperam a mesma
+        tarefa. Cada um recebe uma cópia do Future, que pode cancelar sem
+        derrubar a tarefa dos outros. Quando todos cancelam e a tarefa ainda
+        está na fila, ela é cancelada também e sai do registro.
+        """
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Tarefa(executor.submit(fn, *args))
+                self.lideres += 1
+            else:
+                self.economizadas += 1
+            voo.interessados += 1
+        if lider:
+            voo.fut.add_done_callback(lambda f: self.sair(chave, voo))
+        copia = _espelho(voo.fut)
+
+        def cancelou(c: Future) -> None:
+            if c.cancelled():
+                self._desistir(chave, voo)
+
+        copia.add_done_callback(cancelou)
+        return copia, lider
+
+    def _desistir(self, chave: str, voo: "_Tarefa") -> None:
+        """Uma cópia foi cancelada; sem ninguém esperando, a tarefa que não começou é cancelada."""
+        with self._lock:
+            voo.interessados -= 1
+            if voo.interessados > 0 or voo.fut.running() or voo.fut.done():
+                return  # já rodando: termina e grava no cache, quem chegar depois aproveita
+            if self._voos.get(chave) is voo:
+                del self._voos[chave]
+        # fora do lock: cancel() chama os callbacks (`sair`) na hora
+        voo.fut.cancel()
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {"em_andamento": len(self._voos), "lideres": self.lideres, "economizadas": self.economizadas}
+
+
+class _Tarefa:
+    """Future de uma tarefa coalescida e quantas cópias ainda esperam por ela."""
+
+    def __init__(self, fut: Future):
+        self.fut = fut
+        self.interessados = 0
+
+
+def _espelho(origem: Future) -> Future:
+    copia: Future = Future()
+
+    def copiar(f: Future) -> None:
+        try:
+            if f.cancelled():
+                copia.cancel()
+            elif f.exception() is not None:
+                copia.set_exception(f.exception())
+            else:
+                copia.set_result(f.result())
+        except InvalidStateError:
+            pass  # a cópia foi cancelada enquanto a tarefa terminava
+
+    origem.add_done_callback(copiar)
+    return copia
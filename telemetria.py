@@ -0,0 +1,206 @@
+"""
+Telemetria por etapa do caminho de uma pergunta (latência e tokens).
+
+Cada registro vira uma linha JSON num arquivo rotativo (`telemetria.jsonl`,
+`.1`, `.2`…) e fica também numa janela em memória usada pelo painel admin
+(p50/p95/p99 por etapa × modelo × modo) e pela exposição no formato texto
+do Prometheus, gravada em `metrics.prom` (para o textfile collector do
+node_exporter) no máximo a cada `intervalo_prom_s`. Os quantis saem da
+janela; `_sum`/`_count` vêm de totais que só crescem (a janela encolheria
+e o `rate()` veria um reset a cada volta).
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+QUANTIS = (50, 95, 99)
+
+
+class Telemetria:
+    def __init__(self, pasta: Path, max_bytes: int = 5 * 1024 * 1024, arquivos: int = 5,
+                 janela: int = 20000, intervalo_prom_s: float = 15.0):
+        self.pasta = Path(pasta)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self.arquivo = self.pasta / "telemetria.jsonl"
+        self.max_bytes = max_bytes
+        self.arquivos = arquivos
+        self.intervalo_prom_s = intervalo_prom_s
+        self._janela: deque = deque(maxlen=janela)
+        self._tokens: dict[tuple, int] = {}
+        self._totais: dict[tuple, list] = {}  # (etapa, modelo, modo) → [soma_ms, contagem], monotônicos
+        self._lock = threading.Lock()
+        self._ultimo_prom = 0.0
+        self._carregar_janela()
+
+    def _carregar_janela(self) -> None:
+        """Recupera os registros mais recentes do arquivo atual (sobrevive a reinícios)."""
+        if not self.arquivo.exists():
+            return
+        with self.arquivo.open(encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    self._acumular(json.loads(linha))
+                except (ValueError, KeyError):
+                    continue
+
+    def _acumular(self, r: dict) -> None:
+        self._janela.append(r)
+        total = self._totais.setdefault((r["etapa"], r.get("modelo", ""), r.get("modo", "")), [0.0, 0])
+        total[0] += r["duracao_ms"]
+        total[1] += 1
+        for tipo in ("tokens_prompt", "tokens_resposta"):
+            if r.get(tipo):
+                chave = (tipo, r.get("modelo", ""), r.get("modo", ""))
+                self._tokens[chave] = self._tokens.get(chave, 0) + int(r[tipo])
+
+    # ---- coleta ----
+    def registrar(self, etapa: str, duracao_ms: float, **campos) -> None:
+        r = {"ts": round(time.time(), 3), "etapa": etapa, "duracao_ms": round(duracao_ms, 3)}
+        r.update({k: v for k, v in campos.items() if v is not None})
+        texto = None
+        with self._lock:
+            self._acumular(r)
+            self._gravar(r)
+            if time.monotonic() - self._ultimo_prom >= self.intervalo_prom_s:
+                self._ultimo_prom = time.monotonic()
+                texto = self._prometheus()
+        if texto is not None:
+            # fora do lock: quem registra não espera pelo disco
+            self._gravar_prom(texto)
+
+    @contextmanager
+    def medir(self, etapa: str, **campos):
+        """`with tel.medir("etapa", modelo=...) as extra:` — campos em `extra` entram no registro."""
+        extra: dict = {}
+        t0 = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            self.registrar(etapa, (time.perf_counter() - t0) * 1000, **campos, **extra)
+
+    def _gravar(self, r: dict) -> None:
+        try:
+            if self.arquivo.exists() and self.arquivo.stat().st_size >= self.max_bytes:
+                nome = self.arquivo.name
+                for i in range(self.arquivos - 1, 0, -1):
+                    origem = self.arquivo if i == 1 else self.arquivo.with_name(f"{nome}.{i - 1}")
+                    if origem.exists():
+                        origem.replace(self.arquivo.with_name(f"{nome}.{i}"))
+            with self.arquivo.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        except OSError:
+            pass  # telemetria nunca derruba o caminho da pergunta
+
+    def _gravar_prom(self, texto: str) -> None:
+        """Arquivo temporário + `os.replace`: o collector nunca lê um `metrics.prom` pela metade."""
+        try:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.pasta, prefix=".metrics.",
+                                             suffix=".tmp", delete=False) as f:
+                f.write(texto)
+            os.replace(f.name, self.pasta / "metrics.prom")
+        except OSError:
+            pass
+
+    # ---- leitura ----
+    def percentis(self, desde_s: float | None = None) -> list[dict]:
+        """p50/p95/p99 por (etapa, modelo, modo) na janela em memória."""
+        limite = time.time() - desde_s if desde_s else 0.0
+        grupos: dict[tuple, list[float]] = {}
+        with self._lock:
+            for r in self._janela:
+                if r["ts"] >= limite:
+                    chave = (r["etapa"], r.get("modelo", ""), r.get("modo", ""))
+                    grupos.setdefault(chave, []).append(r["duracao_ms"])
+        linhas = []
+        for (etapa, modelo, modo), valores in sorted(grupos.items()):
+            q = np.percentile(np.asarray(valores), QUANTIS)
+            linhas.append({"etapa": etapa, "modelo": modelo, "modo": modo, "n": len(valores),
+                           **{f"p{p}_ms": round(float(v), 1) for p, v in zip(QUANTIS, q)}})
+        return linhas
+
+    def percentil(self, etapa: str, p: float, desde_s: float | None = None, minimo: int = 1,
+                  **filtros) -> float | None:
+        """Percentil `p` da duração de `etapa` (filtrando por campos, ex.: modelo); None com menos de `minimo` registros."""
+        limite = time.time() - desde_s if desde_s else 0.0
+        with self._lock:
+            valores = [r["duracao_ms"] for r in self._janela
+                       if r["etapa"] == etapa and r["ts"] >= limite
+                       and all(r.get(k) == v for k, v in filtros.items())]
+        if len(valores) < max(1, minimo):
+            return None
+        return float(np.percentile(np.asarray(valores), p))
+
+    def contagem(self, etapa: str, campo: str, desde_s: float | None = None) -> dict:
+        """Quantos registros de `etapa` há por valor de `campo` (ex.: classe do pré-classificador)."""
+        limite = time.time() - desde_s if desde_s else 0.0
+        contagem: dict = {}
+        with self._lock:
+            for r in self._janela:
+                if r["etapa"] == etapa and r["ts"] >= limite:
+                    valor = r.get(campo)
+                    contagem[valor] = contagem.get(valor, 0) + 1
+        return contagem
+
+    def soma(self, etapa: str, campo: str, desde_s: float | None = None) -> float:
+        """Soma de `campo` nos registros de `etapa` (ex.: bytes das fotos)."""
+        limite = time.time() - desde_s if desde_s else 0.0
+        with self._lock:
+            return sum(r.get(campo, 0) for r in self._janela if r["etapa"] == etapa and r["ts"] >= limite)
+
+    def tokens(self) -> list[dict]:
+        with self._lock:
+            return [{"tipo": t, "modelo": m, "modo": md, "total": n} for (t, m, md), n in sorted(self._tokens.items())]
+
+    def prometheus(self) -> str:
+        with self._lock:
+            return self._prometheus()
+
+    def _prometheus(self) -> str:
+        """Formato texto do Prometheus (chamar com o lock)."""
+        grupos: dict[tuple, list[float]] = {chave: [] for chave in self._totais}
+        for r in self._janela:
+            grupos[(r["etapa"], r.get("modelo", ""), r.get("modo", ""))].append(r["duracao_ms"])
+
+        def rot(**kv) -> str:
+            return ",".join(f'{k}="{_escapar_rotulo(v)}"' for k, v in kv.items())
+
+        saida = [
+            "# HELP ensina_etapa_duracao_ms Duração por etapa do caminho da pergunta (quantis da janela recente).",
+            "# TYPE ensina_etapa_duracao_ms summary",
+        ]
+        for (etapa, modelo, modo), valores in sorted(grupos.items()):
+            base = rot(etapa=etapa, modelo=modelo, modo=modo)
+            if valores:  # etapa sem registros na janela: só os totais
+                for p, v in zip(QUANTIS, np.percentile(np.asarray(valores), QUANTIS)):
+                    saida.append(f'ensina_etapa_duracao_ms{{{base},quantile="{p / 100}"}} {v:.3f}')
+            soma, contagem = self._totais[(etapa, modelo, modo)]
+            saida.append(f"ensina_etapa_duracao_ms_sum{{{base}}} {soma:.3f}")
+            saida.append(f"ensina_etapa_duracao_ms_count{{{base}}} {contagem}")
+        saida += ["# HELP ensina_tokens_total Tokens informados pelo Gemini (usage_metadata).",
+                  "# TYPE ensina_tokens_total counter"]
+        for (tipo, modelo, modo), n in sorted(self._tokens.items()):
+            saida.append(f"ensina_tokens_total{{{rot(tipo=tipo, modelo=modelo, modo=modo)}}} {n}")
+        return "\n".join(saida) + "\n"
+
+
+def _escapar_rotulo(valor) -> str:
+    r"""Valor de rótulo no formato texto do Prometheus: `\\`, `\"` e `\n` escapados (não removidos)."""
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def uso_tokens(resp) -> dict:
+    """tokens_prompt / tokens_resposta a partir do `usage_metadata` (vazio se não vier)."""
+    uso = getattr(resp, "usage_metadata", None)
+    if uso is None:
+        return {}
+    return {
+        "tokens_prompt": getattr(uso, "prompt_token_count", None) or None,
+        "tokens_resposta": getattr(uso, "candidates_token_count", None) or None,
+    }
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from base_conhecimento import (
+    BM25,
+    SOBREPOSICAO,
+    TAMANHO_TRECHO,
+    WORKERS_EMBEDDING,
+    BaseConhecimento,
+    _janelas,
+    _tokens,
+    quebrar,
+)
+from cache_semantico import EmbedderHashing
+
+DOCUMENTO = """# Úlcera venosa
+
+## Coberturas
+
+Em úlceras venosas muito exsudativas, alginato de cálcio ou espuma absorvente sob terapia compressiva.
+
+## Compressão
+
+Terapia compressiva multicamadas depois de confirmar o índice tornozelo-braquial.
+
+# Lesão por pressão
+
+Reposicionamento a cada duas horas e colchão de redistribuição de pressão.
+"""
+
+
+class EmbedderLento(EmbedderHashing):
+    """Hashing com atraso: simula a rede lenta do embedding da pergunta."""
+
+    def __init__(self):
+        super().__init__()
+        self.atraso_s = 0.0
+        self.chamadas = 0
+        self.liberar = threading.Event()
+        self.liberar.set()
+
+    def embed(self, texto):
+        self.chamadas += 1
+        self.liberar.wait(5)
+        time.sleep(self.atraso_s)
+        return super().embed(texto)
+
+
+@pytest.fixture
+def base(tmp_path):
+    docs = tmp_path / "documentos"
+    docs.mkdir()
+    (docs / "feridas.md").write_text(DOCUMENTO, encoding="utf-8")
+    b = BaseConhecimento(docs, tmp_path / "indice", EmbedderLento())
+    b.atualizar()
+    return b
+
+
+def test_tokens_sem_acento_stopwords_e_plural():
+    assert _tokens("As Úlceras venosas com exsudato") == ["ulcera", "venosa", "exsudato"]
+
+
+def test_quebrar_usa_titulos_como_secao():
+    trechos = quebrar(DOCUMENTO)
+    assert [s for s, _ in trechos] == ["Úlcera venosa › Coberturas", "Úlcera venosa › Compressão",
+                                       "Lesão por pressão"]
+    assert "alginato" in trechos[0][1]
+
+
+def test_paragrafo_longo_vira_janelas_com_sobreposicao():
+    palavras = " ".join(f"palavra{i}" for i in range(400))
+    janelas = _janelas(palavras)
+    assert len(janelas) > 1
+    assert all(len(j) <= TAMANHO_TRECHO for j in janelas)
+    assert janelas[0][-SOBREPOSICAO // 2:] in janelas[1]  # o fim de uma janela repete no começo da próxima
+    assert all(not j.startswith(" ") and not j.endswith(" ") for j in janelas)
+
+
+def test_bm25_prefere_o_documento_com_o_termo_raro():
+    bm25 = BM25([_tokens("alginato espuma"), _tokens("espuma espuma"), _tokens("colchão")])
+    pontos = bm25.pontuar(_tokens("alginato espuma"))
+    assert int(np.argmax(pontos)) == 0
+    assert pontos[2] == 0
+
+
+def test_busca_combina_palavras_e_vetor(base):
+    achados = base.buscar("qual cobertura para úlcera venosa exsudativa?", k=2, orcamento_ms=2000)
+    assert achados[0]["secao"] == "Úlcera venosa › Coberturas"
+    assert base.ultima_fonte == "bm25+denso"
+
+
+def test_embedding_lento_fica_so_bm25_dentro_do_orcamento(base):
+    base.embedder.atraso_s = 0.5
+    t0 = time.perf_counter()
+    achados = base.buscar("colchão reposicionamento", orcamento_ms=50)
+    assert time.perf_counter() - t0 < 0.3
+    assert base.ultima_fonte == "bm25"
+    assert achados[0]["secao"] == "Lesão por pressão"
+
+
+def test_embeddings_presos_nao_enfileiram(base):
+    base.embedder.liberar.clear()  # os embeddings travam até o fim do teste
+    for _ in range(WORKERS_EMBEDDING):
+        base.buscar("alginato", orcamento_ms=10)
+    chamadas = base.embedder.chamadas
+    t0 = time.perf_counter()
+    base.buscar("alginato", orcamento_ms=200)
+    assert time.perf_counter() - t0 < 0.1  # nem esperou o orçamento: não havia worker livre
+    assert base.embedder.chamadas == chamadas
+    assert base.estado()["embeddings_pulados"] == 1
+
+    base.embedder.liberar.set()
+    deadline = time.monotonic() + 5
+    while base._embeddings_em_curso and time.monotonic() < deadline:
+        time.sleep(0.01)
+    base.buscar("alginato", orcamento_ms=2000)
+    assert base.ultima_fonte == "bm25+denso"
+
+
+def test_vetor_passado_evita_novo_embedding(base):
+    v = base.embedder.embed("alginato")
+    chamadas = base.embedder.chamadas
+    base.buscar("alginato", vetor=v / np.linalg.norm(v))
+    assert base.embedder.chamadas == chamadas
+
+
+def test_reindexacao_incremental_reaproveita_vetores(base, tmp_path):
+    versao = base.versao
+    (tmp_path / "documentos" / "novo.txt").write_text("Desbridamento autolítico com hidrogel.", encoding="utf-8")
+    resumo = base.atualizar()
+    assert resumo["lidos"] == 1
+    assert resumo["embeddings_novos"] == 1
+    assert resumo["reaproveitados"] == 3
+    assert base.versao != versao
+    assert base.atualizar()["lidos"] == 0
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from cache_respostas import CacheRespostas, chave_cache, normalizar_prompt
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheRespostas(tmp_path / "respostas.sqlite3")
+
+
+def test_normalizacao_ignora_caixa_espacos_e_formas_unicode():
+    assert normalizar_prompt("  Úlcera\n\tVENOSA  ") == normalizar_prompt("úlcera venosa")
+    assert normalizar_prompt("ﬁbrina") == "fibrina"  # NFKC desfaz a ligadura
+
+
+def test_chave_separa_modo_modelo_e_temperatura():
+    base = chave_cache("pergunta", "Ensino (tutor)", "gemini-x", 0.2)
+    assert base == chave_cache("  PERGUNTA ", "Ensino (tutor)", "gemini-x", 0.2001)
+    assert base != chave_cache("pergunta", "Clínico (objetivo)", "gemini-x", 0.2)
+    assert base != chave_cache("pergunta", "Ensino (tutor)", "gemini-y", 0.2)
+    assert base != chave_cache("pergunta", "Ensino (tutor)", "gemini-x", 0.3)
+
+
+def test_guarda_e_obtem_com_esboco(cache):
+    assert cache.obter("k") is None
+    cache.guardar("k", "resposta", modelo="m", modo="Ensino (tutor)")
+    cache.guardar_esboco("k", {"need_sketch": True})
+    assert cache.obter("k") == "resposta"
+    assert cache.obter_esboco("k") == {"need_sketch": True}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_resposta_nova_apaga_o_esboco_antigo(cache):
+    cache.guardar("k", "v1")
+    cache.guardar_esboco("k", {"need_sketch": True})
+    cache.guardar("k", "v2")
+    assert cache.obter("k") == "v2"
+    assert cache.obter_esboco("k") is None
+
+
+def test_ttl(tmp_path):
+    cache = CacheRespostas(tmp_path / "r.sqlite3", ttl_s=0.05)
+    cache.guardar("k", "resposta")
+    time.sleep(0.1)
+    assert cache.obter("k") is None
+    assert cache.estatisticas()["entradas"] == 0
+
+
+def test_limite_de_bytes_tira_a_menos_acessada(tmp_path):
+    cache = CacheRespostas(tmp_path / "r.sqlite3", max_bytes=250)
+    cache.guardar("a", "x" * 100)
+    time.sleep(0.01)
+    cache.guardar("b", "x" * 100)
+    time.sleep(0.01)
+    assert cache.obter("a") is not None  # a vira a mais recente; b sai primeiro
+    time.sleep(0.01)
+    cache.guardar("c", "x" * 100)
+    assert cache.obter("b") is None
+    assert cache.obter("a") is not None and cache.obter("c") is not None
+    assert cache.estatisticas()["bytes"] <= 250
+
+
+def test_persiste_entre_instancias(tmp_path):
+    CacheRespostas(tmp_path / "r.sqlite3").guardar("k", "resposta")
+    assert CacheRespostas(tmp_path / "r.sqlite3").obter("k") == "resposta"
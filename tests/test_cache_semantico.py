@@ -0,0 +1,133 @@
+import time
+
+import numpy as np
+import pytest
+
+from cache_semantico import CacheSemantico, EmbedderGemini, EmbedderHashing, chave_contexto
+from nucleo import MODO_CLINICO, MODO_ENSINO
+
+MODO = MODO_ENSINO
+CONTEXTO = dict(modo=MODO, modelo="gemini-x", temperatura=0.2, versao="v1")
+LIMIARES = {MODO_ENSINO: 0.90, MODO_CLINICO: 0.94}  # o hashing não tem limiar padrão
+
+
+def novo_cache(pasta, **kw):
+    return CacheSemantico(pasta, EmbedderHashing(), limiares=LIMIARES, **kw)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return novo_cache(tmp_path)
+
+
+def adicionar(cache, pergunta, resposta="r", **contexto):
+    c = dict(CONTEXTO, **contexto)
+    cache.adicionar(cache.vetor(pergunta), c["modo"], c["modelo"], c["temperatura"], c["versao"], pergunta, resposta)
+
+
+def procurar(cache, pergunta, **contexto):
+    c = dict(CONTEXTO, **contexto)
+    return cache.procurar_resposta(cache.vetor(pergunta), c["modo"], c["modelo"], c["temperatura"], c["versao"])
+
+
+def test_chave_contexto_arredonda_temperatura_e_separa_o_resto():
+    assert chave_contexto(MODO, "m", 0.2, "v") == chave_contexto(MODO, "m", 0.2000001, "v")
+    assert chave_contexto(MODO, "m", 0.2, "") == chave_contexto(MODO, "m", 0.2, None)
+    chaves = {chave_contexto(*c) for c in [(MODO, "m", 0.2, "v"), (MODO_CLINICO, "m", 0.2, "v"),
+                                           (MODO, "n", 0.2, "v"), (MODO, "m", 0.7, "v"), (MODO, "m", 0.2, "w")]}
+    assert len(chaves) == 5
+
+
+def test_mesma_pergunta_acha_a_resposta(cache):
+    adicionar(cache, "Qual cobertura usar em úlcera venosa exsudativa?", "alginato")
+    sim, meta = procurar(cache, "Qual cobertura usar em úlcera venosa exsudativa?")
+    assert sim == pytest.approx(1.0, abs=1e-5)
+    assert meta["resposta"] == "alginato"
+
+
+@pytest.mark.parametrize("outro", [{"modelo": "gemini-y"}, {"temperatura": 0.9}, {"versao": "v2"},
+                                   {"modo": MODO_CLINICO}])
+def test_contexto_diferente_nao_reaproveita(cache, outro):
+    adicionar(cache, "Como medir a profundidade de uma lesão por pressão?")
+    assert procurar(cache, "Como medir a profundidade de uma lesão por pressão?", **outro) is None
+
+
+def test_hashing_nao_reaproveita_por_padrao(tmp_path):
+    cache = CacheSemantico(tmp_path, EmbedderHashing())
+    assert not cache.reaproveita(MODO_ENSINO)
+    adicionar(cache, "Como tratar pé diabético infectado?")
+    assert procurar(cache, "Como tratar pé diabético não infectado?") is None
+    assert procurar(cache, "Como tratar pé diabético infectado?") is None
+
+
+def test_limiar_padrao_por_embedder(tmp_path):
+    emb = EmbedderHashing()
+    emb.nome = "text-embedding-004"
+    cache = CacheSemantico(tmp_path, emb)
+    assert cache.reaproveita(MODO_ENSINO) and cache.reaproveita(MODO_CLINICO)
+    assert cache.limiares[MODO_CLINICO] > cache.limiares[MODO_ENSINO]
+
+
+def test_entrada_expirada_nao_vale_e_libera_a_linha(tmp_path):
+    cache = novo_cache(tmp_path, ttl_s=0.05)
+    adicionar(cache, "pergunta antiga")
+    time.sleep(0.1)
+    assert procurar(cache, "pergunta antiga") is None
+    adicionar(cache, "pergunta nova")  # o despejo libera a linha expirada
+    assert len(cache) == 1
+    adicionar(cache, "outra pergunta")
+    assert cache.estatisticas()["linhas_matriz"] == 2  # a linha livre foi reaproveitada
+
+
+def test_limite_de_bytes_tira_a_menos_acessada(tmp_path):
+    dim = EmbedderHashing().dim
+    perguntas = ["alginato em cavidade", "desbridamento autolítico", "escala de Braden"]
+    cache = novo_cache(tmp_path, max_bytes=2 * (4 * dim + 30))
+    adicionar(cache, perguntas[0], "a")
+    adicionar(cache, perguntas[1], "b")
+    assert procurar(cache, perguntas[0]) is not None  # acessa a 0: a 1 vira a menos usada
+    adicionar(cache, perguntas[2], "c")
+    assert len(cache) == 2
+    assert procurar(cache, perguntas[1]) is None
+    assert procurar(cache, perguntas[0])[1]["resposta"] == "a"
+    assert procurar(cache, perguntas[2])[1]["resposta"] == "c"
+
+
+def test_resposta_fica_no_disco_e_volta_no_reinicio(tmp_path):
+    cache = novo_cache(tmp_path)
+    adicionar(cache, "Quando trocar o hidrocoloide?", "a cada 3 a 7 dias")
+    assert not hasattr(cache, "_meta")
+
+    de_novo = novo_cache(tmp_path)
+    assert len(de_novo) == 1
+    assert procurar(de_novo, "Quando trocar o hidrocoloide?")[1]["resposta"] == "a cada 3 a 7 dias"
+
+
+def test_matriz_cresce_sem_perder_vetores(tmp_path, monkeypatch):
+    monkeypatch.setattr("cache_semantico.CAPACIDADE_INICIAL", 2)
+    cache = novo_cache(tmp_path)
+    for i in range(5):
+        adicionar(cache, f"pergunta número {i}", str(i))
+    for i in range(5):
+        assert procurar(cache, f"pergunta número {i}")[1]["resposta"] == str(i)
+
+
+class GuardaFalsa:
+    def __init__(self):
+        self.chamadas = []
+
+    def executar(self, fn, tokens=1000, essencial=True, timeout_fila_s=30.0):
+        self.chamadas.append((tokens, essencial))
+        return fn()
+
+
+def test_embedder_gemini_passa_pela_guarda(monkeypatch):
+    import google.generativeai as genai
+
+    monkeypatch.setattr(genai, "embed_content", lambda model, content, task_type: {
+        "embedding": [[1.0, 0.0]] * len(content) if isinstance(content, list) else [1.0, 0.0]})
+    guarda = GuardaFalsa()
+    emb = EmbedderGemini(guarda=guarda)
+    assert emb.embed("pergunta").shape == (2,)
+    assert emb.embed_lote(["a", "b", "c"], tamanho=2).shape == (3, 2)
+    assert [essencial for _, essencial in guarda.chamadas] == [False, True, True]
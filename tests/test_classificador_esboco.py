@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from classificador_esboco import (
+    MODELO,
+    NAO,
+    SIM,
+    PreClassificador,
+    RegistroDecisoes,
+    avaliar,
+    concordancia,
+    decisao_local,
+    escolher_limiares,
+    indicios,
+    treinar,
+)
+
+ROTULADOS = Path(__file__).resolve().parent.parent / "benchmarks" / "esboco_rotulado.jsonl"
+
+
+def rotulados() -> list[dict]:
+    with ROTULADOS.open(encoding="utf-8") as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+
+@pytest.mark.parametrize("texto", ["Troque o curativo e a cobertura secundária", "leito limpo, bordas regulares",
+                                   "a medida da ferida", "técnica asséptica", "região perilesional",
+                                   "classificação de Wagner"])
+def test_palavras_genericas_nao_contam_como_visuais(texto):
+    assert indicios(texto, texto)[:2] == (0, 0)
+
+
+@pytest.mark.parametrize("texto", ["Como posicionar o paciente?", "bota de Unna passo a passo",
+                                   "como medir a profundidade", "anatomia do pé", "túnel às 3 horas"])
+def test_indicios_espaciais_e_de_procedimento(texto):
+    assert indicios(texto, "")[0] > 0
+
+
+def test_sem_pesos_so_pula_o_nao_obvio():
+    clf = PreClassificador()
+    assert clf.decidir("Qual a dose de cefalexina?", "500 mg a cada 6 horas.") == (NAO, None)
+    assert clf.decidir("Como posicionar o paciente acamado?", "Lateralização a 30 graus.") == (MODELO, None)
+
+
+def test_decisao_local_so_no_nao():
+    assert decisao_local(NAO) == {"need_sketch": False, "reason": "", "sketch_prompt": ""}
+    assert decisao_local(SIM) is None  # o Gemini escreve o prompt do esboço
+    assert decisao_local(MODELO) is None
+
+
+def test_concordancia_conta_so_os_nao_como_pulos():
+    registros = [
+        {"local": NAO, "need_sketch": False}, {"local": NAO, "need_sketch": True},
+        {"local": SIM, "need_sketch": True}, {"local": MODELO, "need_sketch": False},
+    ]
+    c = concordancia(registros)
+    assert c["taxa_pulos"] == 0.5
+    assert c["concordancia"] == 0.5
+    assert c["concordancia_sim"] == 1.0
+    assert c["positivos"] == 2
+
+
+def test_partida_fria_no_conjunto_rotulado():
+    """Só regras, conjunto separado escrito à mão: pula mais da metade e quase sempre concorda."""
+    r = avaliar(PreClassificador(), rotulados())
+    assert r["taxa_pulos"] >= 0.5
+    assert r["concordancia"] >= 0.95
+
+
+def test_treino_e_limiares(tmp_path):
+    registros = rotulados()
+    clf = PreClassificador(treinar(registros, epocas=200))
+    probs = np.array([clf.probabilidade(r["pergunta"], r["resposta"]) for r in registros])
+    y = np.array([r["need_sketch"] for r in registros], dtype=np.int8)
+    assert probs[y == 1].mean() > probs[y == 0].mean()
+
+    clf.limiar_nao, clf.limiar_sim = escolher_limiares(probs, y, alvo=0.97)
+    assert 0 <= clf.limiar_nao <= 0.5 <= clf.limiar_sim <= 1
+    clf.salvar(tmp_path / "pesos.npz")
+    carregado = PreClassificador.carregar(tmp_path / "pesos.npz")
+    assert carregado.limiar_nao == pytest.approx(clf.limiar_nao)
+    assert carregado.decidir("Qual a dose?", "500 mg")[1] is not None
+
+
+def test_pesos_ausentes_voltam_as_regras(tmp_path):
+    assert PreClassificador.carregar(tmp_path / "nao_existe.npz").pesos is None
+
+
+def test_registro_ignora_linha_quebrada(tmp_path):
+    reg = RegistroDecisoes(tmp_path / "d.jsonl")
+    reg.registrar("p", "r" * 5000, True, "embutido", NAO, 0.123456)
+    with reg.arquivo.open("a", encoding="utf-8") as f:
+        f.write("{quebrada\n")
+    (linha,) = reg.ler()
+    assert linha["need_sketch"] is True and linha["prob"] == 0.1235
+    assert len(linha["resposta"]) == 1200
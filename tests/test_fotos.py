@@ -0,0 +1,108 @@
+import io
+
+import pytest
+from PIL import Image
+
+from fotos import MAX_BYTES_FOTO, FotoInvalida, ProcessadorFotos, tokens_imagem
+
+ORIENTACAO = 0x0112
+GPS = 0x8825
+
+
+def jpeg(largura: int, altura: int, orientacao: int | None = None, gps: bool = False) -> bytes:
+    img = Image.new("RGB", (largura, altura), (200, 80, 60))
+    img.paste((20, 20, 200), (0, 0, largura // 4, altura // 4))  # canto marcado: mostra a rotação
+    exif = Image.Exif()
+    if orientacao:
+        exif[ORIENTACAO] = orientacao
+    if gps:
+        exif[GPS] = {1: "S", 2: (23.0, 33.0, 0.0)}
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90, exif=exif.tobytes())
+    return out.getvalue()
+
+
+def abrir(dados: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(dados))
+
+
+def test_tokens_imagem():
+    assert tokens_imagem(384, 200) == 258
+    assert tokens_imagem(768, 768) == 258
+    assert tokens_imagem(1024, 768) == 516
+    assert tokens_imagem(1024, 1024) == 1032
+
+
+def test_reduz_o_maior_lado_e_gera_miniatura():
+    foto = ProcessadorFotos(lado_max=512, lado_miniatura=128).processar(jpeg(2000, 1000))
+    assert (foto.largura, foto.altura) == (512, 256)
+    assert abrir(foto.dados).size == (512, 256)
+    assert max(abrir(foto.miniatura).size) == 128
+    assert foto.mime == "image/jpeg"
+    assert foto.bytes_original > len(foto.dados)
+    assert foto.tamanho_original == (2000, 1000)
+
+
+def test_foto_pequena_nao_aumenta_e_reusa_os_bytes_na_miniatura():
+    foto = ProcessadorFotos(lado_max=512, lado_miniatura=480).processar(jpeg(300, 200))
+    assert (foto.largura, foto.altura) == (300, 200)
+    assert foto.miniatura is foto.dados
+
+
+def test_remove_exif_e_aplica_a_orientacao():
+    foto = ProcessadorFotos(lado_max=1024).processar(jpeg(400, 200, orientacao=6, gps=True))
+    img = abrir(foto.dados)
+    assert img.size == (200, 400)  # girada 90°
+    assert not img.getexif()
+    assert "exif" not in img.info
+
+
+def test_webp():
+    foto = ProcessadorFotos(lado_max=256, formato="WEBP").processar(jpeg(600, 600))
+    assert foto.mime == "image/webp"
+    assert abrir(foto.dados).format == "WEBP"
+    assert abrir(foto.miniatura).format == "JPEG"  # o PDF embute JPEG como está
+
+
+def test_formato_desconhecido():
+    with pytest.raises(ValueError):
+        ProcessadorFotos(formato="GIF")
+
+
+def test_png_com_transparencia_vira_rgb():
+    img = Image.new("RGBA", (100, 100), (255, 0, 0, 128))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    foto = ProcessadorFotos().processar(out.getvalue())
+    assert abrir(foto.dados).mode == "RGB"
+
+
+def test_cache_pelo_conteudo():
+    proc = ProcessadorFotos()
+    dados = jpeg(800, 600)
+    a = proc.processar(dados)
+    b = proc.processar(bytes(dados))
+    assert a is b
+    assert (proc.hits, proc.misses) == (1, 1)
+    assert proc.estado()["fotos_em_cache"] == 1
+
+
+def test_cache_respeita_o_limite_de_bytes():
+    proc = ProcessadorFotos(lado_max=256, max_bytes_cache=1)
+    primeira = jpeg(800, 600)
+    proc.processar(primeira)
+    proc.processar(jpeg(600, 800))
+    assert proc.estado()["fotos_em_cache"] == 1  # fica só a mais recente
+    proc.processar(primeira)
+    assert proc.misses == 3
+
+
+@pytest.mark.parametrize("dados", [b"", b"nao e imagem", jpeg(200, 200)[:200]])
+def test_arquivo_invalido(dados):
+    with pytest.raises(FotoInvalida):
+        ProcessadorFotos().processar(dados)
+
+
+def test_arquivo_grande_demais_recusado_antes_de_decodificar():
+    with pytest.raises(FotoInvalida, match="grande demais"):
+        ProcessadorFotos().processar(b"\0" * (MAX_BYTES_FOTO + 1))
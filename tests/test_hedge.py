@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resiliencia import hedge, modelo_reserva
+
+
+class Erro503(Exception):
+    code = 503
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        yield ex
+
+
+def test_principal_rapido_nem_chama_o_reserva(executor):
+    chamadas = []
+    vencedor, resultado, disparou = hedge(
+        executor, lambda: "p", lambda: chamadas.append("r") or "r", atraso_s=1.0
+    )
+    assert (vencedor, resultado, disparou) == ("principal", "p", False)
+    assert chamadas == []
+
+
+def test_principal_falha_rapido_reserva_vence(executor):
+    def principal():
+        raise Erro503("quota")
+
+    t0 = time.perf_counter()
+    vencedor, resultado, disparou = hedge(executor, principal, lambda: "r", atraso_s=5.0)
+    assert (vencedor, resultado, disparou) == ("reserva", "r", True)
+    # não esperou o atraso inteiro para tentar o reserva
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_principal_lento_reserva_vence_e_perdedor_e_descartado(executor):
+    liberar = threading.Event()
+    descartados = []
+
+    def principal():
+        liberar.wait(5)
+        return "p"
+
+    vencedor, resultado, disparou = hedge(executor, principal, lambda: "r", atraso_s=0.05,
+                                          descartar=descartados.append)
+    assert (vencedor, resultado, disparou) == ("reserva", "r", True)
+    liberar.set()
+    executor.shutdown(wait=True)
+    assert descartados == ["p"]
+
+
+def test_os_dois_falham_sobe_o_erro_do_principal(executor):
+    def principal():
+        raise Erro503("principal")
+
+    def reserva():
+        raise ValueError("reserva")
+
+    with pytest.raises(Erro503, match="principal"):
+        hedge(executor, principal, reserva, atraso_s=0.05)
+
+
+def test_modelo_reserva_prefere_flash_lite_e_ignora_variantes():
+    modelos = ["models/gemini-2.5-pro", "models/gemini-2.5-flash-image", "models/gemini-2.5-flash",
+               "models/gemini-2.5-flash-lite"]
+    assert modelo_reserva(modelos, "models/gemini-2.5-pro") == "models/gemini-2.5-flash-lite"
+    assert modelo_reserva(["models/gemini-2.5-pro"], "models/gemini-2.5-pro") is None
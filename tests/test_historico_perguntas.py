@@ -0,0 +1,105 @@
+import pytest
+
+from historico_perguntas import HistoricoPerguntas, consulta_fts
+
+
+@pytest.fixture
+def historico(tmp_path):
+    return HistoricoPerguntas(tmp_path / "historico.sqlite3")
+
+
+def test_consulta_fts_poe_cada_palavra_entre_aspas():
+    assert consulta_fts('hidrogel "calcâneo" OR NEAR(') == '{pergunta resposta} : ("hidrogel" "calcâneo" "OR" "NEAR")'
+    assert consulta_fts("  ") == ""
+    assert consulta_fts("***") == ""
+
+
+def test_consulta_fts_escapa_a_sessao():
+    assert consulta_fts("dor", 'a"b').endswith('AND sessao : "a""b"')
+
+
+def test_busca_sem_acento_nem_caixa(historico):
+    historico.registrar("s1", "Úlcera no CALCÂNEO", "Use hidrogel.")
+    historico.registrar("s1", "Dose de antibiótico", "Depende do peso.")
+    linhas, _ = historico.pagina(busca="calcaneo ulcera")
+    assert [l["pergunta"] for l in linhas] == ["Úlcera no CALCÂNEO"]
+    linhas, _ = historico.pagina(busca="HIDROGEL")
+    assert len(linhas) == 1 and "**hidrogel**" in linhas[0]["trecho"].lower()
+
+
+def test_busca_com_operadores_nao_quebra(historico):
+    historico.registrar("s1", "pergunta", "resposta")
+    assert historico.pagina(busca='pergunta" OR *')[0] == []  # "OR" vira palavra obrigatória
+    assert len(historico.pagina(busca="pergunta (resposta")[0]) == 1
+
+
+def test_filtro_por_sessao(historico):
+    historico.registrar("s1", "biofilme na perna", "r")
+    historico.registrar("s2", "biofilme no pé", "r")
+    assert [l["sessao"] for l in historico.pagina(sessao="s2")[0]] == ["s2"]
+    assert [l["sessao"] for l in historico.pagina(sessao="s1", busca="biofilme")[0]] == ["s1"]
+    assert len(historico.pagina(busca="biofilme")[0]) == 2
+
+
+@pytest.mark.parametrize("busca", ["", "ferida"])
+def test_paginas_por_cursor_cobrem_tudo_sem_repetir(historico, busca):
+    ids = [historico.registrar("s1", f"ferida {i}", "r") for i in range(7)]
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        linhas, cursor = historico.pagina(sessao="s1", busca=busca, antes_de=cursor, limite=3)
+        vistos += [l["id"] for l in linhas]
+        paginas += 1
+        if cursor is None:
+            break
+    assert vistos == sorted(ids, reverse=True)
+    assert paginas == 3
+
+
+def test_pagina_exata_nao_devolve_cursor(historico):
+    for i in range(3):
+        historico.registrar("s1", f"p{i}", "r")
+    linhas, cursor = historico.pagina(limite=3)
+    assert len(linhas) == 3 and cursor is None
+
+
+def test_obter_traz_a_resposta_inteira_e_o_esboco(historico):
+    resposta = "x" * 1000
+    i = historico.registrar("s1", "p", resposta, esboco={"need_sketch": True}, fotos=2, duracao_ms=1234.56)
+    r = historico.obter(i)
+    assert r["resposta"] == resposta
+    assert r["esboco"] == {"need_sketch": True}
+    assert (r["fotos"], r["duracao_ms"]) == (2, 1234.6)
+    assert len(historico.pagina()[0][0]["trecho"]) < len(resposta)
+    assert historico.obter(i + 1) is None
+
+
+def test_esboco_que_chega_depois(historico):
+    i = historico.registrar("s1", "p", "r")
+    historico.atualizar_esboco(i, {"need_sketch": False})
+    assert historico.obter(i)["esboco"] == {"need_sketch": False}
+
+
+def test_turnos_anteriores_da_mesma_conversa(historico):
+    historico.registrar("s1", "q1", "r1", conversa="c")
+    historico.registrar("s1", "outra", "x", conversa="d")
+    historico.registrar("s1", "q2", "r2", conversa="c")
+    i = historico.registrar("s1", "q3", "r3", conversa="c")
+    assert historico.turnos_anteriores(i) == [("q1", "r1"), ("q2", "r2")]
+    sem_conversa = historico.registrar("s1", "solta", "r")
+    assert historico.turnos_anteriores(sem_conversa) == []
+
+
+def test_persiste_e_conta(tmp_path):
+    h = HistoricoPerguntas(tmp_path / "h.sqlite3")
+    h.registrar("s1", "p", "r")
+    h.registrar("s2", "p", "r")
+    de_novo = HistoricoPerguntas(tmp_path / "h.sqlite3")
+    assert len(de_novo) == 2
+    assert de_novo.estatisticas()["sessoes"] == 2
+    assert de_novo.pagina(busca="p")[0][0]["sessao"] == "s2"
+
+
+def test_len_conta_linhas_e_nao_o_maior_id(historico):
+    ids = [historico.registrar("s1", f"p{i}", "r") for i in range(3)]
+    historico._db.execute("DELETE FROM trocas WHERE id = ?", (ids[0],))
+    assert len(historico) == 2
@@ -0,0 +1,109 @@
+import io
+import threading
+
+import pytest
+from reportlab import rl_config
+
+from exportar_pdf import gerar_pdf_a4, sem_ascii85
+from relatorio_pdf import CacheSecoes, escrever_relatorio, gerar_relatorio_pdf, titulo_secao
+
+pypdf = pytest.importorskip("pypdf")
+
+RESPOSTA_LONGA = "## Conduta\n\n- limpar com **soro fisiológico**\n" + "cobertura de espuma " * 800
+
+
+def entradas(n: int) -> list[tuple[str, str]]:
+    return [(f"Caso {i}: lesão por pressão?\ndetalhes", RESPOSTA_LONGA if i % 2 else "Curta.") for i in range(n)]
+
+
+def test_titulo_secao_e_a_primeira_linha_nao_vazia():
+    assert titulo_secao("\n  como   tratar?\noutra") == "como tratar?"
+    assert titulo_secao("") == "(sem pergunta)"
+
+
+def test_paginas_marcadores_e_links_do_sumario():
+    dados = entradas(4)
+    destino = io.BytesIO()
+    paginas = escrever_relatorio(dados, destino, titulo="Relatório de teste")
+    pdf = pypdf.PdfReader(io.BytesIO(destino.getvalue()))
+    assert len(pdf.pages) == paginas
+    assert pdf.metadata.title == "Relatório de teste"
+
+    inicios = [pdf.get_destination_page_number(o) for o in pdf.outline]
+    assert [o.title for o in pdf.outline] == [f"{n}. Caso {i}: lesão por pressão?" for n, i in zip(range(1, 5), range(4))]
+    assert inicios[0] == 1 and inicios == sorted(inicios)
+    assert inicios[2] - inicios[1] > 1  # a resposta longa ocupa mais de uma página
+
+    sumario = pdf.pages[0]
+    links = [a.get_object() for a in sumario["/Annots"]]
+    assert len(links) == 4 and all(a["/Subtype"] == "/Link" for a in links)
+    texto = sumario.extract_text()
+    assert "Sumário" in texto
+    for inicio in inicios:
+        assert f"\n{inicio + 1}\n" in texto  # número da página (1-based) vindo do form definido no fim
+    assert f"Página 1 de {paginas}" in texto.replace("de \n", "de ")
+
+
+def test_cabecalho_e_rodape_sao_forms_compartilhados():
+    pdf = pypdf.PdfReader(io.BytesIO(gerar_relatorio_pdf(entradas(3))))
+    forms = set()
+    for pagina in pdf.pages:
+        xobjs = pagina["/Resources"]["/XObject"]
+        forms |= {xobjs[nome].indirect_reference.idnum for nome in xobjs if "cabecalho" in nome or "rodape" in nome}
+    assert len(forms) == 2  # um objeto de cada, referenciado por todas as páginas
+
+
+def test_relatorio_vazio():
+    assert len(pypdf.PdfReader(io.BytesIO(gerar_relatorio_pdf([]))).pages) == 1
+
+
+def test_ascii85_desligado_so_durante_a_montagem():
+    original = rl_config.useA85
+    with sem_ascii85():
+        assert rl_config.useA85 == 0
+        with sem_ascii85():  # reentrante: o relatório pode chamar código que também usa
+            pass
+        assert rl_config.useA85 == 0
+    assert rl_config.useA85 == original
+    gerar_pdf_a4("p", "r")
+    gerar_relatorio_pdf(entradas(1))
+    assert rl_config.useA85 == original
+
+
+def test_outra_montagem_espera_a_primeira_terminar():
+    original = rl_config.useA85
+    entrou = threading.Event()
+
+    def montar():
+        with sem_ascii85():
+            entrou.set()
+
+    with sem_ascii85():
+        t = threading.Thread(target=montar)
+        t.start()
+        assert not entrou.wait(0.1)  # bloqueada no lock enquanto o primeiro PDF é montado
+    t.join(5)
+    assert entrou.is_set()
+    assert rl_config.useA85 == original
+
+
+def test_secoes_em_cache_dao_o_mesmo_pdf():
+    dados = entradas(3)
+    cache = CacheSecoes()
+    textos = []
+    for _ in range(2):
+        destino = io.BytesIO()
+        escrever_relatorio(dados, destino, cache=cache)
+        textos.append([p.extract_text() for p in pypdf.PdfReader(destino).pages])
+    assert textos[0] == textos[1]
+    assert (cache.hits, cache.misses) == (3, 3)
+
+    escrever_relatorio([*dados, ("nova?", "r")], io.BytesIO(), cache=cache)
+    assert cache.misses == 4  # só a seção nova foi diagramada
+
+
+def test_cache_de_secoes_respeita_o_limite():
+    cache = CacheSecoes(max_bytes=1)
+    for p, r in entradas(3):
+        cache.paginas(p, r)
+    assert cache.estado()["secoes"] == 1
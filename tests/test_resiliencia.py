@@ -0,0 +1,197 @@
+import time
+
+import pytest
+
+from resiliencia import (
+    CircuitoAberto,
+    Disjuntor,
+    GuardaGemini,
+    LimiteExcedido,
+    Limitador,
+    TokenBucket,
+    erro_retentavel,
+)
+
+
+class Erro(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def guarda(tentativas=3, **kw):
+    return GuardaGemini(Limitador(rpm=1000, tpm=10**6), Disjuntor(**kw), tentativas=tentativas, backoff_base_s=0)
+
+
+# ---- TokenBucket / Limitador ----
+def test_bucket_comeca_cheio_e_repoe_pela_taxa():
+    b = TokenBucket(60)  # 1 por segundo
+    t0 = b._t
+    assert b.espera_para(60, t0) == 0
+    b.consumir(60)
+    assert b.espera_para(1, t0) == pytest.approx(1.0)
+    assert b.espera_para(1, t0 + 1.0) == 0
+
+
+def test_bucket_nao_passa_da_capacidade():
+    b = TokenBucket(60)
+    b.consumir(60)
+    assert b.espera_para(60, b._t + 3600) == 0
+    assert b._saldo == 60
+
+
+def test_pedido_maior_que_a_capacidade_espera_encher_em_vez_de_nunca():
+    b = TokenBucket(60)
+    b.consumir(1000)
+    assert b._saldo == 0
+    assert b.espera_para(1000, b._t) == pytest.approx(60.0)
+
+
+def test_limitador_recusa_o_que_nao_libera_dentro_do_timeout():
+    lim = Limitador(rpm=1, tpm=10**6)
+    lim.adquirir(10, timeout_s=0)
+    with pytest.raises(LimiteExcedido):
+        lim.adquirir(10, timeout_s=0.1)
+    assert lim.estado()["recusas"] == 1
+
+
+def test_limitador_respeita_tokens_por_minuto():
+    lim = Limitador(rpm=1000, tpm=600)  # 10 tokens/s
+    lim.adquirir(600, timeout_s=0)
+    t = time.monotonic()
+    lim.adquirir(2, timeout_s=1)
+    assert time.monotonic() - t >= 0.15
+    assert lim.estado()["esperas"] == 1
+
+
+# ---- Disjuntor ----
+def test_disjuntor_degrada_antes_de_abrir():
+    d = Disjuntor(falhas_para_degradar=2, falhas_para_abrir=4, abertura_s=60)
+    d.falha()
+    d.permitir(essencial=False)
+    d.falha()
+    assert d.estado()["estado"] == Disjuntor.DEGRADADO
+    d.permitir(essencial=True)
+    with pytest.raises(CircuitoAberto):
+        d.permitir(essencial=False)
+    d.falha()
+    d.falha()
+    assert d.estado()["estado"] == Disjuntor.ABERTO
+    with pytest.raises(CircuitoAberto):
+        d.permitir(essencial=True)
+    assert d.estado()["recusadas"] == 2
+
+
+def test_disjuntor_meio_aberto_deixa_passar_uma_chamada_de_teste():
+    d = Disjuntor(falhas_para_degradar=1, falhas_para_abrir=1, abertura_s=0.05)
+    d.falha()
+    time.sleep(0.06)
+    assert d.estado()["estado"] == Disjuntor.MEIO_ABERTO
+    d.permitir(essencial=True)
+    with pytest.raises(CircuitoAberto):
+        d.permitir(essencial=True)  # a de teste ainda não voltou
+    d.sucesso()
+    assert d.estado()["estado"] == Disjuntor.FECHADO
+
+
+def test_teste_que_falha_reabre():
+    d = Disjuntor(falhas_para_degradar=1, falhas_para_abrir=1, abertura_s=0.05)
+    d.falha()
+    time.sleep(0.06)
+    d.permitir()
+    d.falha()
+    assert d.estado()["estado"] == Disjuntor.ABERTO
+    assert d.estado()["aberturas"] == 2
+
+
+# ---- retry ----
+@pytest.mark.parametrize("erro, esperado", [
+    (Erro(429), True), (Erro(503), True), (Erro(400), False), (Erro(404), False),
+    (TimeoutError(), True), (ValueError(), False),
+])
+def test_erro_retentavel(erro, esperado):
+    assert erro_retentavel(erro) is esperado
+
+
+def test_guarda_tenta_de_novo_em_erro_transitorio():
+    g = guarda(falhas_para_degradar=5, falhas_para_abrir=10)
+    respostas = iter([Erro(503), Erro(429), "ok"])
+
+    def fn():
+        r = next(respostas)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    assert g.executar(fn) == "ok"
+    assert g.retries == 2
+    assert g.disjuntor.falhas_seguidas == 0
+
+
+def test_guarda_nao_repete_erro_da_propria_chamada():
+    g = guarda()
+    chamadas = []
+
+    def fn():
+        chamadas.append(1)
+        raise Erro(400)
+
+    with pytest.raises(Erro):
+        g.executar(fn)
+    assert len(chamadas) == 1
+    assert g.disjuntor.falhas_seguidas == 0  # o serviço respondeu
+
+
+def test_guarda_nao_repete_chamada_nao_essencial():
+    g = guarda()
+    chamadas = []
+
+    def fn():
+        chamadas.append(1)
+        raise Erro(503)
+
+    with pytest.raises(Erro):
+        g.executar(fn, essencial=False)
+    assert len(chamadas) == 1
+
+
+def test_guarda_desiste_depois_das_tentativas():
+    g = guarda(tentativas=3, falhas_para_degradar=10, falhas_para_abrir=20)
+    chamadas = []
+
+    def fn():
+        chamadas.append(1)
+        raise Erro(500)
+
+    with pytest.raises(Erro):
+        g.executar(fn)
+    assert len(chamadas) == 3
+    assert g.disjuntor.falhas_seguidas == 3
+
+
+def test_teste_do_meio_aberto_recusado_pelo_limitador_nao_trava_o_disjuntor():
+    lim = Limitador(rpm=1, tpm=10**6)
+    g = GuardaGemini(lim, Disjuntor(falhas_para_degradar=1, falhas_para_abrir=1, abertura_s=0.05),
+                     tentativas=1, backoff_base_s=0)
+    with pytest.raises(Erro):
+        g.executar(lambda: (_ for _ in ()).throw(Erro(503)), timeout_fila_s=0)  # gasta a única requisição
+    time.sleep(0.06)
+    with pytest.raises(LimiteExcedido):
+        g.executar(lambda: "ok", timeout_fila_s=0.01)  # a chamada de teste nem sai
+    lim.rpm._saldo = lim.rpm.capacidade  # o limitador encheu de novo
+    assert g.executar(lambda: "ok", timeout_fila_s=0) == "ok"
+    assert g.disjuntor.estado()["estado"] == Disjuntor.FECHADO
+
+
+def test_teste_do_meio_aberto_interrompido_libera_o_proximo():
+    g = guarda(tentativas=1, falhas_para_degradar=1, falhas_para_abrir=1, abertura_s=0.05)
+    with pytest.raises(Erro):
+        g.executar(lambda: (_ for _ in ()).throw(Erro(503)))
+    time.sleep(0.06)
+
+    def interrompida():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        g.executar(interrompida)
+    assert g.executar(lambda: "ok") == "ok"
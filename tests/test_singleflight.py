@@ -0,0 +1,148 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resiliencia import Singleflight, Transmissao
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        yield ex
+
+
+def _bloquear(executor):
+    """Ocupa o único worker até `liberar.set()`: o que for submetido depois fica na fila."""
+    liberar = threading.Event()
+    executor.submit(liberar.wait, 5)
+    return liberar
+
+
+def test_pedidos_iguais_viram_uma_chamada(executor):
+    sf = Singleflight()
+    liberar = _bloquear(executor)
+    chamadas = []
+
+    def fn(x):
+        chamadas.append(x)
+        return x * 2
+
+    a, lider_a = sf.submeter("k", executor, fn, 21)
+    b, lider_b = sf.submeter("k", executor, fn, 21)
+    liberar.set()
+    assert (a.result(5), b.result(5)) == (42, 42)
+    assert (lider_a, lider_b) == (True, False)
+    assert chamadas == [21]
+    assert sf.estado() == {"em_andamento": 0, "lideres": 1, "economizadas": 1}
+
+
+def test_cancelar_uma_copia_nao_derruba_as_outras(executor):
+    sf = Singleflight()
+    liberar = _bloquear(executor)
+    a, _ = sf.submeter("k", executor, lambda: "ok")
+    b, _ = sf.submeter("k", executor, lambda: "ok")
+    assert a.cancel()
+    liberar.set()
+    assert b.result(5) == "ok"
+    assert a.cancelled()
+
+
+def test_todos_cancelam_a_tarefa_na_fila_e_cancelada(executor):
+    sf = Singleflight()
+    liberar = _bloquear(executor)
+    chamadas = []
+    a, _ = sf.submeter("k", executor, chamadas.append, 1)
+    b, _ = sf.submeter("k", executor, chamadas.append, 1)
+    a.cancel()
+    b.cancel()
+    assert sf.estado()["em_andamento"] == 0
+
+    # quem chega depois começa uma tarefa nova, não herda a cancelada
+    c, lider = sf.submeter("k", executor, lambda: "nova")
+    liberar.set()
+    assert lider
+    assert c.result(5) == "nova"
+    executor.shutdown(wait=True)
+    assert chamadas == []
+
+
+def test_todos_cancelam_a_tarefa_em_execucao_termina_e_serve_quem_chega(executor):
+    sf = Singleflight()
+    comecou, liberar = threading.Event(), threading.Event()
+
+    def fn():
+        comecou.set()
+        liberar.wait(5)
+        return "pronta"
+
+    a, _ = sf.submeter("k", executor, fn)
+    assert comecou.wait(5)
+    a.cancel()
+    assert sf.estado()["em_andamento"] == 1  # já rodando: continua no registro
+
+    b, lider = sf.submeter("k", executor, fn)
+    liberar.set()
+    assert not lider
+    assert b.result(5) == "pronta"
+
+
+def test_erro_chega_a_todas_as_copias(executor):
+    sf = Singleflight()
+    liberar = _bloquear(executor)
+
+    def falha():
+        raise ValueError("x")
+
+    a, _ = sf.submeter("k", executor, falha)
+    b, _ = sf.submeter("k", executor, falha)
+    liberar.set()
+    for fut in (a, b):
+        with pytest.raises(ValueError):
+            fut.result(5)
+    assert sf.estado()["em_andamento"] == 0
+
+
+def test_copia_cancelada_enquanto_a_tarefa_termina(executor, caplog):
+    """Cancelar a cópia na mesma hora em que a tarefa termina não pode estourar InvalidStateError."""
+    sf = Singleflight()
+    for i in range(200):
+        a, _ = sf.submeter(f"k{i}", executor, lambda: i)
+        a.cancel()
+    executor.shutdown(wait=True)
+    assert sf.estado()["em_andamento"] == 0
+    assert "exception calling callback" not in caplog.text  # o concurrent.futures só loga o erro do callback
+
+
+def test_transmissao_cada_leitor_ve_o_stream_inteiro():
+    sf = Singleflight()
+    pode_seguir = threading.Event()
+
+    def stream():
+        yield "a"
+        pode_seguir.wait(5)
+        yield "b"
+
+    t, lider = sf.entrar("k", Transmissao)
+    assert lider
+    t.iniciar(stream(), modelo="m")
+    outra, lider = sf.entrar("k", Transmissao)
+    assert outra is t and not lider
+    assert outra.aguardar(timeout=1) == {"modelo": "m"}
+
+    primeiro = iter(t.leitor())
+    assert next(primeiro) == "a"
+    pode_seguir.set()
+    assert list(primeiro) == ["b"]
+    assert list(outra.leitor()) == ["a", "b"]
+    sf.sair("k", t)
+    assert sf.estado()["em_andamento"] == 0
+
+
+def test_transmissao_que_falhou_repassa_o_erro():
+    t = Transmissao()
+    t.falhar(RuntimeError("429"))
+    with pytest.raises(RuntimeError):
+        t.aguardar(timeout=1)
+    with pytest.raises(RuntimeError):
+        list(t.leitor())
@@ -0,0 +1,54 @@
+import re
+import threading
+
+from telemetria import Telemetria
+
+
+def _valor(texto: str, metrica: str, etapa: str) -> float:
+    m = re.search(rf'^{metrica}{{etapa="{etapa}"[^}}]*}} (\S+)$', texto, re.M)
+    assert m, f"{metrica} de {etapa} ausente"
+    return float(m.group(1))
+
+
+def test_sum_count_continuam_crescendo_depois_que_a_janela_enche(tmp_path):
+    tel = Telemetria(tmp_path, janela=5, intervalo_prom_s=3600)
+    for _ in range(12):
+        tel.registrar("gemini.total", 10.0)
+    texto = tel.prometheus()
+    assert _valor(texto, "ensina_etapa_duracao_ms_count", "gemini.total") == 12
+    assert _valor(texto, "ensina_etapa_duracao_ms_sum", "gemini.total") == 120.0
+
+
+def test_etapa_fora_da_janela_continua_exportando_totais(tmp_path):
+    tel = Telemetria(tmp_path, janela=2, intervalo_prom_s=3600)
+    tel.registrar("assets", 3.0)
+    tel.registrar("build_prompt", 1.0)
+    tel.registrar("build_prompt", 1.0)
+    texto = tel.prometheus()
+    assert _valor(texto, "ensina_etapa_duracao_ms_count", "assets") == 1
+    assert 'etapa="assets",modelo="",modo="",quantile' not in texto
+
+
+def test_metrics_prom_gravado_inteiro_e_sem_temporarios(tmp_path):
+    tel = Telemetria(tmp_path, intervalo_prom_s=0)
+    threads = [threading.Thread(target=lambda: [tel.registrar("x", 1.0) for _ in range(20)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    texto = (tmp_path / "metrics.prom").read_text(encoding="utf-8")
+    assert texto.endswith("\n") and "ensina_etapa_duracao_ms_count" in texto
+    assert not list(tmp_path.glob(".metrics.*"))
+
+
+def test_historico_recarregado_do_arquivo(tmp_path):
+    Telemetria(tmp_path).registrar("gemini.ttft", 5.0, modelo="m")
+    tel = Telemetria(tmp_path)
+    assert tel.percentil("gemini.ttft", 50, modelo="m") == 5.0
+
+
+def test_rotulos_escapados_no_formato_do_prometheus(tmp_path):
+    tel = Telemetria(tmp_path, intervalo_prom_s=3600)
+    tel.registrar("gemini.total", 1.0, modelo='mo"de\\lo\nnovo')
+    linhas = [l for l in tel.prometheus().splitlines() if l.startswith("ensina_etapa_duracao_ms_count")]
+    assert linhas == ['ensina_etapa_duracao_ms_count{etapa="gemini.total",modelo="mo\\"de\\\\lo\\nnovo",modo=""} 1']